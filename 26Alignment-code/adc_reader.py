@@ -0,0 +1,294 @@
+import numpy as np
+import json
+import os
+import re
+
+# ==========================================
+# DCA1000 原始 ADC 数据的内存映射读取器
+# ==========================================
+# .bin 文件是 int16 的 I, Q, I, Q ... 交替排列
+# 单帧排列: [Loops, TX, RX, Samples, (I/Q)]
+# 用 np.memmap 打开，不会一次性把整个文件读进内存，
+# 只有真正被访问的帧才会从磁盘读出并转成复数。
+#
+# 精度模式 config['precision']:
+#   'single' (默认): int16 I/Q 一次转换直接写进 complex64 缓冲区，
+#                    后续 FFT / 取模 / dB 全部保持 complex64 / float32，
+#                    内存和 FFT 开销约为双精度的一半 (FFT 走 fft_backend，默认 scipy.fft，原生支持单精度)
+#   'double':        complex128，只在需要和旧结果逐位比对时使用
+#   对比数据见 benchmark_precision.py
+
+BYTES_PER_COMPLEX_SAMPLE = 4  # I(int16) + Q(int16)
+COMPLEX_DTYPES = {'single': np.complex64, 'double': np.complex128}
+TRIM_SIDECAR_EXT = '.trim.json'  # 虚拟裁剪的描述文件 (见 mmwave_aligned.py)
+
+
+class AdcCubeReader:
+    """ 按帧索引 / 时间区间访问 [frame, loop, tx, rx, sample] 数据立方体
+
+    file_path 可以是单个 .bin，也可以是 DCA1000 拆分出的多个文件列表
+    (p1, p2, ...)。多个文件按顺序拼成一条连续的字节流，跨文件边界的帧会被
+    自动拼接，不会再像以前那样丢掉 p1 末尾的半帧。
+    """
+
+    def __init__(self, file_path, config):
+        self.file_path = file_path
+        self.num_adc_samples = config['num_adc_samples']
+        self.num_chirps_per_frame = config['num_chirps_per_frame']
+        self.num_rx = config['num_rx_antennas']
+        self.num_tx = config.get('num_tx_antennas', 1)
+        self.num_loops = self.num_chirps_per_frame // self.num_tx
+        self.fps = config.get('fps', 16.13)
+        self.complex_dtype = COMPLEX_DTYPES[config.get('precision', 'single')]
+
+        # 单帧复数点数 / 字节数
+        self.frame_size = self.num_adc_samples * self.num_chirps_per_frame * self.num_rx
+        self.frame_bytes = self.frame_size * BYTES_PER_COMPLEX_SAMPLE
+        self.frame_shape = (self.num_loops, self.num_tx, self.num_rx, self.num_adc_samples, 2)
+
+        # 虚拟裁剪: 只有 sidecar 描述文件，没有真正的 .bin 拷贝
+        window = None if isinstance(file_path, (list, tuple)) else load_trim_sidecar(file_path)
+        if window is not None:
+            if window['frame_bytes'] != self.frame_bytes:
+                raise ValueError(f"裁剪描述的帧大小 {window['frame_bytes']} 与配置 {self.frame_bytes} 不一致")
+            self.source_paths = window['source_files']
+            self.start_frame = window['start_frame']
+            requested_frames = window['end_frame'] - window['start_frame']
+        else:
+            self.source_paths = list(file_path) if isinstance(file_path, (list, tuple)) else [file_path]
+            self.start_frame = 0
+            requested_frames = None
+        self.source_path = self.source_paths[0]
+        self.index = None  # frame_index.FrameIndex，open_adc 里加载 (按源文件的全局帧号)
+
+        # 每个文件各自做 1D int16 映射，记录它在拼接流中的起始字节
+        self._maps = []
+        seg_starts = [0]
+        for path in self.source_paths:
+            size = os.path.getsize(path)  # 文件不存在时抛 FileNotFoundError
+            count = size // 2
+            self._maps.append(np.memmap(path, dtype=np.int16, mode='r', shape=(count,))
+                              if count > 0 else np.zeros(0, dtype=np.int16))
+            seg_starts.append(seg_starts[-1] + count * 2)
+        self._seg_starts = np.array(seg_starts, dtype=np.int64)
+        total_bytes = int(self._seg_starts[-1])
+
+        self._base_byte = self.start_frame * self.frame_bytes
+        available_frames = max(0, (total_bytes - self._base_byte) // self.frame_bytes)
+        if requested_frames is None:
+            self.num_frames = available_frames
+            self.trailing_bytes = total_bytes - self.num_frames * self.frame_bytes
+        else:
+            self.num_frames = min(requested_frames, available_frames)
+            self.trailing_bytes = 0
+
+    def __len__(self):
+        return self.num_frames
+
+    @property
+    def duration(self):
+        return self.num_frames / self.fps
+
+    def _clip_range(self, start, stop):
+        start = 0 if start is None else max(0, int(start))
+        stop = self.num_frames if stop is None else min(int(stop), self.num_frames)
+        return start, max(start, stop)
+
+    def _read_bytes(self, byte_start, byte_stop):
+        """ 读拼接流中的 [byte_start, byte_stop)；单文件内返回视图，跨文件时拼接 """
+        seg = int(np.searchsorted(self._seg_starts, byte_start, side='right')) - 1
+        pieces = []
+        pos = byte_start
+        while pos < byte_stop:
+            seg_start, seg_stop = self._seg_starts[seg], self._seg_starts[seg + 1]
+            end = min(byte_stop, seg_stop)
+            if end > pos:
+                pieces.append(self._maps[seg][(pos - seg_start) // 2:(end - seg_start) // 2])
+            pos = end
+            seg += 1
+        if len(pieces) == 1:
+            return pieces[0]
+        if not pieces:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(pieces)
+
+    def _read_frames(self, start, stop):
+        byte_start = self._base_byte + start * self.frame_bytes
+        byte_stop = self._base_byte + stop * self.frame_bytes
+        return self._read_bytes(byte_start, byte_stop).reshape((stop - start,) + self.frame_shape)
+
+    def raw_frames(self, start=None, stop=None):
+        """ 返回 int16 原始数据 [n, loop, tx, rx, sample, 2]，不跨文件时不发生拷贝 """
+        start, stop = self._clip_range(start, stop)
+        return self._read_frames(start, stop)
+
+    def frames(self, start=None, stop=None):
+        """ 返回复数数据 [n, loop, tx, rx, sample]，只转换被请求的帧 """
+        return to_complex(self.raw_frames(start, stop), self.complex_dtype)
+
+    def frame(self, idx):
+        if idx < 0:
+            idx += self.num_frames
+        if not 0 <= idx < self.num_frames:
+            raise IndexError(f"帧索引越界: {idx} (共 {self.num_frames} 帧)")
+        return to_complex(self._read_frames(idx, idx + 1)[0], self.complex_dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.num_frames)
+            if step == 1:
+                return self.frames(start, stop)
+            return to_complex(np.stack([self._read_frames(i, i + 1)[0]
+                                        for i in range(start, stop, step)]), self.complex_dtype)
+        return self.frame(key)
+
+    def time_to_frame_range(self, start_time, end_time):
+        """ 时间区间 (秒) -> 帧区间 [start, stop)，和 mmwave_aligned 的取整方式一致 """
+        return self._clip_range(int(start_time * self.fps), int(end_time * self.fps))
+
+    def frames_by_time(self, start_time, end_time):
+        return self.frames(*self.time_to_frame_range(start_time, end_time))
+
+    def valid_mask(self, start=None, stop=None, flags=None):
+        """ [start, stop) 帧是否可用 (bool)，按帧索引的标记 (默认 frame_index.SKIP_FLAGS: 不完整 / 丢包补零)
+
+        没有加载帧索引时 (直接构造的 reader，或 config['frame_index'] = None) 全部为 True。
+        """
+        start, stop = self._clip_range(start, stop)
+        mask = np.ones(stop - start, dtype=bool)
+        if self.index is not None:
+            lo = self.start_frame + start
+            valid = (self.index.valid_mask(lo, lo + len(mask)) if flags is None else
+                     self.index.valid_mask(lo, lo + len(mask), flags))
+            mask[:len(valid)] = valid
+        return mask
+
+    def iter_blocks(self, block_frames, start=None, stop=None):
+        """ 按块遍历: 每次产出 (起始帧号, 复数块)，峰值内存只和块大小有关 """
+        start, stop = self._clip_range(start, stop)
+        block_frames = max(1, int(block_frames))
+        for s in range(start, stop, block_frames):
+            e = min(s + block_frames, stop)
+            yield s, to_complex(self._read_frames(s, e), self.complex_dtype)
+
+
+def split_capture_files(file_path):
+    """ adc_data_Full_p1.bin -> [adc_data_Full_p1.bin, adc_data_Full_p2.bin, ...]
+
+    DCA1000 超过单文件上限时会按 _p1, _p2 ... 依次拆分，这里按编号找出
+    同一次采集的所有存在的分段；文件名里没有 _pN 时原样返回。
+    """
+    match = re.search(r'_p(\d+)', os.path.basename(file_path))
+    if match is None:
+        return [file_path]
+    head = os.path.join(os.path.dirname(file_path), os.path.basename(file_path)[:match.start()])
+    tail = os.path.basename(file_path)[match.end():]
+
+    parts = []
+    part = int(match.group(1))
+    while os.path.exists(f"{head}_p{part}{tail}"):
+        parts.append(f"{head}_p{part}{tail}")
+        part += 1
+    return parts or [file_path]
+
+
+def trim_sidecar_path(file_path):
+    """ adc_xxx.bin / adc_xxx.trim.json -> adc_xxx.trim.json """
+    if file_path.endswith(TRIM_SIDECAR_EXT):
+        return file_path
+    return os.path.splitext(file_path)[0] + TRIM_SIDECAR_EXT
+
+
+def write_trim_sidecar(file_path, source_file, start_frame, end_frame, frame_bytes):
+    """ 写虚拟裁剪描述: 只记录源文件和帧窗口，不拷贝任何数据
+
+    source_file 可以是文件列表 (p1, p2, ...)，帧号按拼接后的连续流计算。
+    """
+    sidecar = trim_sidecar_path(file_path)
+    sidecar_dir = os.path.dirname(os.path.abspath(sidecar))
+    sources = list(source_file) if isinstance(source_file, (list, tuple)) else [source_file]
+    info = {
+        'source_files': [os.path.relpath(os.path.abspath(p), sidecar_dir) for p in sources],
+        'start_frame': int(start_frame),
+        'end_frame': int(end_frame),
+        'frame_bytes': int(frame_bytes),
+    }
+    with open(sidecar, 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    return sidecar
+
+
+def load_trim_sidecar(file_path):
+    """ 真实 .bin 存在时优先用它；否则找同名 .trim.json，找不到返回 None """
+    if not file_path.endswith(TRIM_SIDECAR_EXT) and os.path.exists(file_path):
+        return None
+    sidecar = trim_sidecar_path(file_path)
+    if not os.path.exists(sidecar):
+        return None
+
+    with open(sidecar, 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    # 源文件路径相对于 sidecar 所在目录
+    sidecar_dir = os.path.dirname(os.path.abspath(sidecar))
+    info['source_files'] = [os.path.join(sidecar_dir, p) for p in info['source_files']]
+    return info
+
+
+def to_complex(raw, dtype=np.complex64):
+    """ int16 [..., 2] (I, Q) -> 复数 [...]
+
+    先分配好复数缓冲区，再把它看成 [..., 2] 的实数数组，int16 -> float
+    只拷贝一次，不产生 astype(float32) / 1j * Q 之类的中间数组。
+    """
+    out = np.empty(raw.shape[:-1], dtype=dtype)
+    out.view(out.real.dtype).reshape(raw.shape)[...] = raw
+    return out
+
+
+def open_adc(file_path, config):
+    """ 打开文件并打印基本信息，文件缺失或不足一帧时返回 None
+
+    config['concat_split_files'] 为 True 时，自动把 _p1 之后的 _p2, _p3 ...
+    分段一起拼接读取，整个采集一次处理完。
+    """
+    if config.get('concat_split_files') and isinstance(file_path, str):
+        parts = split_capture_files(file_path)
+        if len(parts) > 1:
+            file_path = parts
+
+    try:
+        reader = AdcCubeReader(file_path, config)
+    except FileNotFoundError:
+        print(f"错误: 找不到文件 {file_path}")
+        return None
+    except ValueError as e:
+        print(f"错误: {e}")
+        return None
+
+    if len(reader.source_paths) > 1:
+        print(f"  拼接 {len(reader.source_paths)} 个分段文件: {', '.join(reader.source_paths)}")
+    if reader.start_frame:
+        print(f"  虚拟裁剪: 从第 {reader.start_frame} 帧起")
+    print(f"检测到完整帧数: {reader.num_frames} 帧 (约 {reader.duration:.1f} 秒)")
+    if reader.trailing_bytes:
+        print(f"  注意: 文件末尾有 {reader.trailing_bytes} 字节不完整帧数据，已忽略")
+    if reader.num_frames == 0:
+        print("错误: 数据量不足一帧，请检查配置参数是否设置过大。")
+        return None
+
+    # 帧索引 sidecar: 第一次打开时扫描一遍，之后直接读；config['frame_index'] = None 关闭
+    # frame_index 依赖本模块 (AdcCubeReader 等)，在这里才导入，保持单向依赖
+    import frame_index
+    index_config = config.get('frame_index', frame_index.FRAME_INDEX_CONFIG)
+    if index_config is not None:
+        reader.index = frame_index.load_or_build(reader, config, index_config)
+        bad = reader.index.bad_frames(reader.start_frame, reader.start_frame + reader.num_frames)
+        if len(bad):
+            counts = reader.index.summary(reader.start_frame, reader.start_frame + reader.num_frames)
+            print(f"  注意: {len(bad)} 帧被帧索引标记为异常 (" +
+                  ", ".join(f"{name} {n}" for name, n in counts.items() if n) + ")，"
+                  f"详见 python frame_index.py {reader.source_path}")
+            skipped = np.count_nonzero(~reader.valid_mask())
+            if skipped:
+                print(f"  其中 {skipped} 帧 (不完整 / 补零) 在后续处理中跳过")
+    return reader
@@ -0,0 +1,231 @@
+import numpy as np
+from itertools import permutations, product
+
+# ==========================================
+# 雷达坐标轴约定搜索: 全部 48 种带符号的轴置换 x 若干地面高度假设
+# ==========================================
+# 以前 spatial_calibration 只试 4 种手写的映射 ([x,y,0] / [x,0,y] / [-x,0,y] / [x,0,-y])，
+# 雷达装法不一样时就标不出来。这里枚举所有 3D 点 = A @ [x, y, z + h]:
+#   A: 3x3 带符号置换矩阵 (3! 种轴顺序 x 2^3 种符号 = 48 种)
+#   h: 被点击的点 (脚底) 在雷达坐标系里的高度假设 (雷达 z = 0 是雷达自己的水平面)
+# 每个候选先用闭式解 (已知内参 K 的 DLT; 点都在一个平面上时用单应矩阵分解) 求位姿，
+# 毫秒级，再做物理检查:
+#   - 点都在相机前方
+#   - 相机在被点击的平面 "上方" (沿雷达 z 轴向上)
+#   - 雷达的 "上" 在画面里朝上 (相机没有倒装，require_upright)
+# 效果完全相同的候选 (雷达 -> 相机 的整体变换一样) 只算一次，
+# 只有排名靠前的少数几个才跑完整的 RANSAC + 精修 (spatial_calibration 里用进程池并行)。
+# 注意: 雷达轨迹都在一个平面上 (z 为常数) 时，各候选的重投影误差本身一样 (平面内的镜像
+# 可以用旋转表示)，真正起筛选作用的是上面几项物理检查，大部分候选会合并成同一个变换;
+# 这时 h 也被 T 吸收，只影响 "相机在平面上方" 这一项检查。
+
+AXIS_SEARCH_CONFIG = {
+    'heights': (0.0, -0.5, -1.0),   # 点击点在雷达坐标系里的高度假设 (米)
+    'min_front': 0.95,              # 至少这么多点在相机前方
+    'require_upright': True,        # 雷达 z 轴向上在画面里也要朝上
+    'irls_iterations': 3,           # 闭式解的鲁棒重加权次数 (压点错的点)
+    'irls_scale': 20.0,             # 重加权的像素尺度
+    'screen_points': 300,           # 闭式解最多用这么多点 (均匀抽取)，筛选阶段够用
+    'max_full': 4,                  # 进入完整 RANSAC + 精修的候选数 (和以前 4 种策略的耗时相当)
+    'workers': 4,                   # 完整求解的进程数，1 = 不开进程池
+}
+
+AXIS_NAMES = 'xyz'
+
+
+def signed_permutations():
+    """ 48 个 (名字, A)，名字如 '[-x, z, y]' 表示 3D 点 = (-x, z, y) """
+    result = []
+    for order in permutations(range(3)):
+        for signs in product((1, -1), repeat=3):
+            A = np.zeros((3, 3))
+            A[np.arange(3), order] = signs
+            name = '[' + ', '.join(('-' if s < 0 else '') + AXIS_NAMES[o] for o, s in zip(order, signs)) + ']'
+            result.append((name, A))
+    return result
+
+
+def candidates(config=AXIS_SEARCH_CONFIG):
+    """ 所有 (轴置换 x 高度) 候选 """
+    return [{'name': name, 'A': A, 'height': float(h)}
+            for h in config['heights'] for name, A in signed_permutations()]
+
+
+def _normalize(points):
+    """ Hartley 归一化: 平移到质心，平均距离缩放到 sqrt(2)，返回 (归一化点, 3x3 变换) """
+    c = points.mean(axis=0)
+    scale = np.sqrt(2) / max(np.mean(np.linalg.norm(points - c, axis=1)), 1e-12)
+    T = np.array([[scale, 0, -scale * c[0]], [0, scale, -scale * c[1]], [0, 0, 1]])
+    return (points - c) * scale, T
+
+
+def _homography(src, dst, weights):
+    """ 加权 DLT 单应矩阵 src [N, 2] -> dst [N, 2] """
+    s, Ts = _normalize(src)
+    d, Td = _normalize(dst)
+    n = len(src)
+    A = np.zeros((2 * n, 9))
+    A[0::2, 0:2], A[0::2, 2] = s, 1
+    A[0::2, 6:8], A[0::2, 8] = -d[:, :1] * s, -d[:, 0]
+    A[1::2, 3:5], A[1::2, 5] = s, 1
+    A[1::2, 6:8], A[1::2, 8] = -d[:, 1:] * s, -d[:, 1]
+    A *= np.repeat(np.sqrt(weights), 2)[:, None]
+    H = np.linalg.svd(A, full_matrices=False)[2][-1].reshape(3, 3)
+    return np.linalg.inv(Td) @ H @ Ts
+
+
+def _nearest_rotation(M):
+    U, _, Vt = np.linalg.svd(M)
+    return U @ Vt
+
+
+def _planar_pose(obj, xn, weights):
+    """ 点共面: 平面坐标 -> 归一化像平面坐标的单应矩阵分解出 [R | T] """
+    c = obj.mean(axis=0)
+    Vt = np.linalg.svd(obj - c, full_matrices=False)[2]
+    e1, e2 = Vt[0], Vt[1]
+    B = np.column_stack((e1, e2, np.cross(e1, e2)))
+    ab = (obj - c) @ B[:, :2]
+    H = _homography(ab, xn, weights)
+    lam = 2.0 / (np.linalg.norm(H[:, 0]) + np.linalg.norm(H[:, 1]))
+    if H[2, 2] * lam < 0:   # 平面原点 (质心) 要在相机前方
+        lam = -lam
+    r1, r2 = lam * H[:, 0], lam * H[:, 1]
+    R_plane = _nearest_rotation(np.column_stack((r1, r2, np.cross(r1, r2))))
+    R = R_plane @ B.T
+    return R, lam * H[:, 2] - R @ c
+
+
+def _general_pose(obj, xn, weights):
+    """ 点不共面: 已知内参的线性 DLT 求 [M | t]，再投影到最近的旋转矩阵
+
+    A 的手性和数据对不上时 M 的行列式为负，这时返回 None
+    """
+    n = len(obj)
+    # 3D 点也做 Hartley 归一化 (平移到质心、缩放)，解完再换回来
+    c = obj.mean(axis=0)
+    scale = np.sqrt(3) / max(np.mean(np.linalg.norm(obj - c, axis=1)), 1e-12)
+    X = np.column_stack(((obj - c) * scale, np.ones(n)))
+    A = np.zeros((2 * n, 12))
+    A[0::2, 0:4], A[0::2, 8:12] = X, -xn[:, :1] * X
+    A[1::2, 4:8], A[1::2, 8:12] = X, -xn[:, 1:] * X
+    A *= np.repeat(np.sqrt(weights), 2)[:, None]
+    P = np.linalg.svd(A, full_matrices=False)[2][-1].reshape(3, 4)
+    P = P @ np.vstack((np.column_stack((np.eye(3) * scale, -scale * c)), [0, 0, 0, 1]))
+    if np.mean(obj @ P[2, :3] + P[2, 3]) < 0:
+        P = -P
+    if np.linalg.det(P[:, :3]) <= 0:
+        return None
+    U, S, Vt = np.linalg.svd(P[:, :3])
+    return U @ Vt, P[:, 3] / S.mean()
+
+
+def closed_form_pose(obj, uv, K, config=AXIS_SEARCH_CONFIG):
+    """ 3D 点 [N, 3] + 像素 [N, 2] -> (R, T, 每点像素误差 [N])，失败返回 None
+
+    按误差做几轮鲁棒重加权 (Cauchy 权重)，点错的少数几个点影响不大。
+    """
+    Kinv = np.linalg.inv(K)
+    xn = (np.column_stack((uv, np.ones(len(uv)))) @ Kinv.T)[:, :2]
+    s = np.linalg.svd(obj - obj.mean(axis=0), compute_uv=False)
+    planar = s[2] < 1e-6 * max(s[0], 1e-12) or s[2] < 1e-3 * np.sqrt(len(obj))
+    weights = np.ones(len(obj))
+    pose = None
+    for _ in range(config['irls_iterations'] + 1):
+        pose = _planar_pose(obj, xn, weights) if planar else _general_pose(obj, xn, weights)
+        if pose is None:
+            return None
+        err = reprojection_error(obj, uv, pose[0], pose[1], K)
+        weights = 1.0 / (1.0 + (err / config['irls_scale']) ** 2)
+    return pose[0], pose[1], err
+
+
+def reprojection_error(obj, uv, R, T, K):
+    X = obj @ R.T + T
+    Z = np.where(np.abs(X[:, 2]) < 1e-9, 1e-9, X[:, 2])
+    proj = X[:, :2] / Z[:, None] * [K[0, 0], K[1, 1]] + [K[0, 2], K[1, 2]]
+    return np.linalg.norm(proj - uv, axis=1)
+
+
+def screen(candidate, radar_xyz, uv, K, config=AXIS_SEARCH_CONFIG):
+    """ 一个候选的闭式解 + 物理检查 -> 结果 dict (ok 为是否通过，reason 为没通过的原因) """
+    A, h = candidate['A'], candidate['height']
+    step = max(1, -(-len(radar_xyz) // config['screen_points']))
+    pts = radar_xyz[::step] + [0.0, 0.0, h]
+    uv = uv[::step]
+    obj = pts @ A.T
+    result = dict(candidate, ok=False, reason='', error=np.inf, front=0.0,
+                  camera=np.full(3, np.nan), R=None, T=None)
+    pose = closed_form_pose(obj, uv, K, config)
+    if pose is None:
+        result['reason'] = '手性不符'
+        return result
+    R, T, err = pose
+    result.update(R=R, T=T, error=float(np.median(err)))
+    result['front'] = float(np.mean(obj @ R[2] + T[2] > 0))
+    # 相机在雷达坐标系里的位置 (A 是正交阵，雷达坐标 = A^T @ 3D 点)
+    camera = A.T @ (-R.T @ T)
+    result['camera'] = camera
+    up_in_camera = R @ A[:, 2]
+    if result['front'] < config['min_front']:
+        result['reason'] = '点在相机后方'
+    elif camera[2] <= np.mean(pts[:, 2]):
+        result['reason'] = '相机在地面下'
+    elif config['require_upright'] and up_in_camera[1] >= 0:
+        result['reason'] = '画面倒置'
+    else:
+        result['ok'] = True
+    return result
+
+
+def effective_transform(result):
+    """ 雷达坐标 -> 相机坐标 的整体变换 (M, t): X_cam = M @ [x, y, z] + t，用来合并等价的候选 """
+    M = result['R'] @ result['A']
+    return M, result['T'] + M @ [0.0, 0.0, result['height']]
+
+
+def rank(results):
+    """ 通过检查的排前面，再按闭式解误差排序；整体变换相同的候选标记为 same_as (排名更前的那个) """
+    order = sorted(range(len(results)), key=lambda i: (not results[i]['ok'], results[i]['error'], i))
+    ranked = [results[i] for i in order]
+    seen = []
+    for k, res in enumerate(ranked):
+        res['rank'] = k + 1
+        res['same_as'] = None
+        if res['R'] is None:
+            continue
+        M, t = effective_transform(res)
+        for j in seen:
+            Mj, tj = effective_transform(ranked[j])
+            if np.allclose(M, Mj, atol=1e-3) and np.allclose(t, tj, atol=1e-3):
+                res['same_as'] = ranked[j]['rank']
+                break
+        else:
+            seen.append(k)
+    return ranked
+
+
+def distinct_leaders(ranked, count):
+    """ 通过检查、互不等价的前 count 个候选 """
+    return [res for res in ranked if res['ok'] and res['same_as'] is None][:count]
+
+
+def print_table(ranked, top=None):
+    """ 排名表: 互不等价的全部候选 (等价的只计数，top 给数字时只打印前 top 个) + 各类淘汰原因的计数 """
+    duplicates = {}
+    for res in ranked:
+        if res['same_as'] is not None:
+            duplicates[res['same_as']] = duplicates.get(res['same_as'], 0) + 1
+    print(f"  {'#':>3} {'映射':<14} {'高度':>6} {'闭式误差':>9} {'前方':>6} "
+          f"{'相机位置 (雷达坐标系)':>24} {'等价':>4} {'精修误差':>9}  状态")
+    for res in [res for res in ranked if res['same_as'] is None][slice(top)]:
+        camera = ', '.join(f"{c:+.2f}" for c in res['camera'])
+        refined = f"{res['refined']['rms']:.2f}" if res.get('refined') else '-'
+        print(f"  {res['rank']:>3} {res['name']:<14} {res['height']:>6.2f} {res['error']:>9.2f} "
+              f"{res['front'] * 100:>5.0f}% {camera:>24} {duplicates.get(res['rank'], 0):>4} {refined:>9}  "
+              f"{res['reason'] or '通过'}")
+    reasons = {}
+    for res in ranked:
+        key = '等价' if res['same_as'] is not None else (res['reason'] or '通过')
+        reasons[key] = reasons.get(key, 0) + 1
+    print(f"  共 {len(ranked)} 个候选: " + ', '.join(f"{k} {v}" for k, v in reasons.items()))
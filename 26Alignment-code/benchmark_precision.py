@@ -0,0 +1,95 @@
+import numpy as np
+import os
+import tempfile
+import time
+import tracemalloc
+import fft_backend
+from adc_reader import AdcCubeReader
+
+# ==========================================
+# 单精度 / 双精度 Range-FFT 对比测试
+# ==========================================
+# 对同一批帧分别跑 "旧写法"、双精度、单精度三种流程:
+#   int16 -> 复数 -> Range-FFT -> 取模 -> 对 Chirp/RX 求平均 -> dB
+# 打印耗时和峰值内存 (tracemalloc 统计 NumPy 分配)。
+# 没有真实采集文件时自动生成一段随机数据。
+BENCH_CONFIG = {
+    'file_path': 'adc_data_Full_p1.bin',
+    'num_adc_samples': 256,
+    'num_chirps_per_frame': 384,
+    'num_rx_antennas': 4,
+    'num_tx_antennas': 3,
+    'fps': 16.13,
+    'num_frames': 32,   # 参与测试的帧数
+    'repeats': 3,       # 每种模式重复次数，取最快一次
+}
+
+def legacy_pipeline(raw):
+    """ 改造前各脚本的写法: astype(float32) 后再 I + 1j*Q """
+    raw = raw.reshape(-1).astype(np.float32)
+    cube = raw[0::2] + 1j * raw[1::2]
+    range_fft = np.fft.fft(cube.reshape(-1, BENCH_CONFIG['num_adc_samples']), axis=-1)
+    return 20 * np.log10(np.abs(range_fft).mean(axis=0) + 1e-9)
+
+def reader_pipeline(reader, frames):
+    cube = reader.frames(0, frames)
+    range_fft = fft_backend.fft(cube, axis=-1)
+    return 20 * np.log10(np.abs(range_fft).mean(axis=(0, 1, 2, 3)) + 1e-9)
+
+def measure(func):
+    """ 返回 (最快耗时秒, 峰值内存 MB, 结果) """
+    best_time, peak_mb, result = np.inf, 0.0, None
+    for _ in range(BENCH_CONFIG['repeats']):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        best_time = min(best_time, elapsed)
+        peak_mb = max(peak_mb, peak / 1024 / 1024)
+    return best_time, peak_mb, result
+
+def main():
+    cfg = BENCH_CONFIG
+    frame_size = cfg['num_adc_samples'] * cfg['num_chirps_per_frame'] * cfg['num_rx_antennas']
+    tmp_path = None
+    file_path = cfg['file_path']
+
+    if not os.path.exists(file_path):
+        print(f"找不到 {file_path}，使用随机生成的 {cfg['num_frames']} 帧数据测试")
+        fd, tmp_path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        rng = np.random.default_rng(0)
+        rng.integers(-2048, 2048, cfg['num_frames'] * frame_size * 2, dtype=np.int16).tofile(tmp_path)
+        file_path = tmp_path
+
+    try:
+        single = AdcCubeReader(file_path, dict(cfg, precision='single'))
+        double = AdcCubeReader(file_path, dict(cfg, precision='double'))
+        frames = min(cfg['num_frames'], single.num_frames)
+        raw = np.array(single.raw_frames(0, frames))  # 先读进内存，避免测到磁盘 IO
+        print(f"测试帧数: {frames} (原始数据 {raw.nbytes / 1024 / 1024:.1f} MB)")
+        print("-" * 50)
+
+        results = [
+            ("旧写法 (float32 + 1j*Q)", measure(lambda: legacy_pipeline(raw))),
+            ("双精度 complex128",       measure(lambda: reader_pipeline(double, frames))),
+            ("单精度 complex64",        measure(lambda: reader_pipeline(single, frames))),
+        ]
+
+        base_time, base_mem = results[0][1][0], results[0][1][1]
+        for name, (elapsed, peak_mb, _) in results:
+            print(f"{name:<26s} 耗时 {elapsed * 1000:8.1f} ms ({base_time / elapsed:4.2f}x) | "
+                  f"峰值内存 {peak_mb:8.1f} MB ({peak_mb / base_mem * 100:5.1f}%)")
+
+        # 单精度结果应与双精度一致 (dB 误差远小于 0.01)
+        diff = np.max(np.abs(results[1][1][2] - results[2][1][2]))
+        print("-" * 50)
+        print(f"单/双精度 dB 结果最大差异: {diff:.2e} dB")
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+if __name__ == "__main__":
+    main()
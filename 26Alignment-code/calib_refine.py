@@ -0,0 +1,237 @@
+import numpy as np
+from scipy.optimize import least_squares
+
+# ==========================================
+# 标定联合精修: R, T, 时间偏移 (可选焦距) 一起做鲁棒最小二乘
+# ==========================================
+# solvePnPRansac 只给一个初值，而且时间偏移固定不动。这里把
+#   雷达点 (按 视频时间 + time_offset 在前后两帧之间线性插值) -> [m*x, 0, y] -> R P + T -> 针孔投影
+# 和相机点击的像素差作为残差，对 旋转 (R = exp(δ) R0 的旋转向量 δ)、T、time_offset、焦距 f
+# 一起用 scipy least_squares (trf + huber 鲁棒损失) 精修，残差和雅可比都是解析的整组向量化计算。
+# 地面点模型和 interactive_tuner / generate_with_debug 完全一致:
+#   obj = [-x if mirror_x else x, 0, y]
+# 结果用 save_calibration 存成它们读的 npz (R, T, K, params)。
+# 参与拟合的点击在初始 time_offset 下固定 (那时能插值出雷达位置的点)。优化中某个点滑进雷达轨迹的
+# 缺口或越界时给一个固定的罚分 (unmatched_penalty)，而不是残差 0，免得优化器靠把点挪出轨迹来降代价。
+
+CALIB_REFINE_CONFIG = {
+    'radar_fps': 16.13,
+    'video_fps': 30.0,
+    'loss': 'huber',            # least_squares 的鲁棒损失 ('linear' 为普通最小二乘)
+    'loss_scale': 10.0,         # 鲁棒损失的拐点 (像素)，也用来数内点 (< 3 倍算内点)
+    'refine_offset': True,      # 一起优化 time_offset
+    'max_offset_shift': 1.0,    # time_offset 最多离初值这么远 (秒)
+    'refine_focal': False,      # 一起优化焦距 (fx = fy)
+    'fill_gap': 3,              # 雷达轨迹里不超过这么多帧的缺口先线性补上，插值时少丢点
+    'unmatched_penalty': 30.0,  # 初始匹配上、优化中滑出雷达轨迹的点的固定残差 (像素，3 倍 loss_scale 即按外点算)
+    'max_nfev': 100,
+}
+
+
+def _skew(v):
+    """ [N, 3] -> [N, 3, 3] 叉乘矩阵 """
+    v = np.atleast_2d(v)
+    z = np.zeros(len(v))
+    return np.stack((np.stack((z, -v[:, 2], v[:, 1]), axis=1),
+                     np.stack((v[:, 2], z, -v[:, 0]), axis=1),
+                     np.stack((-v[:, 1], v[:, 0], z), axis=1)), axis=1)
+
+
+def rotation_matrix(rvec):
+    """ 旋转向量 -> 旋转矩阵 (Rodrigues，和 cv2.Rodrigues 一致) """
+    rvec = np.asarray(rvec, dtype=np.float64).reshape(3)
+    theta = np.linalg.norm(rvec)
+    W = _skew(rvec)[0]
+    if theta < 1e-12:
+        return np.eye(3) + W
+    return np.eye(3) + np.sin(theta) / theta * W + (1 - np.cos(theta)) / theta ** 2 * W @ W
+
+
+def _left_jacobian(rvec):
+    """ SO(3) 左雅可比: d(exp(δ) q)/dδ = -[exp(δ) q]x J_l(δ) """
+    theta = np.linalg.norm(rvec)
+    W = _skew(rvec)[0]
+    if theta < 1e-8:
+        return np.eye(3) + W / 2
+    return (np.eye(3) + (1 - np.cos(theta)) / theta ** 2 * W
+            + (theta - np.sin(theta)) / theta ** 3 * W @ W)
+
+
+def euler_angles(R):
+    """ R = Rz(roll) Ry(yaw) Rx(pitch) -> (pitch, yaw, roll) 度，和 interactive_tuner.get_rotation_matrix 互逆 """
+    pitch = np.arctan2(R[2, 1], R[2, 2])
+    yaw = np.arcsin(np.clip(-R[2, 0], -1.0, 1.0))
+    roll = np.arctan2(R[1, 0], R[0, 0])
+    return tuple(float(np.rad2deg(a)) for a in (pitch, yaw, roll))
+
+
+def ground_points(xy, mirror_x):
+    """ 雷达 [N, 2] -> 相机模型里的 3D 点 [N, 3] = [m*x, 0, y] """
+    m = -1.0 if mirror_x else 1.0
+    return np.column_stack((m * xy[:, 0], np.zeros(len(xy)), xy[:, 1]))
+
+
+def to_ground_model(R, axes):
+    """ 某个坐标变换策略下 PnP 的 R -> 地面点模型 [m*x, 0, y] 下的 (R, mirror_x)
+
+    axes [3, 2]: 策略的 3D 点 = axes @ [x, y]。地面点都在一个平面上，镜像可以并进旋转里，
+    所以两种 mirror_x 都能精确表示；取旋转改动最小 (trace 最大) 的那个。
+    """
+    best = None
+    for mirror_x in (False, True):
+        m = -1.0 if mirror_x else 1.0
+        qx, qz = m * axes[:, 0], axes[:, 1]
+        Q = np.column_stack((qx, np.cross(qz, qx), qz))
+        if best is None or np.trace(Q) > best[0]:
+            best = (np.trace(Q), R @ Q, mirror_x)
+    return best[1], best[2]
+
+
+def fill_short_gaps(positions, max_frames):
+    """ 不超过 max_frames 帧的 nan 缺口按两侧线性补上 (更长的保持 nan) """
+    positions = np.array(positions, dtype=np.float64)
+    valid = ~np.isnan(positions).any(axis=1)
+    idx = np.flatnonzero(valid)
+    if len(idx) < 2 or max_frames <= 0:
+        return positions
+    holes = np.flatnonzero((np.diff(idx) > 1) & (np.diff(idx) - 1 <= max_frames))
+    for k in holes:
+        a, b = idx[k], idx[k + 1]
+        w = (np.arange(a + 1, b) - a)[:, None] / (b - a)
+        positions[a + 1:b] = (1 - w) * positions[a] + w * positions[b]
+    return positions
+
+
+def sample_radar(radar_xy, times, radar_fps):
+    """ 在雷达流内时间 times 处线性插值
+
+    返回 (位置 [N, 2], 对时间的导数 [N, 2]，可用 [N] bool)；两侧任一帧无效或越界为不可用。
+    """
+    pos = times * radar_fps
+    i0 = np.floor(pos).astype(np.int64)
+    w = (pos - i0)[:, None]
+    n = len(radar_xy)
+    ok = (i0 >= 0) & (i0 < n - 1)
+    a = radar_xy[np.clip(i0, 0, n - 1)]
+    b = radar_xy[np.clip(i0 + 1, 0, n - 1)]
+    ok &= ~np.isnan(a).any(axis=1) & ~np.isnan(b).any(axis=1)
+    xy = np.where(ok[:, None], (1 - w) * a + w * b, 0.0)
+    vel = np.where(ok[:, None], (b - a) * radar_fps, 0.0)
+    return xy, vel, ok
+
+
+class _Problem:
+    """ 残差 / 雅可比，参数 p = [δ (3), T (3), time_offset, (f)] """
+
+    def __init__(self, radar_xy, camera_points, R0, K, mirror_x, config):
+        self.radar_xy = fill_short_gaps(radar_xy, config['fill_gap'])
+        self.video_time = camera_points[:, 0] / config['video_fps']
+        self.uv = camera_points[:, 1:3]
+        self.R0 = R0
+        self.cx, self.cy = K[0, 2], K[1, 2]
+        self.f0 = K[0, 0]
+        self.m = -1.0 if mirror_x else 1.0
+        self.mirror_x = mirror_x
+        self.config = config
+        self.active = np.ones(len(camera_points), dtype=bool)  # 参与拟合的点击，refine 里按初始偏移确定
+
+    def unpack(self, p, offset0):
+        R = rotation_matrix(p[:3]) @ self.R0
+        T = p[3:6]
+        offset = p[6] if self.config['refine_offset'] else offset0
+        f = p[-1] if self.config['refine_focal'] else self.f0
+        return R, T, offset, f
+
+    def evaluate(self, p, offset0, jacobian=False):
+        R, T, offset, f = self.unpack(p, offset0)
+        xy, vel, ok = sample_radar(self.radar_xy, self.video_time + offset, self.config['radar_fps'])
+        P = np.column_stack((self.m * xy[:, 0], np.zeros(len(xy)), xy[:, 1]))
+        q = P @ R.T
+        X = q + T
+        Z = np.maximum(X[:, 2], 1e-6)
+        u = f * X[:, 0] / Z + self.cx
+        v = f * X[:, 1] / Z + self.cy
+        res = np.column_stack((u - self.uv[:, 0], v - self.uv[:, 1]))
+        res[~ok] = 0.0
+        res[self.active & ~ok, 0] = self.config['unmatched_penalty']
+        res[~self.active] = 0.0
+        if not jacobian:
+            return res.ravel()
+
+        # 投影对相机坐标的导数 [N, 2, 3]
+        Jp = np.zeros((len(X), 2, 3))
+        Jp[:, 0, 0] = Jp[:, 1, 1] = f / Z
+        Jp[:, 0, 2] = -f * X[:, 0] / Z ** 2
+        Jp[:, 1, 2] = -f * X[:, 1] / Z ** 2
+        cols = [np.einsum('nij,njk->nik', Jp, -_skew(q) @ _left_jacobian(p[:3])), Jp]
+        if self.config['refine_offset']:
+            dP = np.column_stack((self.m * vel[:, 0], np.zeros(len(vel)), vel[:, 1]))
+            cols.append(np.einsum('nij,nj->ni', Jp, dP @ R.T)[:, :, None])
+        if self.config['refine_focal']:
+            cols.append(np.stack((X[:, 0] / Z, X[:, 1] / Z), axis=1)[:, :, None])
+        J = np.concatenate(cols, axis=2)
+        J[~(ok & self.active)] = 0.0
+        return J.reshape(-1, J.shape[2])
+
+
+def refine(radar_xy, camera_points, R0, T0, time_offset, K, mirror_x, config=CALIB_REFINE_CONFIG):
+    """ 从 (R0, T0, time_offset) 出发联合精修
+
+    radar_xy [N, >=2] 每雷达帧一行 (nan 为无效)，camera_points [M, 3] (视频帧号, u, v)。
+    返回 dict: R, T, K, time_offset, mirror_x, focal, cost (鲁棒损失)，mean_cost (cost / matched，
+    不同候选之间比较用这个)，rms / median (内点像素误差)，inliers, matched (初始偏移下匹配上、
+    参与拟合的点数), lost (其中最终偏移下滑出雷达轨迹的点数), nfev, success
+    """
+    radar_xy = np.array(radar_xy, dtype=np.float64)[:, :2]
+    radar_xy[np.all(radar_xy == 0, axis=1)] = np.nan  # 全 0 的占位点当无效
+    camera_points = np.asarray(camera_points, dtype=np.float64)
+    problem = _Problem(radar_xy, camera_points, np.asarray(R0, dtype=np.float64), K, mirror_x, config)
+    problem.active = sample_radar(problem.radar_xy, problem.video_time + time_offset, config['radar_fps'])[2]
+
+    p0 = [np.zeros(3), np.asarray(T0, dtype=np.float64).reshape(3)]
+    lower, upper = [np.full(6, -np.inf)], [np.full(6, np.inf)]
+    if config['refine_offset']:
+        p0.append([time_offset])
+        lower.append([time_offset - config['max_offset_shift']])
+        upper.append([time_offset + config['max_offset_shift']])
+    if config['refine_focal']:
+        p0.append([K[0, 0]])
+        lower.append([K[0, 0] * 0.5])
+        upper.append([K[0, 0] * 2.0])
+    p0, lower, upper = np.concatenate(p0), np.concatenate(lower), np.concatenate(upper)
+
+    sol = least_squares(lambda p: problem.evaluate(p, time_offset),
+                        p0, jac=lambda p: problem.evaluate(p, time_offset, jacobian=True),
+                        bounds=(lower, upper), method='trf', loss=config['loss'],
+                        f_scale=config['loss_scale'], x_scale='jac', max_nfev=config['max_nfev'])
+
+    R, T, offset, f = problem.unpack(sol.x, time_offset)
+    _, _, ok = sample_radar(problem.radar_xy, problem.video_time + offset, config['radar_fps'])
+    ok &= problem.active
+    err = np.linalg.norm(sol.fun.reshape(-1, 2)[ok], axis=1)
+    matched = int(problem.active.sum())
+    inliers = err < 3 * config['loss_scale']
+    K_out = np.array(K, dtype=np.float64)
+    K_out[0, 0] = K_out[1, 1] = f
+    return {
+        'R': R, 'T': T, 'K': K_out, 'time_offset': float(offset), 'mirror_x': bool(mirror_x),
+        'focal': float(f), 'cost': float(sol.cost), 'mean_cost': float(sol.cost) / max(matched, 1),
+        'rms': float(np.sqrt(np.mean(err[inliers] ** 2))) if inliers.any() else np.inf,
+        'median': float(np.median(err)) if len(err) else np.inf,
+        'inliers': int(inliers.sum()), 'matched': matched, 'lost': matched - int(ok.sum()),
+        'nfev': int(sol.nfev), 'success': bool(sol.success),
+    }
+
+
+def save_calibration(path, result, **extra):
+    """ 存成 interactive_tuner / generate_with_debug 读的 npz: R, T, K, params (额外字段原样存顶层) """
+    pitch, yaw, roll = euler_angles(result['R'])
+    T = np.asarray(result['T'], dtype=np.float32).reshape(3)
+    params = {
+        'tx': float(T[0]), 'ty': float(T[1]), 'tz': float(T[2]),
+        'pitch': pitch, 'yaw': yaw, 'roll': roll,
+        'time_offset': result['time_offset'],
+        'mirror_x': result['mirror_x'],
+    }
+    np.savez(path, R=result['R'], T=T, K=np.asarray(result['K'], dtype=np.float32), params=params, **extra)
+    return path
@@ -1,34 +1,28 @@
 import numpy as np
 import matplotlib.pyplot as plt
+import timebase
+import track_io
 
 # ============================
 # 填入你想检查的一对文件
 # ============================
-RADAR_FILE = 'radar_track1.txt'   # 或者是 p2
-CAM_FILE = 'camera_track1.txt'    # 对应的相机
-FPS_RATIO = 30.0 / 16.13  # Video_FPS / Radar_FPS
+RADAR_FILE = 'radar_track1.trk'   # 或者是 p2
+CAM_FILE = 'camera_track1.trk'    # 对应的相机
+TIMEBASE = timebase.Timebase({'video': {'rate': 30.0}, 'radar': {'rate': 16.13}})
 
 def check_shape():
     # 1. 读取
-    r_data = np.loadtxt(RADAR_FILE) # [x, y, z]
-    c_data = np.loadtxt(CAM_FILE, skiprows=1) # [frame, u, v]
+    r_data = track_io.load_radar_track(RADAR_FILE) # [x, y, z]
+    c_data = track_io.load_camera_track(CAM_FILE) # [frame, u, v]
     
-    # 2. 简单的对齐提取
-    matched_r = []
-    matched_c = []
-    
-    for row in c_data:
-        frame_cam = row[0]
-        idx_r = int((frame_cam / 30.0) * 16.13) # 时间对齐
-        
-        if idx_r < len(r_data):
-            # 只有当雷达数据不为 nan 且不全为0时
-            if not np.isnan(r_data[idx_r][0]) and np.linalg.norm(r_data[idx_r]) > 0.1:
-                matched_r.append(r_data[idx_r])
-                matched_c.append(row[1:]) # u, v
-
-    matched_r = np.array(matched_r)
-    matched_c = np.array(matched_c)
+    # 2. 简单的对齐提取 (所有相机帧一次换算到雷达帧号)
+    idx_r = TIMEBASE.convert('video', 'radar', c_data[:, 0])
+    ok = timebase.in_range(idx_r, len(r_data))
+    r_pt = r_data[idx_r[ok]]
+    # 只有当雷达数据不为 nan 且不全为0时
+    valid = ~np.isnan(r_pt[:, 0]) & (np.linalg.norm(r_pt, axis=1) > 0.1)
+    matched_r = r_pt[valid]
+    matched_c = c_data[ok][valid, 1:] # u, v
 
     if len(matched_r) == 0:
         print("没有匹配到任何数据！检查文件名或时间对齐。")
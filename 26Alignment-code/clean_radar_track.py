@@ -1,95 +1,218 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.ndimage import maximum_filter, uniform_filter
+import track_io
 
 # ============================
 # 配置
 # ============================
-INPUT_FILE = 'radar_track2.txt'   # 清洗的文件
-OUTPUT_FILE = 'radar_track2_clean.txt' # 清洗后的文件
+INPUT_FILE = 'radar_track2.trk'   # 清洗的文件 (旧的 .txt 也能读)
+OUTPUT_FILE = 'radar_track2_clean.trk' # 清洗后的文件
 
 # 容忍半径 (米)
 # 如果一个点距离“静止中心”小于这个距离，就把它当垃圾删掉
-FILTER_RADIUS = 0.3 
+FILTER_RADIUS = 0.3
+
+# ============================
+# 静止杂波地图 (多个静止反射点)
+# ============================
+# 以前用 X、Y 两个一维直方图各取峰值拼成一个杂波中心:
+#   - 房间里有多个墙角 / 柜子时只能去掉一个
+#   - 两个边缘分布的峰值拼起来的 (x, y) 可能根本没有点
+# 现在在二维占用栅格上找所有 "停留时间长" 的格子 (局部极大 + 占比门限)，
+# 位置用 3x3 邻域加权平均细化，然后所有帧和所有杂波点一次算距离做掩码。
+#
+# mode = 'stream' 时不把整条轨迹读进内存: 按块读 (memmap) 轨迹文件，占用栅格按
+# decay_time 指数衰减 (最近一段时间的停留才算数)，每块用当时的杂波点过滤后直接写出。
+CLUTTER_CONFIG = {
+    'mode': 'batch',            # 'batch': 整条轨迹统计一次; 'stream': 分块 + 衰减栅格
+    'cell_size': 0.1,           # 占用栅格边长 (米)
+    'min_dwell': 0.05,          # 3x3 邻域占有效帧的比例超过它才算静止杂波
+    'max_sites': 8,             # 最多保留的杂波点数
+    'filter_radius': FILTER_RADIUS,
+    'bounds': (-6.0, 6.0, 0.0, 6.0),  # stream 模式的栅格范围 (x_min, x_max, y_min, y_max)，batch 用数据范围
+    'fps': 16.13,
+    'decay_time': 60.0,         # stream 模式占用衰减的时间常数 (秒)
+    'block_frames': 1024,       # stream 模式每次读入的帧数
+    'show_plot': True,
+}
+
+
+def valid_points(data):
+    """ 有效点掩码: 没有 nan，且不是 (0, 0) 占位点 """
+    return ~np.isnan(data).any(axis=1) & (np.abs(data[:, 0]) > 0.01)
+
+
+def occupancy_grid(xy, bounds, cell_size, weights=None):
+    """ 二维占用直方图 -> (grid [Nx, Ny], x_edges, y_edges) """
+    x_min, x_max, y_min, y_max = bounds
+    x_edges = np.arange(x_min, x_max + cell_size, cell_size)
+    y_edges = np.arange(y_min, y_max + cell_size, cell_size)
+    grid, _, _ = np.histogram2d(xy[:, 0], xy[:, 1], bins=(x_edges, y_edges), weights=weights)
+    return grid, x_edges, y_edges
+
+
+def find_clutter_sites(grid, x_edges, y_edges, total, config):
+    """ 占用栅格 -> 杂波点 [S, 2] (按停留时间从多到少) 和各自的占比 [S]
+
+    按 3x3 邻域的占用总数找局部极大 (点正好落在格子边界上被分到几个格子时也不会漏)，
+    占比 >= min_dwell 的算一个杂波点，位置取 3x3 邻域按占用加权的平均，
+    相距不到 filter_radius 的杂波点只保留停留最长的那个。
+    """
+    if total <= 0:
+        return np.zeros((0, 2)), np.zeros(0)
+    xc = (x_edges[:-1] + x_edges[1:]) / 2
+    yc = (y_edges[:-1] + y_edges[1:]) / 2
+    gx, gy = np.meshgrid(xc, yc, indexing='ij')
+
+    # 3x3 邻域求和 (uniform_filter 是平均，乘 9)
+    density = uniform_filter(grid, size=3, mode='constant') * 9
+    peaks = (density == maximum_filter(density, size=3, mode='constant')) & (density >= config['min_dwell'] * total)
+    if not np.any(peaks):
+        return np.zeros((0, 2)), np.zeros(0)
+
+    sites = np.column_stack((uniform_filter(grid * gx, size=3, mode='constant')[peaks],
+                             uniform_filter(grid * gy, size=3, mode='constant')[peaks])) * 9 / density[peaks][:, None]
+    dwell = density[peaks] / total
+
+    order = np.argsort(-dwell, kind='stable')
+    sites, dwell = sites[order], dwell[order]
+    keep = []
+    for i in range(len(sites)):  # 杂波点只有个位数，逐个去重即可
+        if all(np.hypot(*(sites[i] - sites[j])) >= config['filter_radius'] for j in keep):
+            keep.append(i)
+        if len(keep) == config['max_sites']:
+            break
+    return sites[keep], dwell[keep]
+
+
+def clutter_mask(xy, sites, radius):
+    """ 每帧是否落在任一杂波点 radius 范围内: [N] bool，一次广播算完所有帧 x 所有杂波点 """
+    if len(sites) == 0:
+        return np.zeros(len(xy), dtype=bool)
+    d2 = np.sum((xy[:, None, :2] - sites[None, :, :]) ** 2, axis=2)
+    return np.any(d2 < radius ** 2, axis=1)
+
+
+class StreamingClutterMap:
+    """ 指数衰减的占用栅格: 每帧先把旧占用乘 alpha = exp(-1 / (decay_time * fps)) 再加上新点 """
+
+    def __init__(self, config=CLUTTER_CONFIG):
+        self.config = config
+        self.alpha = np.exp(-1.0 / (config['decay_time'] * config['fps']))
+        self.grid, self.x_edges, self.y_edges = occupancy_grid(np.zeros((0, 2)), config['bounds'],
+                                                               config['cell_size'])
+        self.total = 0.0  # 衰减后的有效帧数，占比的分母
+
+    def update(self, block):
+        """ 加入一块帧 [n, 3] (可以含 nan)，返回更新后的杂波点 (sites, dwell) """
+        n = len(block)
+        # 块内第 k 帧到块末还要衰减 n - 1 - k 次，整块一次加权直方图
+        decay = self.alpha ** np.arange(n - 1, -1, -1)
+        valid = valid_points(block)
+        added, _, _ = occupancy_grid(block[valid], self.config['bounds'], self.config['cell_size'],
+                                     weights=decay[valid])
+        self.grid = self.grid * self.alpha ** n + added
+        self.total = self.total * self.alpha ** n + decay[valid].sum()
+        return find_clutter_sites(self.grid, self.x_edges, self.y_edges, self.total, self.config)
+
+
+def print_sites(sites, dwell):
+    if len(sites) == 0:
+        print("未检测到静止杂波")
+    for (x, y), d in zip(sites, dwell):
+        print(f"检测到静止杂波中心 (墙壁): X≈{x:.2f}, Y≈{y:.2f} (占 {d * 100:.1f}% 帧)")
+
+
+def clean_data(config=CLUTTER_CONFIG):
+    if config['mode'] == 'stream':
+        return clean_stream(config)
 
-def clean_data():
     print(f"正在读取 {INPUT_FILE} ...")
-    data = np.loadtxt(INPUT_FILE)
-    
-    # 1. 找到“钉子户” (出现频率最高的那个位置)
-    # 我们把空间划分成小格子，看哪个格子点最多
-    # 简单做法：计算中位数或众数，这里用 Histogram 找峰值
-    
-    # 仅统计有效点
-    valid_data = data[~np.isnan(data).any(axis=1)]
-    valid_data = valid_data[np.abs(valid_data[:,0]) > 0.01] # 去掉0,0点
-    
-    if len(valid_data) == 0:
+    records, meta = track_io.read_track(INPUT_FILE)
+    data = track_io.radar_positions(records)
+
+    # 1. 找到“钉子户” (停留时间长的位置)
+    # 把空间划分成小格子，在二维占用栅格上找所有点数特别多的格子
+    valid = valid_points(data)
+    if not np.any(valid):
         print("数据为空！")
         return
 
-    # 寻找聚类中心 (Static Clutter Center)
-    # 这里用简单的平均值可能不准，我们假设那个死锁点是最密集的
-    # 我们取所有点的平均值作为初始猜测，但如果人一直在动，静止点应该方差很小
-    
-    # 让我们用一种更暴力的方法：直接看日志里那个 0.24, 4.72
-    # 或者自动计算：
-    # 计算每个点到所有其他点的距离之和？太慢。
-    # 让我们假设日志里出现最多的就是静止点。
-    
-    # 统计 X 和 Y 的直方图峰值
-    hist_x, bins_x = np.histogram(valid_data[:, 0], bins=50)
-    peak_x = bins_x[np.argmax(hist_x)]
-    
-    hist_y, bins_y = np.histogram(valid_data[:, 1], bins=50)
-    peak_y = bins_y[np.argmax(hist_y)]
-    
-    static_center = np.array([peak_x, peak_y])
-    print(f"检测到静止杂波中心 (墙壁): X≈{peak_x:.2f}, Y≈{peak_y:.2f}")
-    
-    # 2. 开始过滤
-    cleaned_data = []
-    removed_count = 0
-    
-    for row in data:
-        x, y = row[0], row[1]
-        
-        # 计算到静止中心的距离
-        dist = np.sqrt((x - static_center[0])**2 + (y - static_center[1])**2)
-        
-        if dist < FILTER_RADIUS:
-            # 这是墙，删掉 (填 nan)
-            cleaned_data.append([np.nan, np.nan, np.nan])
-            removed_count += 1
-        else:
-            # 这是人 (或者是其他噪声，但至少不是那个墙)
-            cleaned_data.append(row)
-            
-    # 3. 保存
-    np.savetxt(OUTPUT_FILE, np.array(cleaned_data), fmt='%.4f')
-    
+    xy = data[valid, :2]
+    pad = config['cell_size']
+    bounds = (xy[:, 0].min() - pad, xy[:, 0].max() + pad, xy[:, 1].min() - pad, xy[:, 1].max() + pad)
+    grid, x_edges, y_edges = occupancy_grid(xy, bounds, config['cell_size'])
+    sites, dwell = find_clutter_sites(grid, x_edges, y_edges, len(xy), config)
+    print_sites(sites, dwell)
+
+    # 2. 开始过滤: 落在任一杂波点附近的帧是墙，删掉 (填 nan)
+    removed = clutter_mask(data, sites, config['filter_radius'])
+    cleaned_data = data.copy()
+    cleaned_data[removed] = np.nan
+    removed_count = int(np.count_nonzero(removed))
+
+    # 3. 保存 (帧号 / 时间 / 可信度沿用输入，被删的帧标记为无效)
+    cleaned = np.array(records)
+    cleaned['valid'][removed] = 0
+    output = track_io.write_track(OUTPUT_FILE, cleaned, **dict(meta, clutter_sites=sites.tolist()))
+
     print("-" * 30)
     print(f"清洗完成！")
     print(f"共处理 {len(data)} 帧")
     print(f"删除了 {removed_count} 个静止帧 ({(removed_count/len(data))*100:.1f}%)")
-    print(f"结果已保存至: {OUTPUT_FILE}")
+    print(f"结果已保存至: {output}")
     print("-" * 30)
-    
+
+    if not config['show_plot']:
+        return cleaned_data
+
     # 4. 画个图对比一下
     plt.figure(figsize=(10, 5))
     plt.subplot(1, 2, 1)
     plt.title("Original (With Wall)")
     plt.scatter(data[:,0], data[:,1], s=1, alpha=0.5)
-    plt.scatter(static_center[0], static_center[1], c='r', marker='x', s=100, label='Clutter')
+    plt.scatter(sites[:, 0], sites[:, 1], c='r', marker='x', s=100, label='Clutter')
     plt.legend()
-    
+
     plt.subplot(1, 2, 2)
     plt.title("Cleaned (Person Only)")
-    cl_arr = np.array(cleaned_data)
-    plt.scatter(cl_arr[:,0], cl_arr[:,1], s=5, c='g', alpha=0.8)
-    plt.xlim(np.min(data[:,0]), np.max(data[:,0]))
-    plt.ylim(np.min(data[:,1]), np.max(data[:,1]))
-    
+    plt.scatter(cleaned_data[:,0], cleaned_data[:,1], s=5, c='g', alpha=0.8)
+    plt.xlim(np.nanmin(data[:,0]), np.nanmax(data[:,0]))
+    plt.ylim(np.nanmin(data[:,1]), np.nanmax(data[:,1]))
+
     plt.show()
+    return cleaned_data
+
+
+def clean_stream(config=CLUTTER_CONFIG):
+    """ 分块读入 -> 更新衰减占用栅格 -> 用当前杂波点过滤这一块 -> 追加写出，内存只和块大小有关 """
+    print(f"正在流式清洗 {INPUT_FILE} (衰减时间常数 {config['decay_time']} 秒) ...")
+    clutter_map = StreamingClutterMap(config)
+    total = removed_count = 0
+    sites, dwell = np.zeros((0, 2)), np.zeros(0)
+
+    records, meta = track_io.read_track(INPUT_FILE)
+    with track_io.TrackWriter(OUTPUT_FILE, **meta) as writer:
+        for s in range(0, len(records), config['block_frames']):
+            block = np.array(records[s:s + config['block_frames']])
+            positions = track_io.radar_positions(block)
+            sites, dwell = clutter_map.update(positions)
+            removed = clutter_mask(positions, sites, config['filter_radius'])
+            block['valid'][removed] = 0
+            writer.append(block)
+            total += len(block)
+            removed_count += int(np.count_nonzero(removed))
+
+    print("结束时的杂波点:")
+    print_sites(sites, dwell)
+    print("-" * 30)
+    print(f"清洗完成！")
+    print(f"共处理 {total} 帧")
+    print(f"删除了 {removed_count} 个静止帧 ({(removed_count/max(total, 1))*100:.1f}%)")
+    print(f"结果已保存至: {writer.path}")
+    print("-" * 30)
+
 
 if __name__ == "__main__":
-    clean_data()
\ No newline at end of file
+    clean_data()
@@ -1,11 +1,13 @@
 import numpy as np
 import cv2
 import os
+import timebase
+import track_io
 
 # ==========================================
 # 诊断模式配置
 # ==========================================
-RADAR_FILE = 'radar_track1.txt'  #先试 Radar 1
+RADAR_FILE = 'radar_track1.trk'  #先试 Radar 1
 VIDEO_FILE = 'a3.mp4'            
 OUTPUT_NPZ = 'calib_diagnostic.npz'
 
@@ -29,6 +31,7 @@ dist_coeffs = np.zeros((4,1))
 
 RADAR_FPS = 16.13
 VIDEO_FPS = 30.0
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS}, 'radar': {'rate': RADAR_FPS}})
 DISPLAY_WIDTH = 1280
 
 def get_rotation_matrix(pitch, yaw, roll):
@@ -39,12 +42,12 @@ def get_rotation_matrix(pitch, yaw, roll):
     return Rz @ Ry @ Rx
 
 def main():
-    if not os.path.exists(RADAR_FILE):
+    if not track_io.track_exists(RADAR_FILE):
         print(f"❌ 找不到文件: {RADAR_FILE}")
         return
 
     print(f"📂 正在读取雷达文件: {RADAR_FILE} ...")
-    radar_data = np.loadtxt(RADAR_FILE)
+    radar_data = track_io.load_radar_track(RADAR_FILE)
     print(f"✅ 雷达数据读取成功，共 {len(radar_data)} 行")
     
     # 检查数据是否真的在动
@@ -71,9 +74,9 @@ def main():
                 continue
             frame_idx += 1
 
-        t_vid = frame_idx / VIDEO_FPS
-        t_rad = t_vid + params['time_offset']
-        rad_idx = int(t_rad * RADAR_FPS)
+        TIMEBASE.set_offset('radar', params['time_offset'])
+        t_rad = TIMEBASE.local_time('video', 'radar', frame_idx)
+        rad_idx = TIMEBASE.convert('video', 'radar', frame_idx)
 
         # === 核心诊断打印 ===
         # 每隔 10 帧打印一次，防止刷屏太快
@@ -1,55 +1,44 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+import timebase
+import track_io
 
 # ==========================================
 # 调试配置：填入你刚才报错的那一组文件
 # ==========================================
 # 比如看看 P2 和 C3 (虽然误差很大，但至少算出来了，适合分析)
-RADAR_FILE = 'radar_track2.txt' 
-CAM_FILE = 'camera_track3.txt'
+RADAR_FILE = 'radar_track2.trk' 
+CAM_FILE = 'camera_track3.trk'
 
 # 视频和雷达的帧率
 VIDEO_FPS = 30.0
 RADAR_FPS = 16.13
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS}, 'radar': {'rate': RADAR_FPS}})
 
 def check_data_shape():
-    if not os.path.exists(RADAR_FILE) or not os.path.exists(CAM_FILE):
+    if not track_io.track_exists(RADAR_FILE) or not track_io.track_exists(CAM_FILE):
         print("错误：文件找不到")
         return
 
     # 1. 读取原始数据
-    r_data = np.loadtxt(RADAR_FILE) # [x, y, z]
-    # 跳过第一行表头读取相机数据
-    try:
-        c_data = np.loadtxt(CAM_FILE, skiprows=1) # [frame, u, v]
-    except:
-        c_data = np.loadtxt(CAM_FILE) # 如果没有表头
+    r_data = track_io.load_radar_track(RADAR_FILE) # [x, y, z]
+    c_data = track_io.load_camera_track(CAM_FILE) # [frame, u, v]
 
     # 2. 提取配对点
-    matched_rx = []
-    matched_ry = []
-    matched_u = []
-    matched_v = []
-    
     print(f"雷达数据行数: {len(r_data)}")
     print(f"相机数据行数: {len(c_data)}")
 
-    for row in c_data:
-        frame_id = row[0]
-        # 时间对齐
-        t = frame_id / VIDEO_FPS
-        rad_idx = int(t * RADAR_FPS)
-        
-        if rad_idx < len(r_data):
-            r_pt = r_data[rad_idx]
-            # 排除无效点 (雷达经常会在没人的时候输出 0,0,0 或 nan)
-            if not np.isnan(r_pt[0]) and (abs(r_pt[0]) > 0.1 or abs(r_pt[1]) > 0.1):
-                matched_rx.append(r_pt[0]) # 雷达 X (左右)
-                matched_ry.append(r_pt[1]) # 雷达 Y (深度)
-                
-                matched_u.append(row[1])   # 相机 U (左右)
-                matched_v.append(row[2])   # 相机 V (上下)
+    # 时间对齐: 所有相机帧一次换算到雷达帧号
+    rad_idx = TIMEBASE.convert('video', 'radar', c_data[:, 0])
+    ok = timebase.in_range(rad_idx, len(r_data))
+    r_pt = r_data[rad_idx[ok]]
+    # 排除无效点 (雷达经常会在没人的时候输出 0,0,0 或 nan)
+    valid = ~np.isnan(r_pt[:, 0]) & ((np.abs(r_pt[:, 0]) > 0.1) | (np.abs(r_pt[:, 1]) > 0.1))
+    matched_rx = r_pt[valid, 0]          # 雷达 X (左右)
+    matched_ry = r_pt[valid, 1]          # 雷达 Y (深度)
+    matched_u = c_data[ok][valid, 1]     # 相机 U (左右)
+    matched_v = c_data[ok][valid, 2]     # 相机 V (上下)
 
     if len(matched_rx) < 5:
         print("严重警告：有效匹配点少于 5 个！无法分析形状。")
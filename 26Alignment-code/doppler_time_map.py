@@ -1,5 +1,10 @@
 import numpy as np
 import matplotlib.pyplot as plt
+import fft_backend
+import time
+from adc_reader import open_adc, to_complex
+import radar_cache
+import roi
 
 # ==========================================
 # 配置参数
@@ -11,93 +16,180 @@ CONFIG = {
     'num_rx_antennas': 4,
     'num_tx_antennas': 3,
     'fps': 16.13,
+    'range_resolution': 0.044,
+    'roi': roi.ROI_CONFIG,       # 只在距离门内做 Doppler 和积累，见 roi.py (方位扇区这里不用)
+    'precision': 'single',       # complex64 / float32 全程单精度，见 adc_reader.py
+    'concat_split_files': True,  # 自动拼接 _p2, _p3 ... 分段，整段采集一次处理
+    'block_frames': 32,          # 每次处理的帧数 (全通道每帧约 1.5 MB 复数)
+    # 参与积累的通道: 'all' = 12 个虚拟通道非相干积累；(tx, rx) = 只用单个通道 (旧做法是 (0, 0))
+    'channels': 'all',
+    # 静止杂波去除:
+    #   'ema'    - 指数滑动平均估计杂波，单遍流式，适合任意长度录制 (默认)
+    #   'global' - 整段录制的平均 (旧做法)，先流式求和一遍再处理一遍，也不需要整段进内存
+    #   'none'   - 不去杂波
+    'clutter_removal': 'ema',
+    'clutter_time_constant': 2.0, # 'ema' 的时间常数 (秒)，越大越只去掉真正静止的东西
+    'show_plot': True,           # 服务器上无界面跑时设为 False
+    'cache': radar_cache.CACHE_CONFIG, # 频谱图的磁盘缓存，见 radar_cache.py；None 关闭
 }
 
+def select_channels(raw, channels):
+    """ 在 int16 原始视图上选通道: [Frames, Loops, TX, RX, Samples, 2] -> [Frames, Loops, Ch, Samples, 2] """
+    if channels == 'all':
+        return raw.reshape(raw.shape[:2] + (-1,) + raw.shape[4:])
+    tx, rx = channels
+    return raw[:, :, tx:tx + 1, rx]
+
+class DopplerTimeEngine:
+    """ 流式 Micro-Doppler: 按帧顺序一块一块喂进来，每块产出 [Frames, Doppler] 幅度
+
+    Range-FFT -> 去静止杂波 -> Doppler-FFT -> 取模后对通道和距离非相干求和。
+    杂波估计的状态在块之间延续，所以分块大小不影响结果。
+    帧索引标记为异常的帧 (reader.valid_mask() 为 False) 不参与杂波估计，输出整行为 nan。
+    """
+
+    def __init__(self, reader, config):
+        self.reader = reader
+        self.config = config
+        self.channels = config.get('channels', 'all')
+        # 只取距离门内的单元 (默认 0.5~5 米)
+        self.region = roi.RegionOfInterest(config['roi'], config['num_adc_samples'], config['range_resolution'])
+        self.mode = config.get('clutter_removal', 'ema')
+        # 一阶 IIR: c[n] = a * c[n-1] + (1 - a) * x[n]
+        self.alpha = np.exp(-1.0 / (config['clutter_time_constant'] * config['fps']))
+        self.state = None    # 'ema' 的滤波器状态
+        self.clutter = None  # 'global' 的整段平均
+        self.valid = reader.valid_mask()
+
+    def range_fft(self, start, stop):
+        """ [start, stop) 帧的 Range-FFT (只留距离门内) -> [Frames, Loops, Ch, Range] 复数 """
+        # 先在 int16 原始视图上选通道，再转复数
+        raw = select_channels(self.reader.raw_frames(start, stop), self.channels)
+        # fft_backend (默认 scipy.fft 多线程) 对 complex64 输入直接按单精度计算
+        return self.region.range_fft(to_complex(raw, self.reader.complex_dtype), axis=-1)
+
+    def estimate_global_clutter(self, block_frames):
+        """ 'global' 模式的第一遍: 流式累加整段录制的平均值，内存只占一帧 """
+        total = None
+        for s in range(0, self.reader.num_frames, block_frames):
+            e = min(s + block_frames, self.reader.num_frames)
+            block_sum = self.range_fft(s, e)[self.valid[s:e]].sum(axis=0, dtype=np.complex128)
+            total = block_sum if total is None else total + block_sum
+        count = max(int(np.count_nonzero(self.valid)), 1)
+        self.clutter = (total / count).astype(self.reader.complex_dtype)
+
+    def remove_clutter(self, range_fft, valid=None):
+        """ valid [Frames] bool: 为 False 的帧不更新杂波估计 ('ema')，输出置 0 (调用方再置 nan) """
+        if valid is None:
+            valid = np.ones(len(range_fft), dtype=bool)
+        if self.mode == 'none':
+            return range_fft
+        if self.mode == 'global':
+            return range_fft - self.clutter
+        if self.mode == 'ema':
+            a = self.alpha
+            out = np.zeros_like(range_fft)
+            if self.state is None:
+                if not valid.any():
+                    return out
+                # 从第一个可用帧开始估计，避免开头几秒被初值 0 拉偏
+                self.state = range_fft[np.argmax(valid)].copy()
+            # 逐帧递推，每帧是一次整帧的向量运算 (比 lfilter 沿第 0 轴快得多)
+            for i in range(len(range_fft)):
+                if not valid[i]:
+                    continue
+                self.state *= a
+                self.state += (1 - a) * range_fft[i]
+                np.subtract(range_fft[i], self.state, out=out[i])
+            return out
+        raise ValueError(f"未知的杂波去除方式: {self.mode}")
+
+    def process_block(self, start, stop):
+        """ 处理 [start, stop) 帧 (必须按顺序调用)，返回 [Frames, Doppler] 非相干积累幅度 """
+        valid = self.valid[start:stop]
+        range_fft = self.remove_clutter(self.range_fft(start, stop), valid)
+
+        # Doppler FFT (沿 Loops)，零频移到中间
+        doppler_fft = fft_backend.fftshift(fft_backend.fft(range_fft, axis=1), axes=1)
+
+        # 取模后对通道和距离求和 -> [Frames, Doppler]，异常帧整行 nan
+        spectrum = np.abs(doppler_fft).sum(axis=(2, 3))
+        spectrum[~valid] = np.nan
+        return spectrum
+
+def compute_doppler_time_map(reader, config):
+    """ 流式计算 [Frames, Doppler] 频谱图，峰值内存只和 block_frames 有关 """
+    engine = DopplerTimeEngine(reader, config)
+    block_frames = config['block_frames']
+
+    params = {key: config[key] for key in ('num_adc_samples', 'num_chirps_per_frame',
+                                           'num_rx_antennas', 'num_tx_antennas')}
+    params.update(channels=engine.channels, clutter_removal=engine.mode,
+                  roi=config['roi'], range_resolution=config['range_resolution'])
+    if engine.mode == 'ema':
+        params.update(clutter_time_constant=config['clutter_time_constant'], fps=config['fps'])
+    if not engine.valid.all():
+        # 跳过的帧会影响杂波估计，帧号进缓存键
+        params.update(skipped_frames=np.flatnonzero(~engine.valid).tolist())
+
+    t0 = time.time()
+    def compute(start, stop):
+        if engine.mode == 'global' and engine.clutter is None:
+            print("第一遍: 统计整段录制的静止杂波 ...")
+            engine.estimate_global_clutter(block_frames)
+        return engine.process_block(start, stop)
+
+    def report(done, total):
+        print(f"Doppler 进度: {done}/{total} 帧 ({done / total * 100:.1f}%) | 已用 {time.time() - t0:.1f}s")
+
+    return radar_cache.cached_frames(reader, 'doppler_time', params, (reader.num_loops,), np.float32,
+                                     compute, block_frames, config.get('cache'), report)
+
 def generate_doppler_time_map(config):
     print(f"正在处理: {config['file_path']} ...")
-    
-    # 1. 读取与预处理
-    try:
-        raw_data = np.fromfile(config['file_path'], dtype=np.int16)
-    except FileNotFoundError:
-        print(f"错误: 找不到文件 {config['file_path']}")
-        return
 
-    raw_data = raw_data.astype(np.float32)
-    complex_data = raw_data[0::2] + 1j * raw_data[1::2]
-    
-    frame_size = config['num_adc_samples'] * config['num_chirps_per_frame'] * config['num_rx_antennas']
-    num_frames = len(complex_data) // frame_size
-    
-    if num_frames == 0:
-        print("错误: 数据不足一帧")
+    # 1. 内存映射读取
+    reader = open_adc(config['file_path'], config)
+    if reader is None:
         return
 
-    complex_data = complex_data[:num_frames * frame_size]
-    
-    # Reshape
-    data_cube = complex_data.reshape(num_frames, 
-                                     config['num_chirps_per_frame'], 
-                                     config['num_rx_antennas'], 
-                                     config['num_adc_samples'])
-
-    # 2. 分离 TX 天线
-    num_loops = config['num_chirps_per_frame'] // config['num_tx_antennas']
-    
-    # Reshape以分离TX
-    data_cube = data_cube.reshape(num_frames, num_loops, config['num_tx_antennas'], 
-                                  config['num_rx_antennas'], config['num_adc_samples'])
-    
-    # 取 TX0, RX0 
-    radar_data_1tx_1rx = data_cube[:, :, 0, 0, :] # Shape: [Frames, Loops, Samples]
-
-    # 3. 信号处理
-    print("执行 2D-FFT (Range -> Doppler)...")
-    
-    # 3.1 Range FFT
-    range_fft = np.fft.fft(radar_data_1tx_1rx, axis=-1)
-    
-    # 去掉静止杂波 (Clutter Removal)
-    range_fft = range_fft - np.mean(range_fft, axis=0, keepdims=True)
-
-    # 3.2 Doppler FFT
-    doppler_fft = np.fft.fft(range_fft, axis=1)
-    
-    # Shift zero frequency to center (这里修正了参数名为 axes)
-    doppler_fft = np.fft.fftshift(doppler_fft, axes=1)
-
-    # 4. 生成 Micro-Doppler 图
-    # 只取前几米的有效距离
-    valid_range_bins = config['num_adc_samples'] // 2
-    
-    # 取模并对 Range 维度求和
-    mag_data = np.abs(doppler_fft[:, :, :valid_range_bins])
-    time_doppler_map = np.sum(mag_data, axis=-1)
-    
+    num_frames = reader.num_frames
+    num_loops = reader.num_loops
+
+    # 2. 信号处理 (按块流式: Range -> 去杂波 -> Doppler -> 非相干积累)
+    channels = config.get('channels', 'all')
+    print(f"执行 2D-FFT (Range -> Doppler)，通道: "
+          f"{'全部 %d 个虚拟通道' % (reader.num_tx * reader.num_rx) if channels == 'all' else channels} ...")
+    doppler_time = compute_doppler_time_map(reader, config)
+
+    if not config.get('show_plot', True):
+        return doppler_time
+
+    # 3. 生成 Micro-Doppler 图
     # 转置绘图
-    time_doppler_map = time_doppler_map.T 
-    
+    time_doppler_map = np.asarray(doppler_time).T
+
     # Log scale
     time_doppler_map = 20 * np.log10(time_doppler_map + 1e-9)
 
-    # 5. 绘图
+    # 4. 绘图
     print("正在绘图...")
     plt.figure(figsize=(12, 6))
-    
+
     max_time = num_frames / config['fps']
-    
+
     plt.imshow(time_doppler_map, aspect='auto', cmap='jet', origin='lower',
                extent=[0, max_time, -num_loops/2, num_loops/2])
-    
+
     plt.title(f'Micro-Doppler Spectrogram ({config["file_path"]})')
     plt.xlabel('Time (Seconds)')
     plt.ylabel('Doppler Velocity (Bin Index)')
     plt.colorbar(label='Magnitude (dB)')
-    
+
     plt.axhline(0, color='white', linestyle='--', alpha=0.5)
-    
+
     plt.tight_layout()
     plt.show()
 
 if __name__ == "__main__":
-    generate_doppler_time_map(CONFIG)
\ No newline at end of file
+    generate_doppler_time_map(CONFIG)
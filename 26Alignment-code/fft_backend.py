@@ -0,0 +1,128 @@
+import numpy as np
+import os
+import time
+import scipy.fft
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft
+except ImportError:  # pyFFTW 是可选依赖，没装时只用 scipy / numpy
+    pyfftw = None
+
+# ==========================================
+# FFT 后端 (Range / Doppler / Angle FFT 统一入口)
+# ==========================================
+# 各雷达脚本都通过这里的 fft() / fftshift() 做变换，后端在一个地方配置:
+#   'scipy'  - scipy.fft，workers 多线程，complex64 按单精度算 (默认)
+#   'pyfftw' - pyFFTW (需要 pip install pyfftw)，FFTW 计划按 (形状, 类型, 轴) 缓存复用，
+#              同样形状的块第二次起不再重新规划
+#   'numpy'  - np.fft，单线程，只用于和旧结果对比
+#   'auto'   - 第一次调用时在本机对我们用到的 256 / 128 / 64 点变换跑一遍
+#              benchmark()，选最快的后端
+# 直接运行本文件会打印各后端在本机的耗时。
+
+FFT_CONFIG = {
+    'backend': 'scipy',
+    'workers': -1,                  # 线程数，-1 = 全部 CPU 核；多进程处理时每个进程设为 1
+    'planner_effort': 'FFTW_MEASURE', # pyFFTW 规划强度，MEASURE 第一次慢一点、之后更快
+}
+
+# 基准测试的典型变换: (名字, 输入形状, 变换轴, 补零点数)
+BENCHMARK_SHAPES = [
+    ('range 256',   (32, 128, 12, 256), -1, None), # 一块帧的 Range-FFT
+    ('doppler 128', (32, 128, 12, 128),  1, None), # 沿 Loops 的 Doppler-FFT
+    ('angle 64',    (256, 12, 256),      1, 64),   # 12 个虚拟通道补零到 64 点的 Angle-FFT
+]
+
+_state = {'backend': None, 'workers': FFT_CONFIG['workers'],
+          'planner_effort': FFT_CONFIG['planner_effort']}
+
+
+def available_backends():
+    return ['scipy', 'numpy'] + (['pyfftw'] if pyfftw is not None else [])
+
+
+def configure(backend=None, workers=None, planner_effort=None):
+    """ 设置后端 / 线程数，整个进程只需要调用一次；参数为 None 的保持不变 """
+    if workers is not None:
+        _state['workers'] = workers
+    if planner_effort is not None:
+        _state['planner_effort'] = planner_effort
+    if backend is None:
+        return _state['backend']
+    if backend == 'auto':
+        timings = benchmark()
+        backend = min(timings, key=timings.get)
+        print(f"FFT 后端自动选择: {backend}")
+    if backend not in available_backends():
+        raise ValueError(f"FFT 后端不可用: {backend} (可用: {', '.join(available_backends())})")
+    if backend == 'pyfftw':
+        # 计划缓存: 同样的输入形状/类型/轴只规划一次
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(60)
+    _state['backend'] = backend
+    return backend
+
+
+def _workers():
+    workers = _state['workers']
+    return (os.cpu_count() or 1) if workers == -1 else workers
+
+
+def _fft_with(backend, x, n=None, axis=-1):
+    if backend == 'scipy':
+        return scipy.fft.fft(x, n=n, axis=axis, workers=_state['workers'])
+    if backend == 'pyfftw':
+        return pyfftw.interfaces.scipy_fft.fft(x, n=n, axis=axis, workers=_workers(),
+                                               planner_effort=_state['planner_effort'])
+    return np.fft.fft(x, n=n, axis=axis)
+
+
+def fft(x, n=None, axis=-1):
+    """ 一维复数 FFT，用法同 np.fft.fft；complex64 输入得到 complex64 输出 (numpy 后端除外) """
+    if _state['backend'] is None:
+        configure(FFT_CONFIG['backend'])
+    return _fft_with(_state['backend'], x, n, axis)
+
+
+def fftshift(x, axes=None):
+    """ 零频移到中间 (纯数据重排，各后端一样) """
+    return np.fft.fftshift(x, axes=axes)
+
+
+def benchmark(shapes=BENCHMARK_SHAPES, repeats=5, verbose=False):
+    """ 在本机测各后端跑一遍典型变换的总耗时 (秒，取每个形状最快的一次)
+
+    返回 {后端名: 耗时}，输入是 complex64 (和 precision='single' 的数据一致)。
+    """
+    rng = np.random.default_rng(0)
+    inputs = [(name, (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64),
+               axis, n) for name, shape, axis, n in shapes]
+
+    timings = {}
+    for backend in available_backends():
+        if backend == 'pyfftw':
+            pyfftw.interfaces.cache.enable()
+        total = 0.0
+        for name, x, axis, n in inputs:
+            _fft_with(backend, x, n, axis)  # 预热 (pyFFTW 在这里规划)
+            best = np.inf
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                _fft_with(backend, x, n, axis)
+                best = min(best, time.perf_counter() - t0)
+            total += best
+            if verbose:
+                print(f"  {backend:<7s} {name:<12s} {best * 1000:8.2f} ms")
+        timings[backend] = total
+    return timings
+
+
+if __name__ == "__main__":
+    print(f"可用后端: {', '.join(available_backends())} | 线程数: {_workers()}")
+    print("-" * 50)
+    timings = benchmark(verbose=True)
+    print("-" * 50)
+    for backend, total in sorted(timings.items(), key=lambda kv: kv[1]):
+        print(f"{backend:<7s} 合计 {total * 1000:8.2f} ms")
+    print(f"推荐: FFT_CONFIG['backend'] = '{min(timings, key=timings.get)}'")
@@ -0,0 +1,253 @@
+import numpy as np
+import json
+import os
+import sys
+import time
+import adc_reader
+
+# ==========================================
+# 帧索引 sidecar: 每帧的字节偏移 / 名义时间戳 / 能量指纹 / 完整性标记
+# ==========================================
+# 以前各脚本都是 len // frame_size 算帧数、按 fps = 16.13 换算时间，
+# 文件末尾半帧、DCA1000 丢包补零的帧、ADC 饱和的帧都不会被发现。
+# 这里对一次采集 (单个 .bin 或 _p1, _p2 ... 拼接流) 扫描一遍，写一个很小的
+# <文件名>.frames.npz，之后各步骤直接查表:
+#   - offsets:    每帧在拼接流里的起始字节 (跨文件时用 locate() 换算成 文件 + 文件内偏移)
+#   - timestamps: 名义时间戳 帧号 / fps (秒，相对采集开始)
+#   - energy:     每帧前 fingerprint_loops 个 Loop 的平均功率 (int16^2)，只读这一小段，
+#                 不用把整帧读进来；之后 check() 重新算一帧的指纹就能 O(1) 校验
+#   - flags:      FLAG_* 按位或，0 表示正常
+# 索引按源文件的 (路径, 大小, 修改时间) 判断是否过期，过期自动重建。
+# 虚拟裁剪 (.trim.json) 共用源文件的索引，帧号加上 reader.start_frame 即可。
+#
+# 直接运行: python frame_index.py adc_data.bin [更多分段 ...]  扫描并打印报告
+
+FRAME_INDEX_CONFIG = {
+    'fingerprint_loops': 1,       # 每帧参与指纹计算的 Loop 数 (1 个 Loop 约 24 KB，整帧 3 MB)
+    'block_frames': 256,          # 扫描时每次处理的帧数
+    'zero_fraction': 0.25,        # 指纹样本中 0 的比例超过它 -> 疑似丢包补零
+    'saturation_fraction': 0.01,  # 达到 int16 上下限的比例超过它 -> ADC 饱和
+    'energy_outlier_db': 12.0,    # 能量偏离全程中位数超过这么多 dB -> 能量异常
+}
+
+INDEX_EXT = '.frames.npz'
+
+FLAG_PARTIAL = 1          # 文件末尾不完整的帧 (只有部分字节)
+FLAG_ZERO_FILLED = 2      # 大段为 0，DCA1000 丢包时会补零
+FLAG_SATURATED = 4        # ADC 饱和
+FLAG_ENERGY_OUTLIER = 8   # 能量和全程中位数相差过大 (采样丢失导致帧错位时通常也会触发)
+
+# 数据本身不可信的帧: 各处理步骤 (range_time_map / doppler_time_map / radar_point_cloud)
+# 通过 reader.valid_mask() 跳过或置 nan；饱和、能量异常只报告，数据仍然照常处理
+SKIP_FLAGS = FLAG_PARTIAL | FLAG_ZERO_FILLED
+
+FLAG_NAMES = {
+    FLAG_PARTIAL: '不完整',
+    FLAG_ZERO_FILLED: '补零',
+    FLAG_SATURATED: '饱和',
+    FLAG_ENERGY_OUTLIER: '能量异常',
+}
+
+
+def index_path(source_paths):
+    """ 采集 (第一个源文件) 对应的索引路径: adc_xxx.bin -> adc_xxx.frames.npz """
+    return os.path.splitext(source_paths[0])[0] + INDEX_EXT
+
+
+def _identity(source_paths):
+    """ 源文件身份 [(绝对路径, 大小, 修改时间)]，判断索引是否过期 """
+    files = []
+    for path in source_paths:
+        st = os.stat(path)
+        files.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return files
+
+
+def fingerprint(raw, loops=1):
+    """ int16 帧块 [n, Loops, ...] -> (能量, 0 的比例, 饱和比例)，都是 [n] """
+    x = raw[:, :loops].reshape(raw.shape[0], -1)
+    energy = np.mean(np.square(x, dtype=np.float32), axis=1)
+    zeros = np.mean(x == 0, axis=1)
+    saturated = np.mean((x >= np.iinfo(np.int16).max) | (x <= np.iinfo(np.int16).min), axis=1)
+    return energy, zeros, saturated
+
+
+class FrameIndex:
+    """ 一次采集的帧索引 (按拼接流中的全局帧号) """
+
+    def __init__(self, offsets, timestamps, energy, flags, segment_starts, meta):
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self.energy = energy
+        self.flags = flags
+        self.segment_starts = segment_starts
+        self.meta = meta
+        self.frame_bytes = meta['frame_bytes']
+        self.fps = meta['fps']
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def num_complete(self):
+        """ 完整帧数 (不含末尾的不完整帧) """
+        return int(np.count_nonzero((self.flags & FLAG_PARTIAL) == 0))
+
+    def locate(self, idx):
+        """ 帧号 -> (源文件路径, 文件内字节偏移, 是否跨到下一个文件) """
+        offset = int(self.offsets[idx])
+        seg = int(np.searchsorted(self.segment_starts, offset, side='right')) - 1
+        spans = offset + self.frame_bytes > self.segment_starts[seg + 1]
+        return self.meta['files'][seg][0], offset - int(self.segment_starts[seg]), bool(spans)
+
+    def bad_frames(self, start=0, stop=None, mask=0xFF):
+        """ [start, stop) 内带有 mask 中任一标记的帧号 """
+        stop = len(self) if stop is None else min(stop, len(self))
+        return start + np.flatnonzero(self.flags[start:stop] & mask)
+
+    def valid_mask(self, start=0, stop=None, flags=SKIP_FLAGS):
+        """ [start, stop) 内每帧是否可用 (bool)，带有 flags 中任一标记的帧为 False """
+        stop = len(self) if stop is None else min(stop, len(self))
+        return (self.flags[start:stop] & flags) == 0
+
+    def check(self, reader, idx, rtol=1e-3):
+        """ 重新计算一帧的能量指纹和索引比较，数据被改动 / 帧错位时返回 False
+
+        reader 是同一采集的 AdcCubeReader，idx 是 reader 自己的帧号 (裁剪时自动加起始帧)。
+        """
+        global_idx = idx + reader.start_frame
+        energy, _, _ = fingerprint(reader.raw_frames(idx, idx + 1), self.meta['fingerprint_loops'])
+        return bool(np.isclose(energy[0], self.energy[global_idx], rtol=rtol))
+
+    def summary(self, start=0, stop=None):
+        """ {标记名: 帧数}，只统计 [start, stop) """
+        stop = len(self) if stop is None else min(stop, len(self))
+        flags = self.flags[start:stop]
+        return {name: int(np.count_nonzero(flags & bit)) for bit, name in FLAG_NAMES.items()}
+
+    def save(self, path):
+        np.savez(path, offsets=self.offsets, timestamps=self.timestamps, energy=self.energy,
+                 flags=self.flags, segment_starts=self.segment_starts,
+                 meta=np.array(json.dumps(self.meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['offsets'], data['timestamps'], data['energy'], data['flags'],
+                       data['segment_starts'], json.loads(str(data['meta'])))
+
+
+def build_index(source_paths, config, index_config=FRAME_INDEX_CONFIG, verbose=False):
+    """ 扫描源文件 (按顺序拼接)，返回 FrameIndex
+
+    帧数、偏移、时间戳只由文件大小决定；能量指纹每帧只读前 fingerprint_loops 个 Loop。
+    """
+    t0 = time.perf_counter()
+    reader = adc_reader.AdcCubeReader(list(source_paths), config)
+    num_frames = reader.num_frames
+    partial = reader.trailing_bytes >= reader.frame_bytes // reader.num_loops  # 至少一个完整 Loop 才算一帧
+    loops = index_config['fingerprint_loops']
+
+    total = num_frames + (1 if reader.trailing_bytes else 0)
+    offsets = np.arange(total, dtype=np.int64) * reader.frame_bytes
+    timestamps = np.arange(total, dtype=np.float64) / reader.fps
+    energy = np.full(total, np.nan, dtype=np.float32)
+    flags = np.zeros(total, dtype=np.uint8)
+
+    for s in range(0, num_frames, index_config['block_frames']):
+        e = min(s + index_config['block_frames'], num_frames)
+        energy[s:e], zeros, saturated = fingerprint(reader.raw_frames(s, e), loops)
+        flags[s:e] |= np.where(zeros > index_config['zero_fraction'], FLAG_ZERO_FILLED, 0).astype(np.uint8)
+        flags[s:e] |= np.where(saturated > index_config['saturation_fraction'], FLAG_SATURATED, 0).astype(np.uint8)
+        if verbose:
+            print(f"\r  扫描帧索引: {e}/{num_frames}", end='')
+    if verbose and num_frames:
+        print()
+
+    if reader.trailing_bytes:
+        flags[-1] |= FLAG_PARTIAL
+        if partial:
+            # 末尾半帧里完整的 Loop 也算一下指纹，便于判断是正常截断还是坏数据
+            raw = reader._read_bytes(num_frames * reader.frame_bytes,
+                                     num_frames * reader.frame_bytes + reader.frame_bytes // reader.num_loops)
+            energy[-1] = fingerprint(raw.reshape((1, 1) + reader.frame_shape[1:]), 1)[0][0]
+
+    # 能量异常: 和正常帧能量中位数比较 (dB)
+    normal = (flags == 0) & (energy > 0)
+    if np.any(normal):
+        with np.errstate(divide='ignore'):
+            level = 10 * np.log10(energy)
+        median = np.median(level[normal])
+        outlier = np.isfinite(level) & (np.abs(level - median) > index_config['energy_outlier_db'])
+        flags[outlier | (energy == 0)] |= FLAG_ENERGY_OUTLIER
+
+    meta = {
+        'files': _identity(reader.source_paths),
+        'frame_bytes': int(reader.frame_bytes),
+        'fps': float(reader.fps),
+        'fingerprint_loops': int(loops),
+        'trailing_bytes': int(reader.trailing_bytes),
+        'scan_seconds': round(time.perf_counter() - t0, 3),
+    }
+    return FrameIndex(offsets, timestamps, energy, flags, reader._seg_starts.copy(), meta)
+
+
+def load_index(source_paths, config):
+    """ 读已有索引，不存在或已过期 (源文件 / 帧大小 / fps 变了) 时返回 None """
+    path = index_path(source_paths)
+    if not os.path.exists(path):
+        return None
+    try:
+        index = FrameIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    frame_bytes = (config['num_adc_samples'] * config['num_chirps_per_frame'] *
+                   config['num_rx_antennas'] * adc_reader.BYTES_PER_COMPLEX_SAMPLE)
+    if (index.meta['files'] != _identity(source_paths) or index.frame_bytes != frame_bytes or
+            index.fps != config.get('fps', 16.13)):
+        return None
+    return index
+
+
+def load_or_build(reader, config, index_config=FRAME_INDEX_CONFIG, verbose=True):
+    """ reader 对应采集的索引: 有效的 sidecar 直接读，否则扫描一遍并写 sidecar """
+    index = load_index(reader.source_paths, config)
+    if index is not None:
+        return index
+    index = build_index(reader.source_paths, config, index_config, verbose=verbose)
+    try:
+        index.save(index_path(reader.source_paths))
+    except OSError as e:  # 只读目录: 这次用内存里的索引
+        print(f"  注意: 帧索引无法写入 ({e})")
+    return index
+
+
+def print_report(index, start=0, stop=None):
+    stop = len(index) if stop is None else min(stop, len(index))
+    print(f"帧索引: {index.num_complete} 个完整帧, {index.fps} fps, "
+          f"约 {index.num_complete / index.fps:.1f} 秒 (扫描 {index.meta['scan_seconds']} 秒)")
+    counts = {name: n for name, n in index.summary(start, stop).items() if n}
+    if not counts:
+        print("  所有帧完整，未发现异常")
+        return
+    print("  异常帧: " + ", ".join(f"{name} {n}" for name, n in counts.items()))
+    bad = index.bad_frames(start, stop)
+    preview = ", ".join(f"{i}({index.timestamps[i]:.2f}s)" for i in bad[:10])
+    print(f"  帧号(时间): {preview}{' ...' if len(bad) > 10 else ''}")
+
+
+if __name__ == "__main__":
+    radar_config = {
+        'num_adc_samples': 256,
+        'num_chirps_per_frame': 384,
+        'num_rx_antennas': 4,
+        'num_tx_antennas': 3,
+        'fps': 16.13,
+    }
+    paths = sys.argv[1:] or ['adc_data.bin']
+    if len(paths) == 1:
+        paths = adc_reader.split_capture_files(paths[0])
+    index = build_index(paths, radar_config, verbose=True)
+    index.save(index_path(paths))
+    print(f"已保存: {index_path(paths)}")
+    print_report(index)
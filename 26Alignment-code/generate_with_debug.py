@@ -2,12 +2,14 @@ import numpy as np
 import cv2
 import os
 import csv
+import timebase
+import track_io
 
 # ==========================================
 # 1. 再次确认文件名 (必须完全一致!)
 # ==========================================
 NPZ_FILE = 'calib_r2_a1_tuned.npz'     # <--- 必须是你刚才按ESC保存的那个文件名
-RADAR_FILE = 'radar_track2_final_smooth.txt'     # 雷达文件
+RADAR_FILE = 'radar_track2_final_smooth.trk'     # 雷达文件
 VIDEO_FILE = 'a1.mp4'               # 视频文件
 
 OUTPUT_VIDEO = 'output_fusion_final_r2_c1.mp4'
@@ -25,6 +27,7 @@ K = np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]], dtype=np.float32)
 
 RADAR_FPS = 16.13
 VIDEO_FPS = 30.0
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS}, 'radar': {'rate': RADAR_FPS}})
 
 def generate_strict():
     if not os.path.exists(NPZ_FILE):
@@ -38,6 +41,8 @@ def generate_strict():
     # --- 核心排查点：读取 T, R ---
     R = data['R']
     T = data['T']
+    # 内参以 npz 里的为准 (calib_refine 开 refine_focal 时焦距是拟合出来的)，老文件没有就用上面的默认值
+    K_used = data['K'] if 'K' in data else K
     
     # --- 核心排查点：读取 params ---
     # 我们不使用 try-except，如果出错直接报错，方便找原因
@@ -57,6 +62,7 @@ def generate_strict():
     print(f"   ▶ 平移向量 T (I/K/J/L调的): {T}")
     print(f"   ▶ 时间偏移 (Z/C调的):       {time_offset} 秒")
     print(f"   ▶ 镜像开启 (M键调的):       {mirror_x}")
+    print(f"   ▶ 焦距 fx / fy:             {K_used[0, 0]:.1f} / {K_used[1, 1]:.1f}")
     print("="*40)
     
     if abs(T[1] - 1.5) < 0.01 and abs(T[2] - 0.5) < 0.01:
@@ -65,7 +71,8 @@ def generate_strict():
 
     # 开始生成
     rvec, _ = cv2.Rodrigues(R)
-    radar_data = np.loadtxt(RADAR_FILE)
+    TIMEBASE.set_offset('radar', time_offset)
+    radar_data = track_io.load_radar_track(RADAR_FILE)
     cap = cv2.VideoCapture(VIDEO_FILE)
     
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -83,9 +90,8 @@ def generate_strict():
         ret, frame = cap.read()
         if not ret: break
         
-        t_vid = frame_idx / VIDEO_FPS
-        t_rad_target = t_vid + time_offset
-        rad_idx = int(t_rad_target * RADAR_FPS)
+        t_rad_target = TIMEBASE.local_time('video', 'radar', frame_idx)
+        rad_idx = TIMEBASE.convert('video', 'radar', frame_idx)
         
         points_3d = []
         points_raw = []
@@ -104,7 +110,7 @@ def generate_strict():
                     points_raw.append([final_x, y_r, 0])
 
         if len(points_3d) > 0:
-            img_pts, _ = cv2.projectPoints(np.array(points_3d), rvec, T, K, np.zeros(4))
+            img_pts, _ = cv2.projectPoints(np.array(points_3d), rvec, T, K_used, np.zeros(4))
             for j, pt in enumerate(img_pts.reshape(-1, 2)):
                 u, v = int(pt[0]), int(pt[1])
                 if 0 <= u < width and 0 <= v < height:
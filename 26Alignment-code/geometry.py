@@ -0,0 +1,98 @@
+import numpy as np
+
+# ==========================================
+# 极坐标 (距离单元, 角度单元) -> 直角坐标 查找表
+# ==========================================
+# 热力图每个格子的 (x, y, z) 只和雷达配置 / ROI 有关，和数据无关。
+# 这里一次性算好 [Range, Angle, 3] 的表，之后:
+#   - 检测掩码 -> 点云: 一次 flatnonzero + 一次查表，不再逐点算 sin / cos
+#   - ROI 掩码: 同一张表上的 bool [Range, Angle]，和检测掩码直接按位与
+#   - 画俯视热力图: 每个像素预先记好对应哪个格子，渲染时只是一次查表
+# 坐标系和 radar_point_cloud 一致: x = r sin(θ) (左右), y = r cos(θ) (正前方)，
+# 2D 雷达 z = 0 (以后有俯仰角时按 z = r sin(φ) 补上)。
+
+
+class PolarGeometry:
+    """ ranges [R] (米) x angles [A] (弧度) 网格的直角坐标表 """
+
+    def __init__(self, ranges, angles, mask=None):
+        self.ranges = np.asarray(ranges, dtype=np.float64)
+        self.angles = np.asarray(angles, dtype=np.float64)
+        r, a = np.meshgrid(self.ranges, self.angles, indexing='ij')
+        self.xyz = np.zeros(r.shape + (3,), dtype=np.float32)
+        self.xyz[..., 0] = r * np.sin(a)
+        self.xyz[..., 1] = r * np.cos(a)
+        self.flat_xyz = self.xyz.reshape(-1, 3)
+        # 有效格子 (ROI 内)，None 表示全部有效
+        self.mask = np.ones(r.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        self._render_cache = {}
+
+    @classmethod
+    def from_roi(cls, region):
+        """ 按 roi.RegionOfInterest 的采样点建表，mask 为真正的 ROI (不含给 CFAR 留的边缘) """
+        r, a = np.meshgrid(region.ranges, region.angles, indexing='ij')
+        return cls(region.ranges, region.angles, region.contains(r, a))
+
+    @property
+    def shape(self):
+        return self.xyz.shape[:2]
+
+    def points(self, detections):
+        """ 检测掩码 [Frames, R, A] -> (points [N, 3] float32, frame_ids [N])
+
+        只保留 mask 内的格子，点按 (帧, 距离, 角度) 顺序排列，和 np.nonzero 一致。
+        """
+        num_frames = detections.shape[0]
+        cells_per_frame = self.mask.size
+        flat = np.flatnonzero((detections & self.mask).reshape(num_frames, cells_per_frame))
+        frame_ids, cells = np.divmod(flat, cells_per_frame)
+        return self.flat_xyz[cells], frame_ids
+
+    def _pixel_lookup(self, pixel_size):
+        """ 俯视图每个像素对应的格子下标 (-1 表示不在网格内)，按像素大小缓存 """
+        if pixel_size in self._render_cache:
+            return self._render_cache[pixel_size]
+
+        valid = self.xyz[self.mask]
+        x_min, x_max = valid[:, 0].min(), valid[:, 0].max()
+        y_min, y_max = valid[:, 1].min(), valid[:, 1].max()
+        xs = np.arange(x_min, x_max + pixel_size, pixel_size)
+        ys = np.arange(y_min, y_max + pixel_size, pixel_size)
+        px, py = np.meshgrid(xs, ys)
+
+        # 像素中心 -> 极坐标 -> 最近的距离 / 角度采样点
+        r = np.hypot(px, py)
+        a = np.arctan2(px, py)
+        r_idx = _nearest(self.ranges, r)
+        a_idx = _nearest(self.angles, a)
+        cell = r_idx * len(self.angles) + a_idx
+        # 超出网格半个采样间隔以外、或不在 ROI 内的像素不画
+        r_step = np.diff(self.ranges).min() if len(self.ranges) > 1 else np.inf
+        a_step = np.diff(self.angles).min() if len(self.angles) > 1 else np.inf
+        outside = ((np.abs(self.ranges[r_idx] - r) > r_step / 2 + 1e-9) |
+                   (np.abs(self.angles[a_idx] - a) > a_step / 2 + 1e-9) |
+                   ~self.mask.ravel()[cell])
+        cell[outside] = -1
+
+        extent = [xs[0] - pixel_size / 2, xs[-1] + pixel_size / 2,
+                  ys[0] - pixel_size / 2, ys[-1] + pixel_size / 2]
+        self._render_cache[pixel_size] = (cell, extent)
+        return cell, extent
+
+    def render(self, heatmap, pixel_size=0.05, fill=np.nan):
+        """ [R, A] 极坐标热力图 -> 俯视直角坐标图像 (image [H, W], extent)
+
+        extent 可以直接传给 plt.imshow(image, origin='lower', extent=extent)。
+        """
+        cell, extent = self._pixel_lookup(pixel_size)
+        image = np.asarray(heatmap, dtype=np.float32).reshape(-1)[np.maximum(cell, 0)]
+        image[cell < 0] = fill
+        return image, extent
+
+
+def _nearest(grid, values):
+    """ 升序网格 grid 中离 values 最近的下标 """
+    idx = np.clip(np.searchsorted(grid, values), 1, max(len(grid) - 1, 1))
+    left = grid[idx - 1]
+    right = grid[np.minimum(idx, len(grid) - 1)]
+    return np.where(np.abs(values - left) <= np.abs(right - values), idx - 1, idx).clip(0, len(grid) - 1)
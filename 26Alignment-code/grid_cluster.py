@@ -0,0 +1,168 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# ==========================================
+# 基于网格哈希的批量 DBSCAN (小规模 2D/3D 雷达点云专用)
+# ==========================================
+# 每帧只有几个到几十个点，sklearn DBSCAN 的大部分时间花在建估计器、参数校验
+# 和建树上。这里把一批帧的点放在一起:
+#   1. 按 eps 大小的格子做哈希，键里带上帧号，不同帧的点永远不会相邻
+#   2. 只在自己和相邻格子 (2D 9 个 / 3D 27 个) 里找距离 <= eps 的点对
+#   3. 邻居数 >= min_samples 的是核心点，核心点之间的连通分量就是簇
+#   4. 边界点归到相邻核心点里最早出现的簇 (和 sklearn 的扩展顺序一致)
+# 结果与 DBSCAN(eps, min_samples) 逐帧跑出来的簇相同。
+
+
+def _expand_ranges(starts, counts):
+    """ [s0, s1, ...] + [c0, c1, ...] -> [s0, s0+1, ..., s0+c0-1, s1, ...] """
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+def neighbor_pairs(points, frame_ids, eps):
+    """ 返回同一帧内距离 <= eps 的所有有序点对 (i, j)，包含 i == j """
+    n, dims = points.shape
+    cells = np.floor(points / eps).astype(np.int64)
+    cells -= cells.min(axis=0) - 1 # 留出一圈，邻居格子坐标不会变负
+    spans = cells.max(axis=0) + 2
+
+    def encode(frame, cell):
+        key = frame.astype(np.int64)
+        for d in range(dims):
+            key = key * spans[d] + cell[:, d]
+        return key
+
+    keys = encode(frame_ids, cells)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    cell_keys, cell_starts, cell_counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    pair_i, pair_j = [], []
+    for offset in np.array(np.meshgrid(*[[-1, 0, 1]] * dims, indexing='ij')).reshape(dims, -1).T:
+        neighbor_keys = encode(frame_ids, cells + offset)
+        idx = np.searchsorted(cell_keys, neighbor_keys)
+        idx = np.minimum(idx, len(cell_keys) - 1)
+        found = cell_keys[idx] == neighbor_keys
+
+        src = np.nonzero(found)[0]
+        counts = cell_counts[idx[found]]
+        i = np.repeat(src, counts)
+        j = order[_expand_ranges(cell_starts[idx[found]], counts)]
+        close = np.sum((points[i] - points[j]) ** 2, axis=1) <= eps * eps
+        pair_i.append(i[close])
+        pair_j.append(j[close])
+
+    return np.concatenate(pair_i), np.concatenate(pair_j)
+
+
+def cluster_labels(points, frame_ids, eps=0.5, min_samples=3):
+    """ 一批帧的点一起聚类，返回每个点的簇号 (-1 为噪声)，簇号在整批内唯一
+
+    points 需按帧号升序排列 (和 radar_point_cloud 的扁平点云一致)。
+    """
+    n = len(points)
+    labels = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return labels
+
+    i, j = neighbor_pairs(points, frame_ids, eps)
+    # 邻居数包含自己，和 sklearn 的定义一致
+    core = np.bincount(i, minlength=n) >= min_samples
+    if not core.any():
+        return labels
+
+    # 核心点之间的连通分量
+    core_edges = core[i] & core[j]
+    graph = coo_matrix((np.ones(core_edges.sum(), dtype=np.int8), (i[core_edges], j[core_edges])),
+                       shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+
+    # sklearn 按点的顺序扩展簇: 簇的编号顺序 = 簇内最小的核心点下标
+    core_idx = np.nonzero(core)[0]
+    seed = np.full(n, n, dtype=np.int64)
+    np.minimum.at(seed, component[core_idx], core_idx)
+    labels[core] = seed[component[core]]
+
+    # 边界点: 归到相邻核心点中种子下标最小的那个簇
+    border_edges = ~core[i] & core[j]
+    border_seed = np.full(n, n, dtype=np.int64)
+    np.minimum.at(border_seed, i[border_edges], labels[j[border_edges]])
+    is_border = border_seed < n
+    labels[is_border] = border_seed[is_border]
+
+    # 种子下标 -> 0, 1, 2 ... 连续编号
+    valid = labels >= 0
+    labels[valid] = np.unique(labels[valid], return_inverse=True)[1]
+    return labels
+
+
+def cluster_centroids(points, offsets, eps=0.5, min_samples=3, batch_frames=1024):
+    """ 所有帧所有簇的质心
+
+    points / offsets: 扁平点云，第 i 帧的点 = points[offsets[i]:offsets[i+1]]
+    返回 (centroids [C, D], sizes [C], frames [C])，按 (帧号, 簇出现顺序) 排列
+    """
+    num_frames = len(offsets) - 1
+    all_centroids, all_sizes, all_frames = [], [], []
+
+    for f0 in range(0, num_frames, batch_frames):
+        f1 = min(f0 + batch_frames, num_frames)
+        p0, p1 = offsets[f0], offsets[f1]
+        if p1 == p0:
+            continue
+        batch = points[p0:p1].astype(np.float64)
+        frame_ids = np.repeat(np.arange(f1 - f0), np.diff(offsets[f0:f1 + 1]))
+        labels = cluster_labels(batch, frame_ids, eps, min_samples)
+
+        valid = labels >= 0
+        if not valid.any():
+            continue
+        # 簇号按种子点下标编号，点又按帧排列，所以簇号顺序就是帧顺序
+        num_clusters = labels.max() + 1
+        sizes = np.bincount(labels[valid], minlength=num_clusters)
+        sums = np.zeros((num_clusters, points.shape[1]))
+        np.add.at(sums, labels[valid], batch[valid])
+        cluster_frame = np.zeros(num_clusters, dtype=np.int64)
+        cluster_frame[labels[valid]] = frame_ids[valid]
+
+        all_centroids.append(sums / sizes[:, None])
+        all_sizes.append(sizes)
+        all_frames.append(f0 + cluster_frame)
+
+    if not all_centroids:
+        return (np.zeros((0, points.shape[1])), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64))
+    return np.concatenate(all_centroids), np.concatenate(all_sizes), np.concatenate(all_frames)
+
+
+def dominant_centroids(points, offsets, eps=0.5, min_samples=3, batch_frames=1024):
+    """ 每帧点数最多的簇的质心 [Frames, D]，没有簇的帧为 nan
+
+    点数相同时取先出现的簇，和原来逐帧 DBSCAN + np.argmax 的结果一致。
+    """
+    clusters = cluster_centroids(points, offsets, eps, min_samples, batch_frames)
+    return pick_dominant(*clusters, len(offsets) - 1)[0]
+
+
+def pick_dominant(centroids, sizes, frames, num_frames):
+    """ cluster_centroids 的结果 -> (每帧最大簇的质心 [Frames, D], 该簇点数 [Frames])
+
+    没有簇的帧质心为 nan、点数为 0；已经算过 cluster_centroids 时不用再聚一次类。
+    """
+    result = np.full((num_frames, centroids.shape[1]), np.nan)
+    best_sizes = np.zeros(num_frames, dtype=np.int64)
+    if len(centroids) == 0:
+        return result, best_sizes
+
+    # 每帧取最大的簇: 先按 (帧, -点数, 簇号) 排序，每帧第一个就是答案
+    rank = np.lexsort((np.arange(len(sizes)), -sizes, frames))
+    first = np.ones(len(rank), dtype=bool)
+    first[1:] = frames[rank][1:] != frames[rank][:-1]
+    best = rank[first]
+    result[frames[best]] = centroids[best]
+    best_sizes[frames[best]] = sizes[best]
+    return result, best_sizes
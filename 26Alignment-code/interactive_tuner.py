@@ -1,13 +1,20 @@
 import numpy as np
 import cv2
 import os
+import argparse
+import axis_search
+import calib_refine
+import time_sync
+import timebase
+import track_io
 
 # ==========================================
 # 配置
 # ==========================================
-RADAR_FILE = 'radar_track2_final_smooth.txt'  # 确保是对应的雷达文件
+RADAR_FILE = 'radar_track2_final_smooth.trk'  # 确保是对应的雷达文件
 VIDEO_FILE = 'a1.mp4'      # 确保是对应的视频文件
 OUTPUT_NPZ = 'calib_r2_a1_tuned.npz'
+CAMERA_FILE = 'camera_track1.trk'  # --auto 用的脚底点 (visual_click_tool 点的，或自动检测写成的相机轨迹)
 
 # 初始猜测值 (可以基于之前的 hack 值)
 INIT_X = 0.0
@@ -32,8 +39,27 @@ dist_coeffs = np.zeros((4,1))
 
 RADAR_FPS = 16.13
 VIDEO_FPS = 30.0
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS}, 'radar': {'rate': RADAR_FPS}})
 DISPLAY_WIDTH = 1280
 
+# ==========================================
+# 自动调参 (--auto，不开窗口)
+# ==========================================
+# 手动按键一步 1° / 0.1 m 地调，一个相机要几分钟到几小时。自动模式用同一套参数
+# (pitch / yaw / roll、T、mirror_x、time_offset)，对脚底点直接拟合:
+#   1. time_sync 按运动曲线估计 time_offset (sync = False 时用 params 里的)
+#   2. 按这个偏移取每个脚底点时刻的雷达位置，[m*x, 0, y] 地面点闭式解 (axis_search) 给初值，
+#      两种 mirror_x 都试，也从当前参数 (INIT_* 或 --load 的) 出发试一次
+#   3. calib_refine 对 R、T、time_offset 做鲁棒最小二乘，雷达整条轨迹向量化投影
+#   4. 代价差不多的解里取 roll 最接近 0 的 (平面上的镜像可以并进旋转，两种 mirror_x 拟合得一样好)
+# 结果存成和按 ESC 一样的 npz，随后窗口直接载入拟合值，只用来最后看一眼。
+AUTO_TUNE_CONFIG = {
+    'sync': True,
+    'sync_config': dict(time_sync.TIME_SYNC_CONFIG, radar_fps=RADAR_FPS, video_fps=VIDEO_FPS),
+    'refine_config': dict(calib_refine.CALIB_REFINE_CONFIG, radar_fps=RADAR_FPS, video_fps=VIDEO_FPS),
+    'cost_tolerance': 0.01,     # 代价相差不到 1% 的解算一样好
+}
+
 def get_rotation_matrix(pitch, yaw, roll):
     # 将角度转换为弧度
     rx, ry, rz = np.deg2rad(pitch), np.deg2rad(yaw), np.deg2rad(roll)
@@ -46,21 +72,102 @@ def get_rotation_matrix(pitch, yaw, roll):
     # R = Rz * Ry * Rx
     return Rz @ Ry @ Rx
 
-def main():
-    if not os.path.exists(RADAR_FILE) or not os.path.exists(VIDEO_FILE):
-        print("文件缺失！")
-        return
-
-    radar_data = np.loadtxt(RADAR_FILE)
-    cap = cv2.VideoCapture(VIDEO_FILE)
-    
-    # 状态变量
-    params = {
+def initial_params():
+    return {
         'tx': INIT_X, 'ty': INIT_Y, 'tz': INIT_Z,
         'pitch': INIT_PITCH, 'yaw': INIT_YAW, 'roll': INIT_ROLL,
         'time_offset': INIT_TIME_OFFSET,
         'mirror_x': INIT_MIRROR
     }
+
+def load_params(npz_file):
+    """ 读回按 ESC / --auto 存的 npz 里的 params """
+    return dict(np.load(npz_file, allow_pickle=True)['params'].item())
+
+def project_track(radar_data, params):
+    """ 整条雷达轨迹一次投影到像素 -> (uv [N, 2], 可画 [N] bool)，和 generate_with_debug 同一个模型 """
+    R = get_rotation_matrix(params['pitch'], params['yaw'], params['roll'])
+    T = np.array([params['tx'], params['ty'], params['tz']])
+    X = calib_refine.ground_points(radar_data[:, :2], params['mirror_x']) @ R.T + T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uv = X[:, :2] / X[:, 2:] * [K[0, 0], K[1, 1]] + [K[0, 2], K[1, 2]]
+    valid = ~np.isnan(radar_data[:, 0]) & ((np.abs(radar_data[:, 0]) > 0.1) | (np.abs(radar_data[:, 1]) > 0.1))
+    return uv, valid & (X[:, 2] > 0)
+
+def auto_tune(radar_data, cam_points, params=None, config=AUTO_TUNE_CONFIG):
+    """ 脚底点 [M, 3] (视频帧号, u, v) -> (拟合后的 params, calib_refine 结果)，失败返回 (None, None) """
+    params = dict(params or initial_params())
+    time_offset = params['time_offset']
+    if config['sync']:
+        sync = time_sync.estimate_offset(radar_data, cam_points, config['sync_config'])
+        time_sync.print_result(sync)
+        if sync['offset'] is not None:
+            time_offset = sync['offset']
+
+    # 每个脚底点时刻的雷达位置 (闭式解初值用)
+    TIMEBASE.set_offset('radar', time_offset)
+    r_pt = TIMEBASE.sample('video', 'radar', cam_points[:, 0].astype(int), radar_data[:, :2])
+    ok = ~np.isnan(r_pt[:, 0]) & ~np.all(r_pt == 0, axis=1)
+    if np.count_nonzero(ok) < 6:
+        print("  匹配点过少 (<6)，无法自动调参")
+        return None, None
+
+    R_init = get_rotation_matrix(params['pitch'], params['yaw'], params['roll'])
+    starts = [(R_init, np.array([params['tx'], params['ty'], params['tz']]), params['mirror_x'])]
+    for mirror_x in (False, True):
+        obj = calib_refine.ground_points(r_pt[ok], mirror_x)
+        pose = axis_search.closed_form_pose(obj, cam_points[ok, 1:3], K.astype(np.float64))
+        if pose is not None:
+            starts.append((pose[0], pose[1], mirror_x))
+
+    results = [calib_refine.refine(radar_data, cam_points, R, T, time_offset, K.astype(np.float64), mirror_x,
+                                   config['refine_config'])
+               for R, T, mirror_x in starts]
+    lowest = min(res['mean_cost'] for res in results)
+    good = [res for res in results if res['mean_cost'] <= lowest * (1 + config['cost_tolerance'])]
+    best = min(good, key=lambda res: abs(calib_refine.euler_angles(res['R'])[2]))
+
+    pitch, yaw, roll = calib_refine.euler_angles(best['R'])
+    tx, ty, tz = (float(t) for t in best['T'])
+    params.update(tx=tx, ty=ty, tz=tz, pitch=pitch, yaw=yaw, roll=roll,
+                  time_offset=best['time_offset'], mirror_x=best['mirror_x'])
+    return params, best
+
+def run_auto(camera_file=CAMERA_FILE, output_npz=OUTPUT_NPZ, params=None):
+    """ 不开窗口的自动调参，结果存到 output_npz，返回拟合的 params """
+    if not track_io.track_exists(RADAR_FILE) or not track_io.track_exists(camera_file):
+        print("文件缺失！")
+        return None
+    radar_data = track_io.load_radar_track(RADAR_FILE)
+    cam_points = track_io.load_camera_track(camera_file)
+    print(f">>> 自动调参: {RADAR_FILE} <---> {camera_file} ({len(cam_points)} 个脚底点)")
+
+    params, result = auto_tune(radar_data, cam_points, params)
+    if params is None:
+        return None
+    print(f"  Pitch {params['pitch']:.2f} | Yaw {params['yaw']:.2f} | Roll {params['roll']:.2f} | "
+          f"T ({params['tx']:.3f}, {params['ty']:.3f}, {params['tz']:.3f}) | Mirror X {params['mirror_x']} | "
+          f"Time {params['time_offset']:+.3f}s")
+    print(f"  重投影误差 {result['rms']:.2f} px (中位数 {result['median']:.2f}, "
+          f"内点 {result['inliers']}/{result['matched']})")
+    if not np.isclose(result['focal'], K[0, 0]):
+        print(f"  焦距 {result['focal']:.1f} (默认 {K[0, 0]:.1f})，已存进 npz 的 K；窗口预览仍按默认焦距画")
+    # 和 spatial_calibration 用同一个写法 (R / T / K / params)，拟合出的焦距也在 K 里
+    calib_refine.save_calibration(output_npz, result)
+    print(f"  已保存至 {output_npz}")
+    return params
+
+def main(params=None):
+    if not track_io.track_exists(RADAR_FILE) or not os.path.exists(VIDEO_FILE):
+        print("文件缺失！")
+        return
+
+    radar_data = track_io.load_radar_track(RADAR_FILE)
+    cap = cv2.VideoCapture(VIDEO_FILE)
+    
+    # 状态变量 (默认用 INIT_*，--auto / --load 时载入拟合好的值)
+    params = dict(params or initial_params())
+    projected, projected_params = None, None
     
     frame_idx = 0
     paused = False
@@ -80,48 +187,27 @@ def main():
             pass
 
         # 1. 计算当前时间对应的雷达帧
-        t_vid = frame_idx / VIDEO_FPS
-        t_rad = t_vid + params['time_offset']
-        rad_idx = int(t_rad * RADAR_FPS)
+        TIMEBASE.set_offset('radar', params['time_offset'])
+        rad_idx = TIMEBASE.convert('video', 'radar', frame_idx)
         
         # 2. 获取当前的 R, T
         R = get_rotation_matrix(params['pitch'], params['yaw'], params['roll'])
         T = np.array([params['tx'], params['ty'], params['tz']], dtype=np.float32)
-        rvec, _ = cv2.Rodrigues(R)
 
-        # 3. 准备绘制
+        # 3. 投影: 参数变了才把整条轨迹重新投影一遍
+        # 坐标映射: 雷达X -> 相机X (mirror_x 时取反), 雷达Y(深度) -> 相机Z，点为 [x, 0, y] (x左右, 0高, y深)
+        if params != projected_params:
+            projected, drawable = project_track(radar_data, params)
+            projected_params = dict(params)
         display_frame = frame.copy()
-        points_to_draw = []
-        
-        # 取前后几帧雷达数据
-        for i in range(rad_idx - 2, rad_idx + 3):
-            if 0 <= i < len(radar_data):
-                r_pt = radar_data[i]
-                if not np.isnan(r_pt[0]) and (abs(r_pt[0])>0.1 or abs(r_pt[1])>0.1):
-                    x_r, y_r = r_pt[0], r_pt[1]
-                    
-                    # === 坐标映射 ===
-                    # 这里的逻辑对应之前的 manual hack
-                    # 默认: 雷达X -> 相机X, 雷达Y(深度) -> 相机Z
-                    
-                    final_x = -x_r if params['mirror_x'] else x_r
-                    
-                    # 构造物体坐标系下的点 (假设雷达在地板上)
-                    # 我们让 Z=0 (地板), Y=Depth (前方)
-                    # 相机坐标系惯例: Y向下, Z向前
-                    # 这里我们手动把雷达点转到相机系前，先假设一个物体坐标系
-                    
-                    # 修正策略：直接构造点 [x, 0, y] (x左右, 0高, y深)
-                    obj_pt = np.array([final_x, 0, y_r], dtype=np.float32)
-                    points_to_draw.append(obj_pt)
-
-        # 4. 投影
-        if len(points_to_draw) > 0:
-            img_pts, _ = cv2.projectPoints(np.array(points_to_draw), rvec, T, K, dist_coeffs)
-            for pt in img_pts.reshape(-1, 2):
+
+        # 4. 取前后几帧雷达数据画出来
+        for i in range(max(rad_idx - 2, 0), min(rad_idx + 3, len(radar_data))):
+            if drawable[i]:
                 try:
-                    cv2.circle(display_frame, (int(pt[0]), int(pt[1])), 15, (0, 0, 255), 3)
-                    cv2.circle(display_frame, (int(pt[0]), int(pt[1])), 5, (0, 255, 255), -1)
+                    u, v = int(projected[i, 0]), int(projected[i, 1])
+                    cv2.circle(display_frame, (u, v), 15, (0, 0, 255), 3)
+                    cv2.circle(display_frame, (u, v), 5, (0, 255, 255), -1)
                 except: pass
 
         # 5. 显示 UI 信息
@@ -175,4 +261,15 @@ def main():
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="雷达-相机 手动 / 自动调参")
+    parser.add_argument('--auto', nargs='?', const=CAMERA_FILE, metavar='CAMERA_TRACK',
+                        help="先用脚底点自动拟合参数 (默认 CAMERA_FILE)，再打开窗口检查")
+    parser.add_argument('--no-view', action='store_true', help="只自动拟合并保存，不打开窗口 (批量跑)")
+    parser.add_argument('--load', metavar='NPZ', help="从之前保存的 npz 载入参数")
+    args = parser.parse_args()
+
+    params = load_params(args.load) if args.load else None
+    if args.auto:
+        params = run_auto(args.auto, OUTPUT_NPZ, params) or params
+    if not args.no_view:
+        main(params)
\ No newline at end of file
@@ -1,45 +1,231 @@
-import pandas as pd
 import numpy as np
 import os
+import timebase
+import track_io
 
-INPUT_FILE = 'radar_track2_clean.txt'
-OUTPUT_FILE = 'radar_track2_final_smooth.txt'
+INPUT_FILE = 'radar_track2_clean.trk'   # 旧的 .txt 也能读
+OUTPUT_FILE = 'radar_track2_final_smooth.trk'
 
-def fill_gaps():
-    if not os.path.exists(INPUT_FILE):
+# ==========================================
+# 轨迹补全 + 平滑: 匀速模型卡尔曼滤波 + RTS 后向平滑
+# ==========================================
+# 以前: pandas 线性插值 (最多 50 帧) -> 前后向填充剩下的所有空值 -> 5 点滑动平均，
+# 长时间没检测到人时也会凭空 "造" 出位置。现在:
+#   - 前向卡尔曼 (状态 [位置, 速度]，和 radar_tracker 同一个匀速模型) + 后向 RTS 平滑，
+#     短缺口由模型自然补上，每一帧都带位置标准差 position_std
+#   - 连续缺失超过 max_gap 帧的缺口、第一帧检测之前、最后一帧检测之后都标记为 gap，
+#     输出 nan，不再填充；缺口两侧各自重新起滤波
+#   - 很长的录制按 chunk_frames 分块: 前向状态跨块延续，后向平滑在块尾多看
+#     overlap_frames 帧，内存只和块大小有关
+#   - resample_video = True 时同时按视频帧时钟 (timebase) 重采样，
+#     额外输出每个视频帧一条记录的 _video.trk
+# x / y / z 三个轴用同一套模型，缺失模式一样，所以协方差和增益只算一遍、三个轴共用。
+# 输出 OUTPUT_FILE (track_io 轨迹): 每个雷达帧一条记录，gap 帧 valid = 0，
+# confidence = 位置标准差 position_std (米)
+
+SMOOTH_CONFIG = {
+    'fps': 16.13,
+    'accel_noise': 2.0,         # 加速度标准差 (m/s^2)，和 radar_tracker 一致
+    'measurement_noise': 0.15,  # 位置测量误差 (m)
+    'init_velocity_std': 1.0,   # 起始速度的不确定度 (m/s)
+    'max_gap': 50,              # 连续缺失超过这么多帧 (约 3 秒) 就不补，标记为 gap
+    'chunk_frames': 8192,       # 每块处理的帧数
+    'overlap_frames': 256,      # 后向平滑在块尾多看的帧数
+    'resample_video': False,    # True: 同时输出按视频帧时钟重采样的轨迹
+    'video_fps': 30.0,
+    'time_offset': 0.0,         # 雷达时间 = 视频时间 + time_offset (和 interactive_tuner 一致)
+}
+
+
+def gap_mask(measured, max_gap):
+    """ 不补的帧: 长度超过 max_gap 的缺失段，以及第一个 / 最后一个测量之外的帧 """
+    n = len(measured)
+    gap = np.ones(n, dtype=bool)
+    idx = np.flatnonzero(measured)
+    if len(idx) == 0:
+        return gap
+    gap[idx[0]:idx[-1] + 1] = False
+    # 相邻两个测量之间缺了多少帧
+    holes = np.diff(idx) - 1
+    for k in np.flatnonzero(holes > max_gap):
+        gap[idx[k] + 1:idx[k + 1]] = True
+    return gap
+
+
+def _forward(z, measured, config, init=None):
+    """ 前向卡尔曼滤波
+
+    z [N, D] 测量 (缺失处随意)，measured [N] bool；init = (x, v, P) 接上一块的滤波状态。
+    协方差按轴共用，用 (p00, p01, p11) 三个数表示 [[p00, p01], [p01, p11]]。
+    返回 x_f, v_f [N, D]，P_f / P_p [N, 3] (更新后 / 预测)
+    """
+    n, d = z.shape
+    dt = 1.0 / config['fps']
+    q = config['accel_noise'] ** 2
+    q00, q01, q11 = q * dt ** 4 / 4, q * dt ** 3 / 2, q * dt ** 2
+    r = config['measurement_noise'] ** 2
+
+    x_f = np.empty((n, d))
+    v_f = np.empty((n, d))
+    P_f = [None] * n
+    P_p = [None] * n
+    if init is None:
+        # 第一帧一定有测量 (分段时保证)，直接用它起始
+        x, v = z[0].copy(), np.zeros(d)
+        p00, p01, p11 = r, 0.0, config['init_velocity_std'] ** 2
+        x_f[0], v_f[0] = x, v
+        P_f[0] = P_p[0] = (p00, p01, p11)
+        start = 1
+    else:
+        x, v, (p00, p01, p11) = init[0].copy(), init[1].copy(), init[2]
+        start = 0
+
+    for k in range(start, n):
+        # 预测: x = F x, P = F P F' + Q
+        x = x + dt * v
+        p00, p01, p11 = p00 + 2 * dt * p01 + dt * dt * p11 + q00, p01 + dt * p11 + q01, p11 + q11
+        P_p[k] = (p00, p01, p11)
+        if measured[k]:
+            s = p00 + r
+            k0, k1 = p00 / s, p01 / s
+            innov = z[k] - x
+            x = x + k0 * innov
+            v = v + k1 * innov
+            p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+        x_f[k], v_f[k] = x, v
+        P_f[k] = (p00, p01, p11)
+    return x_f, v_f, np.array(P_f, dtype=np.float64), np.array(P_p, dtype=np.float64)
+
+
+def _backward(x_f, v_f, P_f, P_p, config):
+    """ RTS 后向平滑，返回 x_s, v_s [N, D] 和 P_s [N, 3] """
+    n = len(x_f)
+    dt = 1.0 / config['fps']
+    x_s, v_s = x_f.copy(), v_f.copy()
+    # 协方差部分只有几个标量，用 Python float 算比逐行操作小数组快得多
+    P_f_list, P_p_list = P_f.tolist(), P_p.tolist()
+    P_s = [None] * n
+    P_s[-1] = P_f_list[-1]
+    for k in range(n - 2, -1, -1):
+        a, b, c = P_f_list[k]
+        d, e, f = P_p_list[k + 1]
+        det = d * f - e * e
+        # C = P_f F' P_p^-1
+        m00, m01, m10, m11 = a + b * dt, b, b + c * dt, c
+        c00, c01 = (m00 * f - m01 * e) / det, (m01 * d - m00 * e) / det
+        c10, c11 = (m10 * f - m11 * e) / det, (m11 * d - m10 * e) / det
+        dx = x_s[k + 1] - (x_f[k] + dt * v_f[k])
+        dv = v_s[k + 1] - v_f[k]
+        x_s[k] = x_f[k] + c00 * dx + c01 * dv
+        v_s[k] = v_f[k] + c10 * dx + c11 * dv
+        # P_s = P_f + C (P_s' - P_p') C'
+        s00, s01, s11 = P_s[k + 1]
+        g00, g01, g11 = s00 - d, s01 - e, s11 - f
+        h0, h1 = c00 * g00 + c01 * g01, c00 * g01 + c01 * g11
+        P_s[k] = (a + c00 * h0 + c01 * h1,
+                  b + c10 * h0 + c11 * h1,
+                  c + c10 * (c10 * g00 + c11 * g01) + c11 * (c10 * g01 + c11 * g11))
+    P_s = np.array(P_s, dtype=np.float64)
+    return x_s, v_s, P_s
+
+
+def smooth_segment(z, measured, config):
+    """ 一段没有长缺口的轨迹，按块做 前向滤波 + RTS 平滑 """
+    n = len(z)
+    chunk, overlap = config['chunk_frames'], config['overlap_frames']
+    x_out = np.empty_like(z)
+    v_out = np.empty_like(z)
+    var_out = np.empty(n)
+    state = None
+    for s in range(0, n, chunk):
+        e = min(s + chunk, n)
+        stop = min(e + overlap, n)
+        x_f, v_f, P_f, P_p = _forward(z[s:stop], measured[s:stop], config, state)
+        x_s, v_s, P_s = _backward(x_f, v_f, P_f, P_p, config)
+        x_out[s:e], v_out[s:e], var_out[s:e] = x_s[:e - s], v_s[:e - s], P_s[:e - s, 0]
+        # 下一块的前向滤波从本块最后一帧的滤波状态接着走
+        state = (x_f[e - s - 1], v_f[e - s - 1], tuple(P_f[e - s - 1]))
+    return x_out, v_out, var_out
+
+
+def smooth_track(data, config=SMOOTH_CONFIG):
+    """ data [N, D] (nan 为缺失) -> {'position', 'velocity', 'position_std', 'gap'} """
+    measured = ~np.isnan(data).any(axis=1)
+    gap = gap_mask(measured, config['max_gap'])
+    position = np.full(data.shape, np.nan)
+    velocity = np.full(data.shape, np.nan)
+    position_std = np.full(len(data), np.nan)
+
+    # 按 gap 切成若干段，每段从第一个测量开始各自滤波
+    edges = np.flatnonzero(np.diff(np.concatenate([[True], gap, [True]]).astype(np.int8)))
+    for s, e in zip(edges[::2], edges[1::2]):
+        x, v, var = smooth_segment(data[s:e], measured[s:e], config)
+        position[s:e], velocity[s:e], position_std[s:e] = x, v, np.sqrt(var)
+    return {'position': position, 'velocity': velocity, 'position_std': position_std, 'gap': gap}
+
+
+def resample_to_video(result, config=SMOOTH_CONFIG):
+    """ 按视频帧时钟重采样: 从左侧雷达帧的平滑状态按匀速模型外推到视频帧时刻
+
+    返回 (position [V, D], position_std [V])，第 k 行对应视频第 k 帧
+    """
+    n = len(result['position'])
+    clock = timebase.Timebase({'video': {'rate': config['video_fps']},
+                               'radar': {'rate': config['fps'], 'offset': config['time_offset']}})
+    num_video = clock.convert('radar', 'video', n - 1) + 1
+    i0, w = clock.convert('video', 'radar', np.arange(max(num_video, 0)), mode='interp')
+    inside = timebase.in_range(i0, n)
+    i0c = np.clip(i0, 0, n - 1)
+    tau = (w / config['fps'])[:, None]
+    position = result['position'][i0c] + tau * result['velocity'][i0c]
+    # 两侧任一帧是 gap 就不重采样
+    bad = ~inside | result['gap'][i0c] | (result['gap'][np.clip(i0 + 1, 0, n - 1)] & (w > 0))
+    position[bad] = np.nan
+    position_std = np.where(bad, np.nan, result['position_std'][i0c])
+    return position, position_std
+
+
+def fill_gaps(config=SMOOTH_CONFIG):
+    try:
+        records, meta = track_io.read_track(INPUT_FILE)
+    except FileNotFoundError:
         print(f"❌ 找不到文件: {INPUT_FILE}")
         return
 
     print(f"正在读取 {INPUT_FILE} ...")
-    # 读取数据，保留 NaN
-    data = np.loadtxt(INPUT_FILE)
-    
-    # 转换为 Pandas DataFrame 以便处理
-    df = pd.DataFrame(data, columns=['x', 'y', 'z'])
-    
-    print(f"原始数据行数: {len(df)}")
-    print(f"空值(NaN)行数: {df['x'].isna().sum()}")
-
-    # 1. 线性插值 (Linear Interpolation)
-    # limit=50: 如果中间断了超过 50 帧 (约3秒)，就不补了（避免瞎猜）
-    # direction='both': 头尾缺的也尽量补一下
-    df_filled = df.interpolate(method='linear', limit=50, limit_direction='both')
-    
-    # 2. 对于实在补不上的（比如开头结尾太长），用 0 填充或者保持上一帧
-    df_filled = df_filled.fillna(method='bfill').fillna(method='ffill')
-    
-    # 3. 平滑处理 (可选，让轨迹更圆润)
-    # 使用移动平均窗口
-    df_smooth = df_filled.rolling(window=5, min_periods=1, center=True).mean()
-
-    # 保存
-    np.savetxt(OUTPUT_FILE, df_smooth.values, fmt='%.4f')
-    
+    # 读取数据，无效帧为 NaN
+    data = track_io.radar_positions(records)
+
+    print(f"原始数据行数: {len(data)}")
+    print(f"空值(NaN)行数: {np.isnan(data[:, 0]).sum()}")
+
+    result = smooth_track(data, config)
+    filled = int(np.count_nonzero(np.isnan(data[:, 0]) & ~result['gap']))
+    print(f"补全短缺口: {filled} 帧 | 长缺口 (>{config['max_gap']} 帧, 未填充): "
+          f"{int(result['gap'].sum())} 帧")
+    if np.any(~result['gap']):
+        print(f"位置标准差: 中位数 {np.nanmedian(result['position_std']) * 100:.1f} cm, "
+              f"最大 {np.nanmax(result['position_std']) * 100:.1f} cm")
+
+    # 保存 (帧号沿用输入)
+    output = track_io.write_track(
+        OUTPUT_FILE, track_io.radar_records(result['position'], config['fps'], records['frame'],
+                                            result['position_std']),
+        **dict(meta, fps=config['fps'], confidence='position_std', max_gap=config['max_gap']))
+
     print("-" * 30)
     print("✅ 插值补全完成！")
-    print(f"已生成平滑后的轨迹文件: {OUTPUT_FILE}")
+    print(f"已生成平滑后的轨迹文件: {output}")
+    if config['resample_video']:
+        video_position, video_std = resample_to_video(result, config)
+        video_file = track_io.write_track(
+            os.path.splitext(OUTPUT_FILE)[0] + '_video', track_io.radar_records(video_position, config['video_fps'],
+                                                                                  confidence=video_std),
+            **dict(meta, fps=config['video_fps'], clock='video', time_offset=config['time_offset'],
+                   confidence='position_std'))
+        print(f"按视频帧重采样: {video_file} ({len(video_position)} 帧, {config['video_fps']} fps)")
     print("请在 interactive_tuner 和 generate_fusion 中使用这个新文件。")
     print("-" * 30)
 
 if __name__ == "__main__":
-    fill_gaps()
\ No newline at end of file
+    fill_gaps()
@@ -1,5 +1,7 @@
 import numpy as np
 import os
+import re
+from adc_reader import write_trim_sidecar
 
 # ==========================================
 # 裁剪配置 (截取 3.0s ~ 59.0s)
@@ -19,7 +21,19 @@ TRIM_CONFIG = {
     'num_adc_samples': 256,
     'num_chirps_per_frame': 384,
     'num_rx_antennas': 4,
-    'fps': 16.13
+    'fps': 16.13,
+
+    # 裁剪方式
+    # 'virtual': 只写一个很小的 .trim.json 描述文件 (源文件 + 起止帧)，不拷贝数据，
+    #            各雷达脚本打开 _3s_to_59s.bin 时会自动按这个窗口读取原文件
+    # 'copy':    真正导出一个裁剪后的 .bin 文件 (分块流式读写)
+    'mode': 'virtual',
+    'chunk_bytes': 64 * 1024 * 1024,  # copy 模式每次读写的块大小
+
+    # p1/p2 是同一次采集被 DCA1000 拆开的两段，True 时把它们当成一条连续数据流
+    # 统一裁剪，输出 adc_data_Full_3s_to_59s (跨文件边界的帧会被完整拼接)；
+    # False 时沿用旧做法，p1 和 p2 各自独立裁剪
+    'concat_parts': True,
 }
 
 def trim_bin_exact_range(file_path, config):
@@ -31,7 +45,9 @@ def trim_bin_exact_range(file_path, config):
         print("错误: 结束时间必须大于开始时间")
         return
 
-    print(f"正在处理 {file_path} ...")
+    # file_path 可以是单个文件，也可以是按顺序拼接的分段文件列表
+    src_paths = list(file_path) if isinstance(file_path, (list, tuple)) else [file_path]
+    print(f"正在处理 {' + '.join(src_paths)} ...")
     print(f"  - 目标区间: {start_t}s ~ {end_t}s")
     print(f"  - 预期时长: {end_t - start_t:.2f}s")
 
@@ -55,39 +71,73 @@ def trim_bin_exact_range(file_path, config):
     print(f"  - 总共截取: {frames_to_read} 帧")
     print(f"  - 数据量: {bytes_to_read / 1024 / 1024:.2f} MB")
 
-    # 4. 读取并写入
-    new_filename = file_path.replace('.bin', '_3s_to_59s.bin')
-    
+    # 4. 生成裁剪结果
+    if len(src_paths) > 1:
+        # 拼接输出去掉 _p1 编号: adc_data_Full_p1.bin -> adc_data_Full_3s_to_59s.bin
+        new_filename = re.sub(r'_p\d+(?=\.bin$)', '', src_paths[0]).replace('.bin', '_3s_to_59s.bin')
+    else:
+        new_filename = src_paths[0].replace('.bin', '_3s_to_59s.bin')
+
+    missing = [p for p in src_paths if not os.path.exists(p)]
+    if missing:
+        print(f"  错误: 找不到文件 {', '.join(missing)}")
+        print("-" * 30)
+        return
+
+    # 检查原文件是否够长
+    available_bytes = sum(os.path.getsize(p) for p in src_paths) - start_byte_offset
+    if available_bytes < bytes_to_read:
+        print(f"  警告: 文件末尾数据不足! 实际可用 {max(available_bytes, 0)} 字节 (预期 {bytes_to_read})")
+        print(f"  可能原文件总时长不足 {end_t} 秒。")
+
     try:
-        with open(file_path, 'rb') as f_in:
-            # 跳到开始位置
-            f_in.seek(start_byte_offset)
-            
-            # 只读取指定长度的数据
-            data = f_in.read(bytes_to_read)
-            
-            # 检查读取是否完整
-            if len(data) != bytes_to_read:
-                print(f"  警告: 文件末尾数据不足! 实际读取了 {len(data)} 字节 (预期 {bytes_to_read})")
-                print(f"  可能原文件总时长不足 {end_t} 秒。")
+        if config.get('mode', 'virtual') == 'virtual':
+            sidecar = write_trim_sidecar(new_filename, src_paths, start_frame_idx, end_frame_idx,
+                                         frame_size_bytes)
+            print(f"  - 成功! 已保存虚拟裁剪描述: {sidecar} (未拷贝数据)")
+        else:
+            export_bin_range(src_paths, new_filename, start_byte_offset, bytes_to_read,
+                             config.get('chunk_bytes', 64 * 1024 * 1024))
+            print(f"  - 成功! 已保存: {new_filename}")
 
-        with open(new_filename, 'wb') as f_out:
-            f_out.write(data)
-            
-        print(f"  - 成功! 已保存: {new_filename}")
-        
-    except FileNotFoundError:
-        print(f"  错误: 找不到文件 {file_path}")
     except Exception as e:
         print(f"  发生错误: {e}")
         
     print("-" * 30)
 
+def export_bin_range(src_paths, dst_path, start_byte_offset, bytes_to_read, chunk_bytes):
+    """ 分块流式拷贝拼接流中的 [start, start + bytes_to_read)，内存占用只有一个块 """
+    remaining = bytes_to_read
+    with open(dst_path, 'wb') as f_out:
+        for path in src_paths:
+            size = os.path.getsize(path)
+            if start_byte_offset >= size:
+                # 起点还在后面的分段里
+                start_byte_offset -= size
+                continue
+            with open(path, 'rb') as f_in:
+                # 跳到开始位置
+                f_in.seek(start_byte_offset)
+                start_byte_offset = 0
+                while remaining > 0:
+                    chunk = f_in.read(min(chunk_bytes, remaining))
+                    if not chunk:
+                        break
+                    f_out.write(chunk)
+                    remaining -= len(chunk)
+            if remaining <= 0:
+                break
+    return bytes_to_read - remaining
+
 if __name__ == "__main__":
-    # 处理 P1
-    trim_bin_exact_range(TRIM_CONFIG['p1_file'], TRIM_CONFIG)
-                  
-    # 处理 P2
-    trim_bin_exact_range(TRIM_CONFIG['p2_file'], TRIM_CONFIG)
+    if TRIM_CONFIG['concat_parts']:
+        # P1 + P2 作为一次完整采集统一裁剪
+        trim_bin_exact_range([TRIM_CONFIG['p1_file'], TRIM_CONFIG['p2_file']], TRIM_CONFIG)
+    else:
+        # 处理 P1
+        trim_bin_exact_range(TRIM_CONFIG['p1_file'], TRIM_CONFIG)
+                      
+        # 处理 P2
+        trim_bin_exact_range(TRIM_CONFIG['p2_file'], TRIM_CONFIG)
                   
     print("全部完成！新文件的第0秒对应原始数据的第3秒。")
\ No newline at end of file
@@ -1,5 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
+import fft_backend
 
 
 # 文件路径
@@ -55,7 +56,7 @@ try:
     frame1_rx1_data = adc_data_cube[0, :, :, 0]
     # 1. 沿着快时间维 (axis=0) 做 FFT
     # 结果是一个 Range-Chirp 图 (也叫 Range-Doppler 的中间状态)
-    range_fft_data = np.fft.fft(frame1_rx1_data, axis=0)
+    range_fft_data = fft_backend.fft(frame1_rx1_data, axis=0)
     # 2. 取模值 (Magnitude) 来看信号强度，并转换为对数刻度 (dB) 以便观察
     # 通常只看前一半的采样点 (Nyquist采样定理)
     num_samples = range_fft_data.shape[0]
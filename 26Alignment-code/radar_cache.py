@@ -0,0 +1,154 @@
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# ==========================================
+# 雷达中间结果的磁盘缓存 (Range-FFT / Range-Doppler / Range-Azimuth)
+# ==========================================
+# range_time_map / doppler_time_map / radar_point_cloud 每次运行都要从原始
+# ADC 重新做 FFT，只改了一个画图或检测参数也要等几分钟。这里把每帧的中间
+# 结果存成 .npy (可以直接 memmap)，下次运行同样的数据 + 同样的参数就直接读。
+#
+# 缓存键 = 源文件身份 (绝对路径 + 大小 + 修改时间) + 帧窗口 + 产物名 + 相关参数
+#   源文件被重新采集/覆盖、裁剪窗口变了、FFT 参数变了，都会自动换一个键。
+#   只影响后处理的参数 (检测门限、聚类、画图) 不进键，改了以后直接命中缓存。
+#
+# 目录结构: cache_dir/<键>/data.npy + meta.json
+#   data.npy 形状 [Frames, ...]，按块边算边写，全部写完才改名生效，
+#   中途中断不会留下半成品。
+# 淘汰: 每次命中会更新 meta.json 的修改时间；总大小超过 quota_gb 时
+#   从最久没用过的条目开始删 (LRU)。
+
+CACHE_CONFIG = {
+    'enabled': True,
+    'cache_dir': '.radar_cache',
+    'quota_gb': 10.0,
+}
+
+DATA_FILE = 'data.npy'
+META_FILE = 'meta.json'
+
+
+def source_identity(reader):
+    """ 读取器对应的原始数据身份: 每个源文件的 (绝对路径, 大小, 修改时间) + 帧窗口 """
+    files = []
+    for path in reader.source_paths:
+        st = os.stat(path)
+        files.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return {
+        'files': files,
+        'start_frame': int(reader.start_frame),
+        'num_frames': int(reader.num_frames),
+        'frame_bytes': int(reader.frame_bytes),
+        'precision': np.dtype(reader.complex_dtype).name,
+    }
+
+
+class RadarCache:
+    """ 按键存取 [Frames, ...] 形状的中间结果，超过磁盘配额时按 LRU 淘汰 """
+
+    def __init__(self, config=CACHE_CONFIG):
+        self.cache_dir = config['cache_dir']
+        self.quota_bytes = int(config['quota_gb'] * 1024 ** 3)
+
+    def key(self, reader, product, params):
+        """ 源数据身份 + 产物名 + 参数 -> 十六进制键 """
+        desc = {'source': source_identity(reader), 'product': product, 'params': params}
+        blob = json.dumps(desc, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha1(blob).hexdigest()[:20]
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """ 命中时返回只读 memmap 并刷新最近使用时间，否则返回 None """
+        entry = self._entry_dir(key)
+        data_path, meta_path = os.path.join(entry, DATA_FILE), os.path.join(entry, META_FILE)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        os.utime(meta_path)
+        return np.load(data_path, mmap_mode='r')
+
+    def create(self, key, shape, dtype):
+        """ 新建一个待写入的条目，返回可写 memmap (写完后调用 commit) """
+        entry = self._entry_dir(key)
+        os.makedirs(entry, exist_ok=True)
+        return np.lib.format.open_memmap(os.path.join(entry, DATA_FILE + '.tmp'), mode='w+',
+                                         dtype=dtype, shape=shape)
+
+    def commit(self, key, data, meta):
+        """ 写完的数据落盘改名，记录描述信息，然后检查配额 """
+        entry = self._entry_dir(key)
+        data.flush()
+        os.replace(os.path.join(entry, DATA_FILE + '.tmp'), os.path.join(entry, DATA_FILE))
+        with open(os.path.join(entry, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, created=time.time()), f, indent=2, default=str)
+        self.evict(keep=key)
+
+    def entries(self):
+        """ 所有完整条目: [(最近使用时间, 字节数, 键)]，最久没用的在前 """
+        result = []
+        if not os.path.isdir(self.cache_dir):
+            return result
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self._entry_dir(key), META_FILE)
+            data_path = os.path.join(self._entry_dir(key), DATA_FILE)
+            if os.path.exists(meta_path) and os.path.exists(data_path):
+                result.append((os.path.getmtime(meta_path), os.path.getsize(data_path), key))
+        return sorted(result)
+
+    def evict(self, keep=None):
+        """ 总大小超过配额时从最久没用的条目开始删，keep 指定的条目不删 """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.quota_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            print(f"缓存超过配额，删除最久未使用的条目 {key} ({size / 1024 ** 2:.1f} MB)")
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def cached_frames(reader, product, params, frame_shape, dtype, compute_block, block_frames,
+                  config=CACHE_CONFIG, progress_callback=None):
+    """ 取每帧的中间结果 [Frames, *frame_shape]，有缓存就直接读
+
+    compute_block(start, stop) 返回 [stop - start, *frame_shape] 的结果。
+    没命中时按 block_frames 分块计算，边算边写进缓存文件；config 为 None
+    或 enabled 为 False 时不用缓存，返回普通数组 (行为和以前一样)。
+    progress_callback(已完成帧数, 总帧数) 每块调用一次。
+    """
+    num_frames = reader.num_frames
+    shape = (num_frames,) + tuple(frame_shape)
+
+    cache = RadarCache(config) if config and config.get('enabled') else None
+    key = None
+    if cache is not None:
+        key = cache.key(reader, product, params)
+        cached = cache.load(key)
+        if cached is not None and cached.shape == shape:
+            print(f"使用缓存的 {product}: {os.path.join(cache.cache_dir, key)}")
+            return cached
+        out = cache.create(key, shape, dtype)
+    else:
+        out = np.empty(shape, dtype=dtype)
+
+    for s in range(0, num_frames, block_frames):
+        e = min(s + block_frames, num_frames)
+        out[s:e] = compute_block(s, e)
+        if progress_callback is not None:
+            progress_callback(e, num_frames)
+
+    if cache is None:
+        return out
+    cache.commit(key, out, {'product': product, 'params': params, 'shape': shape,
+                            'dtype': np.dtype(dtype).name, 'source': source_identity(reader)})
+    return cache.load(key)
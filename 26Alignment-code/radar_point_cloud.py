@@ -1,130 +1,319 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.cluster import DBSCAN
+import argparse
+import os
+import fft_backend
+from concurrent.futures import ProcessPoolExecutor
+from adc_reader import AdcCubeReader, open_adc, to_complex
+import cfar
+import grid_cluster
+import radar_tracker
+import track_io
+import radar_cache
+import beamforming
+import roi
+import geometry
 
 # ==========================================
 # 1. 雷达配置 (和之前一样)
 # ==========================================
 CONFIG = {
-    'file_path': 'adc_data_Full_p1_aligned.bin', 
+    # mmwave_aligned 输出的整段裁剪结果 (p1+p2 已拼接，可以是虚拟裁剪)
+    'file_path': 'adc_data_Full_3s_to_59s.bin', 
     'num_adc_samples': 256,
     'num_chirps_per_frame': 384,
     'num_rx_antennas': 4,
     'num_tx_antennas': 3,
     'fps': 16.13,
     'range_resolution': 0.044,
-    'max_range': 5.0, # 只需要5米内的数据
+    # 感兴趣区域: 距离门 (默认 0.5~5 米) + 方位扇区，可选 chirp-z 细采样，见 roi.py
+    # Angle-FFT / Capon / CFAR 都只在 ROI 内计算
+    'roi': roi.ROI_CONFIG,
+    # 角度估计: 'capon' (MVDR，分辨率高) / 'fft' (旧的 64 点 Angle-FFT)
+    # Capon 的阵列布局、对角加载见 beamforming.BEAMFORMING_CONFIG；两种方法的角度轴相同
+    # (θ = pi * f，沿用旧 Angle-FFT 的标法)，同一个目标的 x/y 不随方法变化
+    'angle_method': 'capon',
+    'precision': 'single', # complex64 / float32 全程单精度，见 adc_reader.py
+    'batch_frames': 256,   # 每次批量处理的帧数
+    'points_file': 'radar_points.npz', # 扁平点云 + 每帧偏移量
+    'workers': 1,          # 并行进程数，命令行 --workers N 可覆盖
+    # 检测器: 'ca' (CA-CFAR) / 'os' (OS-CFAR) / 'percentile' (旧的每帧 99.5% 分位数)
+    # CFAR 的保护/训练单元和虚警率见 cfar.CFAR_CONFIG
+    'detector': 'ca',
+    # 聚类找人 (与原来的 DBSCAN(eps=0.5, min_samples=3) 语义相同)
+    'cluster_eps': 0.5,
+    'cluster_min_samples': 3,
+    # 多目标跟踪 (参数见 radar_tracker.TRACKER_CONFIG)
+    'tracks_file': 'radar_tracks.npz', # 每条航迹每帧的状态 + 协方差
+    'track_file': 'radar_track.trk',   # 单人轨迹 (二进制，见 track_io.py)
+    # radar_track 的来源: 'dominant' (每帧最大的簇，旧做法) / 'tracker' (持续最久的航迹)
+    'track_source': 'dominant',
+    # Range-Azimuth 热力图的磁盘缓存 (见 radar_cache.py)，只改检测/聚类/跟踪参数时不用重算 FFT
+    # None 关闭
+    'cache': radar_cache.CACHE_CONFIG,
 }
 
+def loop_averaged_frames(reader, start, stop):
+    """ 读取 [start, stop) 帧并对 Loops 求平均 -> [Frames, TX, RX, Samples] 复数
+
+    直接在 int16 原始数据上求平均再转复数，不会生成整块的复数立方体。
+    """
+    raw = reader.raw_frames(start, stop) # [Frames, Loops, TX, RX, Samples, 2]
+    real_dtype = np.empty(0, dtype=reader.complex_dtype).real.dtype
+    return to_complex(raw.mean(axis=1, dtype=real_dtype), reader.complex_dtype)
+
+def make_roi(config):
+    """ 按 config['roi'] 生成 ROI，两侧多留 CFAR 保护 + 训练单元，保证 ROI 边缘的格子也有完整的训练区 """
+    margin = tuple(g + t for g, t in zip(cfar.CFAR_CONFIG['guard_cells'], cfar.CFAR_CONFIG['train_cells']))
+    return roi.RegionOfInterest(config['roi'], config['num_adc_samples'], config['range_resolution'], margin)
+
+def range_azimuth_heatmap(block, config, region):
+    """ 对一块帧批量做 Range-FFT -> Angle-FFT，返回 ROI 内的 [Frames, Range, Angle] 幅度图 (float32)
+
+    block: [Frames, TX, RX, Samples] 复数，已对 Loops 求平均
+    """
+    num_frames_in_block = block.shape[0]
+
+    # 2D FFT (Range-Doppler)
+    # 咱们取多普勒维度的0频附近? 不，直接非相干积累看能量
+    # 这里的处理为了速度，我们简化为：直接在 Virtual Array 上做 Angle FFT
+    
+    # 构建虚拟天线数据 [12, Samples] (平均所有Loop)
+    # FFT 是线性的: mean(FFT(x)) == FFT(mean(x))，所以先对 Loops 求平均
+    # (见 loop_averaged_frames) 再做 Range FFT，计算量直接少 128 倍
+    virtual_ant_data = block.reshape(num_frames_in_block, -1, config['num_adc_samples']) # [Frames, 12, Samples]
+
+    # Range FFT，只留距离门内的单元
+    # fft_backend (默认 scipy.fft 多线程) 对 complex64 输入直接按单精度计算
+    range_fft = region.range_fft(virtual_ant_data, axis=-1)
+    
+    # Angle FFT (沿着天线维度)，补零到64点提高分辨率，只留扇区内的单元
+    angle_fft = region.angle_fft(range_fft, axis=1)
+    
+    # 得到 [Frames, Range, Angle] 热力图
+    return np.abs(angle_fft).transpose(0, 2, 1).astype(np.float32, copy=False)
+
+def capon_heatmap(reader, start, stop, config, region):
+    """ [start, stop) 帧的 Capon Range-Azimuth 幅度图，只算 ROI 内 [Frames, Range, Angle] (float32)
+
+    每个距离单元用 128 个 Loop 作快拍估计 12x12 协方差 (不能先对 Loops 求平均)，
+    按 BEAMFORMING_CONFIG['block_frames'] 分小块控制内存。
+    """
+    bf_config = beamforming.BEAMFORMING_CONFIG
+    beamformer = beamforming.CaponBeamformer(bf_config, reader.num_tx * reader.num_rx, region.angles)
+    heatmap = np.zeros((stop - start, len(region.ranges), len(region.angles)), dtype=np.float32)
+
+    for s in range(start, stop, bf_config['block_frames']):
+        e = min(s + bf_config['block_frames'], stop)
+        cube = reader.frames(s, e) # [Frames, Loops, TX, RX, Samples]
+        cube = cube.reshape(e - s, reader.num_loops, -1, config['num_adc_samples'])
+        range_fft = region.range_fft(cube, axis=-1)   # [Frames, Loops, 12, Range]
+        # 快拍矩阵 [Frames, Range, Loops, 12]
+        snapshots = range_fft.transpose(0, 3, 1, 2)
+        heatmap[s - start:e - start] = beamformer.spectrum(snapshots)
+    return heatmap
+
+def compute_heatmap(reader, start, stop, config, region):
+    """ 按 config['angle_method'] 计算 ROI 内的 [Frames, Range, Angle] 热力图 """
+    if config.get('angle_method', 'fft') == 'capon':
+        return capon_heatmap(reader, start, stop, config, region)
+    return range_azimuth_heatmap(loop_averaged_frames(reader, start, stop), config, region)
+
+def heatmap_params(config):
+    """ 影响热力图结果的参数 (缓存键的一部分)，检测 / 聚类参数不在里面 """
+    params = {key: config[key] for key in ('num_adc_samples', 'num_chirps_per_frame',
+                                           'num_rx_antennas', 'num_tx_antennas')}
+    method = config.get('angle_method', 'fft')
+    params.update(roi=config['roi'], range_resolution=config['range_resolution'],
+                  cfar_margin=(cfar.CFAR_CONFIG['guard_cells'], cfar.CFAR_CONFIG['train_cells']))
+    if method == 'capon':
+        params.update(angle_method=method, beamforming=beamforming.BEAMFORMING_CONFIG)
+    else:
+        params.update(loop_average=True, angle_bins=roi.ANGLE_FFT_SIZE)
+    return params
+
+def detect_points(heatmap, config, geom):
+    """ ROI 热力图 -> 阈值 / CFAR 检测 -> 查表转直角坐标
+
+    geom: geometry.PolarGeometry.from_roi(region)，和热力图同样的 [Range, Angle] 网格
+    返回 (points [N, 3] float32, frame_ids [N]，块内帧号)
+    """
+    num_frames_in_block = heatmap.shape[0]
+
+    # 目标检测
+    if config['detector'] == 'percentile':
+        # 旧做法: 每帧各自取最亮的0.5%的点，不管有没有人都会出点
+        threshold = np.percentile(heatmap.reshape(num_frames_in_block, -1), 99.5, axis=1)
+        detections = heatmap > threshold[:, None, None]
+    else:
+        # CFAR: 阈值跟着局部噪声走，所有帧一次算完
+        detections = cfar.detect(heatmap, config['detector'])
+
+    # 检测掩码 & ROI 掩码 (去掉给 CFAR 多留的边缘)，再按格子查 (x, y, z) 表
+    # z = 0: 2D雷达假设z=0，如果是3D雷达需要Elevation FFT
+    return geom.points(detections)
+
+def extract_range(file_path, config, start, stop, verbose=False, heatmap_path=None, heatmap_mode=None):
+    """ 提取 [start, stop) 帧的点云，返回 (points [N, 3], 每帧点数 [stop - start])
+
+    每个工作进程自己用 memmap 打开文件，数据立方体不需要在进程间传递，
+    多个进程读同一个文件时共享系统的页缓存。
+    heatmap_path: 缓存里的热力图 .npy，heatmap_mode 为 'r' 时直接读取 (跳过 FFT)，
+    为 'r+' 时把算出的热力图写进去 (各进程写各自的帧段，互不重叠)。
+    """
+    reader = None if heatmap_mode == 'r' else AdcCubeReader(file_path, config)
+    region = make_roi(config)
+    geom = geometry.PolarGeometry.from_roi(region)
+    heatmaps = None if heatmap_path is None else np.load(heatmap_path, mmap_mode=heatmap_mode)
+    all_points = []
+    points_per_frame = np.zeros(stop - start, dtype=np.int64)
+
+    for s in range(start, stop, config['batch_frames']):
+        e = min(s + config['batch_frames'], stop)
+        if heatmap_mode == 'r':
+            heatmap = np.asarray(heatmaps[s:e])
+        else:
+            heatmap = compute_heatmap(reader, s, e, config, region)
+            if heatmaps is not None:
+                heatmaps[s:e] = heatmap
+        points_xyz, frame_ids = detect_points(heatmap, config, geom)
+        all_points.append(points_xyz)
+        points_per_frame[s - start:e - start] = np.bincount(frame_ids, minlength=e - s)
+        if verbose:
+            print(f"处理进度: {e}/{stop}")
+
+    if heatmaps is not None and heatmap_mode == 'r+':
+        heatmaps.flush()
+
+    points = np.concatenate(all_points) if all_points else np.zeros((0, 3), dtype=np.float32)
+    return points, points_per_frame
+
+def _extract_range_job(args):
+    # 进程数已经占满 CPU，每个进程里 FFT 只用单线程，避免线程过多互相抢
+    fft_backend.configure(workers=1)
+    return extract_range(*args)
+
+def split_frame_ranges(num_frames, batch_frames, workers):
+    """ 把帧切成若干段给进程池，段边界对齐到 batch_frames，保证和串行结果逐字节一致 """
+    # 每个进程分到约 4 段，进度更均匀
+    target = -(-num_frames // (workers * 4))
+    chunk = max(1, -(-target // batch_frames)) * batch_frames
+    return [(s, min(s + chunk, num_frames)) for s in range(0, num_frames, chunk)]
+
 def generate_point_cloud(config):
     print("正在处理雷达点云...")  
-    # 读取数据 (同前)
-    raw_data = np.fromfile(config['file_path'], dtype=np.int16)
-    raw_data = raw_data.astype(np.float32)
-    complex_data = raw_data[0::2] + 1j * raw_data[1::2]
-
-    frame_size = config['num_adc_samples'] * config['num_chirps_per_frame'] * config['num_rx_antennas']
-    num_frames = len(complex_data) // frame_size
-    complex_data = complex_data[:num_frames * frame_size]
-
-    # Reshape
-    data_cube = complex_data.reshape(num_frames, config['num_chirps_per_frame'], 
-                                     config['num_rx_antennas'], config['num_adc_samples'])
-    
-    # 分离 TX (384 chirps -> 128 loops * 3 TX)
-    num_loops = config['num_chirps_per_frame'] // config['num_tx_antennas']
-    data_cube = data_cube.reshape(num_frames, num_loops, config['num_tx_antennas'], 
-                                  config['num_rx_antennas'], config['num_adc_samples'])
+    # 内存映射读取，按块取数据时才转复数
+    reader = open_adc(config['file_path'], config)
+    if reader is None:
+        return
+    num_frames = reader.num_frames
 
     # === 极简版点云生成 (Range-Azimuth Heatmap Peak Finding) ===
-    # 为了简化计算，我们这里只做 Range-FFT 和 Angle-FFT (Capon/Music太慢了)
+    # 角度默认用 Capon (beamforming.py，批量求解后单核每帧约 10 ms)，也可以切回 Angle-FFT
     
     # 1. 虚拟孔径数组构建 (Virtual Antenna Array)
     # TDM-MIMO: 3TX * 4RX = 12 Virtual Antennas
     # 需要根据天线布局拼接。通常 IWR6843 是水平排列
     # 简单拼接: [TX0RX0...TX0RX3, TX1RX0...TX1RX3, ...]
-    
-    radar_centroids = [] # 存储每一帧的人体坐标 [x, y, z]
-
-    for frame_idx in range(num_frames):
-        # 拿一帧数据
-        frame_data = data_cube[frame_idx] # [Loops, TX, RX, Samples]
-        
-        # 2D FFT (Range-Doppler)
-        # Range FFT
-        range_fft = np.fft.fft(frame_data, axis=-1)
-        
-        # 咱们取多普勒维度的0频附近? 不，直接非相干积累看能量
-        # 这里的处理为了速度，我们简化为：直接在 Virtual Array 上做 Angle FFT
-        
-        # 构建虚拟天线数据 [12, Samples] (取第0个Loop，或者平均所有Loop)
-        virtual_ant_data = range_fft.mean(axis=0) # [TX, RX, Samples]
-        virtual_ant_data = virtual_ant_data.reshape(-1, config['num_adc_samples']) # [12, Samples]
-        
-        # Angle FFT (沿着天线维度)
-        angle_fft = np.fft.fft(virtual_ant_data, axis=0, n=64) # 补零到64点提高分辨率
-        angle_fft = np.fft.fftshift(angle_fft, axes=0)
-        
-        # 得到 [Angle, Range] 热力图
-        heatmap = np.abs(angle_fft).T # [Range, Angle]
-        
-        # 阈值过滤 (CFAR的简化版)
-        threshold = np.percentile(heatmap, 99.5) # 只取最亮的0.5%的点
-        peaks = np.argwhere(heatmap > threshold)
-        
-        points_xyz = []
-        for r_idx, a_idx in peaks:
-            r = r_idx * config['range_resolution']
-            if r > config['max_range'] or r < 0.5: continue # 过滤太远或太近
-            
-            # 角度索引转弧度 (-pi/2 到 pi/2)
-            # 64点FFT，中间是0度
-            angle = (a_idx - 32) / 64 * np.pi 
-            
-            x = r * np.sin(angle)
-            y = r * np.cos(angle)
-            z = 0 # 2D雷达假设z=0，如果是3D雷达需要Elevation FFT
-            
-            points_xyz.append([x, y, z])
-        
-        points_xyz = np.array(points_xyz)
-        
-        # 聚类找人 (DBSCAN)
-        if len(points_xyz) > 0:
-            clustering = DBSCAN(eps=0.5, min_samples=3).fit(points_xyz)
-            # 假设点最多的那个类是人
-            labels = clustering.labels_
-            if len(set(labels)) > 1 or (len(set(labels))==1 and -1 not in labels):
-                # 找最大的簇
-                unique_labels, counts = np.unique(labels[labels>=0], return_counts=True)
-                if len(unique_labels) > 0:
-                    dominant_label = unique_labels[np.argmax(counts)]
-                    person_points = points_xyz[labels == dominant_label]
-                    centroid = np.mean(person_points, axis=0)
-                    radar_centroids.append(centroid)
-                else:
-                    radar_centroids.append([np.nan, np.nan, np.nan])
-            else:
-                radar_centroids.append([np.nan, np.nan, np.nan])
+
+    # 2. 按块批量提取点云，结果是一个扁平的点数组 + 每帧的偏移量
+    # 第 i 帧的点 = points[offsets[i]:offsets[i+1]]
+    # 有缓存时直接读 Range-Azimuth 热力图，只重跑检测；没有时边算边写进缓存
+    cache_config = config.get('cache')
+    heatmap_path, heatmap_mode, cache, key = None, None, None, None
+    if cache_config and cache_config.get('enabled'):
+        cache = radar_cache.RadarCache(cache_config)
+        key = cache.key(reader, 'range_azimuth', heatmap_params(config))
+        cached = cache.load(key)
+        if cached is not None:
+            heatmap_path, heatmap_mode = cached.filename, 'r'
+            print(f"使用缓存的 Range-Azimuth 热力图: {heatmap_path}")
         else:
-            radar_centroids.append([np.nan, np.nan, np.nan])
+            region = make_roi(config)
+            heatmaps = cache.create(key, (num_frames, len(region.ranges), len(region.angles)), np.float32)
+            heatmap_path, heatmap_mode = heatmaps.filename, 'r+'
+
+    workers = config.get('workers', 1)
+    if workers <= 1:
+        points, points_per_frame = extract_range(reader.file_path, config, 0, num_frames, verbose=True,
+                                                 heatmap_path=heatmap_path, heatmap_mode=heatmap_mode)
+    else:
+        # 多进程: 按帧段分给各进程，结果按帧顺序拼回来
+        ranges = split_frame_ranges(num_frames, config['batch_frames'], workers)
+        print(f"使用 {workers} 个进程并行处理 ({len(ranges)} 段)")
+        jobs = [(reader.file_path, config, s, e, False, heatmap_path, heatmap_mode) for s, e in ranges]
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (s, e), result in zip(ranges, pool.map(_extract_range_job, jobs)):
+                results.append(result)
+                print(f"处理进度: 第 {s}~{e} 帧完成")
+        points = np.concatenate([r[0] for r in results])
+        points_per_frame = np.concatenate([r[1] for r in results])
+
+    if heatmap_mode == 'r+':
+        cache.commit(key, heatmaps, {'product': 'range_azimuth', 'params': heatmap_params(config),
+                                     'shape': heatmaps.shape, 'dtype': 'float32',
+                                     'source': radar_cache.source_identity(reader)})
+
+    # 帧索引标记为不完整 / 丢包补零的帧不出点，跟踪器按漏检处理 (热力图缓存里仍是原始结果)
+    valid = reader.valid_mask()
+    if not valid.all():
+        points = points[np.repeat(valid, points_per_frame)]
+        points_per_frame = np.where(valid, points_per_frame, 0)
+        print(f"跳过帧索引标记的 {np.count_nonzero(~valid)} 个异常帧")
+
+    offsets = np.concatenate(([0], np.cumsum(points_per_frame)))
+    np.savez(config['points_file'], points=points, offsets=offsets)
+    print(f"点云已保存到 {config['points_file']} (共 {len(points)} 个点)")
+
+    # 3. 聚类: 网格哈希 + 连通分量，一批帧一起算，得到每帧所有簇的质心
+    centroids, sizes, frames = grid_cluster.cluster_centroids(points, offsets, config['cluster_eps'],
+                                                              config['cluster_min_samples'])
+
+    # 4. 多目标跟踪: 每帧所有簇都参与关联，不再只看最大的那个
+    tracker_config = dict(radar_tracker.TRACKER_CONFIG, fps=config['fps'])
+    tracks = radar_tracker.run_tracker(centroids, frames, num_frames, tracker_config)
+    np.savez(config['tracks_file'], **tracks)
+    print(f"航迹已保存到 {config['tracks_file']} (共 {len(np.unique(tracks['track_id']))} 条)")
 
-        if frame_idx % 50 == 0:
-            print(f"处理进度: {frame_idx}/{num_frames}")
+    if config['track_source'] == 'tracker':
+        radar_centroids = radar_tracker.primary_track(tracks, num_frames)
+        confidence, confidence_kind = None, None
+    else:
+        # 假设点最多的那个类是人 (直接用上面聚好的簇，不再聚一次)
+        radar_centroids, confidence = grid_cluster.pick_dominant(centroids, sizes, frames, num_frames)
+        confidence_kind = 'cluster_points'
 
     # 保存结果
-    radar_centroids = np.array(radar_centroids)
-    np.savetxt("radar_track.txt", radar_centroids, fmt="%.4f")
-    print("雷达轨迹已保存到 radar_track.txt")
+    track_file = track_io.write_track(config['track_file'],
+                                      track_io.radar_records(radar_centroids, config['fps'], confidence=confidence),
+                                      fps=config['fps'], confidence=confidence_kind,
+                                      source=os.path.basename(reader.source_path))
+    print(f"雷达轨迹已保存到 {track_file}")
     
     # 画个图看看轨迹对不对
     plt.figure()
-    plt.plot(radar_centroids[:, 0], radar_centroids[:, 1], '.-')
+    if cache is not None:
+        # 有缓存的热力图时，把整段录制的平均能量画成俯视背景 (静止物体 / 墙一目了然)
+        heatmaps = cache.load(key)
+        mean_heatmap = np.zeros(heatmaps.shape[1:])
+        for s in range(0, num_frames, config['batch_frames']):
+            mean_heatmap += heatmaps[s:s + config['batch_frames']].sum(axis=0)
+        image, extent = geometry.PolarGeometry.from_roi(make_roi(config)).render(mean_heatmap / num_frames)
+        plt.imshow(20 * np.log10(image + 1e-9), origin='lower', extent=extent, cmap='gray', alpha=0.6)
+    plt.plot(radar_centroids[:, 0], radar_centroids[:, 1], '.-', label=os.path.basename(config['track_file']))
+    for tid in np.unique(tracks['track_id']):
+        sel = tracks['track_id'] == tid
+        plt.plot(tracks['state'][sel, 0], tracks['state'][sel, 1], alpha=0.5, label=f"Track {tid}")
     plt.title("Extracted Radar Trajectory (Top View)")
     plt.xlabel("X (meters)")
     plt.ylabel("Y (meters)")
     plt.axis('equal')
+    plt.legend()
     plt.show()
 
 if __name__ == "__main__":
-    generate_point_cloud(CONFIG)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="雷达点云 + 轨迹提取")
+    parser.add_argument('--workers', type=int, default=CONFIG['workers'], help="并行进程数")
+    args = parser.parse_args()
+    generate_point_cloud(dict(CONFIG, workers=args.workers))
\ No newline at end of file
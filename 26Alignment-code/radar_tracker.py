@@ -0,0 +1,236 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import time
+from scipy.optimize import linear_sum_assignment
+import grid_cluster
+
+# ==========================================
+# 多目标跟踪 (匀速模型卡尔曼滤波 + 门限关联 + 航迹起始/终止)
+# ==========================================
+# 以前每帧只留点数最多的簇，其余帧写 nan，后面再靠 clean_radar_track /
+# interpolate_radar 去补。这里改成在线跟踪，每来一帧调用一次 step():
+#   1. 预测: 所有航迹一起做 x = F x, P = F P F' + Q
+#   2. 关联: 马氏距离平方 <= 门限才算候选，匈牙利算法 (或贪心) 一对一分配
+#   3. 更新: 分到检测的航迹一起做卡尔曼更新，没分到的只预测 (滑行)
+#   4. 起始/终止: 没分到航迹的检测新建暂定航迹，连续命中 confirm_hits 次转正;
+#      暂定航迹一丢就删，正式航迹连续丢 max_misses 帧删除
+# 状态 [x, y, vx, vy]，每帧的计算量只和航迹数 x 检测数有关 (每帧几个人、几个簇)。
+
+TRACKER_CONFIG = {
+    'fps': 16.13,
+    'accel_noise': 2.0,        # 过程噪声: 加速度标准差 (m/s^2)，人走路转身用 1~3
+    'measurement_noise': 0.15, # 簇质心的位置测量误差 (m)
+    'init_velocity_std': 1.0,  # 新航迹速度的初始不确定度 (m/s)
+    'gate': 9.21,              # 马氏距离平方门限，2 自由度卡方 99%
+    'association': 'hungarian',# 'hungarian' / 'greedy'
+    'confirm_hits': 3,         # 连续命中几次转为正式航迹
+    'max_misses': 8,           # 正式航迹连续丢失几帧后删除 (约 0.5 秒)
+}
+
+
+class MultiTargetTracker:
+    """ 在线多目标跟踪器，每帧调用一次 step(detections) """
+
+    def __init__(self, config=TRACKER_CONFIG):
+        self.config = config
+        dt = 1.0 / config['fps']
+        self.F = np.array([[1, 0, dt, 0],
+                           [0, 1, 0, dt],
+                           [0, 0, 1, 0],
+                           [0, 0, 0, 1]], dtype=np.float64)
+        # 白噪声加速度模型的离散过程噪声
+        q = config['accel_noise'] ** 2
+        block = np.array([[dt ** 4 / 4, dt ** 3 / 2],
+                          [dt ** 3 / 2, dt ** 2]]) * q
+        self.Q = np.zeros((4, 4))
+        self.Q[np.ix_([0, 2], [0, 2])] = block
+        self.Q[np.ix_([1, 3], [1, 3])] = block
+        self.R = np.eye(2) * config['measurement_noise'] ** 2
+
+        self.x = np.zeros((0, 4))       # 状态 [Tracks, 4]
+        self.P = np.zeros((0, 4, 4))    # 协方差 [Tracks, 4, 4]
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.confirmed = np.zeros(0, dtype=bool)
+        self.next_id = 0
+        self.frame = -1
+
+    def predict(self):
+        """ 所有航迹一起预测一步 """
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def associate(self, z):
+        """ 返回 (航迹下标, 检测下标)，只包含门限以内的配对 """
+        if len(self.x) == 0 or len(z) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # 新息 y = z - Hx，新息协方差 S = H P H' + R (H 取前两维位置)
+        S_inv = np.linalg.inv(self.P[:, :2, :2] + self.R)
+        y = z[None, :, :] - self.x[:, None, :2]               # [Tracks, Dets, 2]
+        d2 = np.einsum('tmi,tij,tmj->tm', y, S_inv, y)        # 马氏距离平方
+        gate = self.config['gate']
+
+        if self.config['association'] == 'greedy':
+            # 所有门内配对按距离从小到大，先到先得
+            t_idx, m_idx = np.nonzero(d2 <= gate)
+            order = np.argsort(d2[t_idx, m_idx], kind='stable')
+            used_t, used_m, rows, cols = set(), set(), [], []
+            for t, m in zip(t_idx[order], m_idx[order]):
+                if t not in used_t and m not in used_m:
+                    used_t.add(t)
+                    used_m.add(m)
+                    rows.append(t)
+                    cols.append(m)
+            return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+        # 匈牙利: 门外的配对给一个很大的代价，分配完再剔除
+        cost = np.where(d2 <= gate, d2, gate * 1e3)
+        rows, cols = linear_sum_assignment(cost)
+        keep = d2[rows, cols] <= gate
+        return rows[keep], cols[keep]
+
+    def update(self, track_idx, z):
+        """ 分到检测的航迹一起做卡尔曼更新 """
+        if len(track_idx) == 0:
+            return
+        x, P = self.x[track_idx], self.P[track_idx]
+        S = P[:, :2, :2] + self.R
+        K = P[:, :, :2] @ np.linalg.inv(S)                     # [N, 4, 2]
+        x = x + np.einsum('nij,nj->ni', K, z - x[:, :2])
+        P = P - K @ P[:, :2, :]
+        self.x[track_idx] = x
+        self.P[track_idx] = (P + P.transpose(0, 2, 1)) / 2     # 保持对称
+
+    def birth(self, z):
+        """ 没分到航迹的检测新建暂定航迹，速度为 0 """
+        n = len(z)
+        if n == 0:
+            return
+        x = np.zeros((n, 4))
+        x[:, :2] = z
+        P = np.zeros((n, 4, 4))
+        P[:, [0, 1], [0, 1]] = self.config['measurement_noise'] ** 2
+        P[:, [2, 3], [2, 3]] = self.config['init_velocity_std'] ** 2
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, P])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n)])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(n, dtype=np.int64)])
+        self.confirmed = np.concatenate([self.confirmed, np.zeros(n, dtype=bool)])
+        self.next_id += n
+
+    def step(self, detections):
+        """ 处理一帧
+
+        detections: [Dets, 2+] 本帧的簇质心 (只用 x, y)，可以为空
+        返回本帧的正式航迹 (ids [K], states [K, 4], covs [K, 4, 4], updated [K])，
+        updated 为 False 表示这一帧没有检测、只是按模型外推
+        """
+        self.frame += 1
+        z = np.asarray(detections, dtype=np.float64)
+        z = z[:, :2] if z.size else np.zeros((0, 2))
+
+        self.predict()
+        rows, cols = self.associate(z)
+        self.update(rows, z[cols])
+
+        updated = np.zeros(len(self.x), dtype=bool)
+        updated[rows] = True
+        self.hits[updated] += 1
+        self.misses[updated] = 0
+        self.misses[~updated] += 1
+        self.confirmed |= self.hits >= self.config['confirm_hits']
+
+        # 暂定航迹丢一次就删，正式航迹连续丢 max_misses 帧删除
+        alive = np.where(self.confirmed, self.misses <= self.config['max_misses'], self.misses == 0)
+        out = self.confirmed & alive
+        result = (self.ids[out], self.x[out].copy(), self.P[out].copy(), updated[out])
+
+        self.x, self.P = self.x[alive], self.P[alive]
+        self.ids, self.hits, self.misses = self.ids[alive], self.hits[alive], self.misses[alive]
+        self.confirmed = self.confirmed[alive]
+
+        unassigned = np.ones(len(z), dtype=bool)
+        unassigned[cols] = False
+        self.birth(z[unassigned])
+        return result
+
+
+def run_tracker(centroids, frames, num_frames, config=TRACKER_CONFIG):
+    """ 对整段录制离线跑一遍跟踪 (逐帧调用 step，和在线用法完全相同)
+
+    centroids / frames: grid_cluster.cluster_centroids 的输出，按帧号升序
+    返回字典: track_id [K], frame [K], state [K, 4], cov [K, 4, 4], updated [K]
+    """
+    tracker = MultiTargetTracker(config)
+    bounds = np.searchsorted(frames, np.arange(num_frames + 1))
+    track_id, frame, state, cov, updated = [], [], [], [], []
+
+    for f in range(num_frames):
+        ids, x, P, upd = tracker.step(centroids[bounds[f]:bounds[f + 1]])
+        track_id.append(ids)
+        frame.append(np.full(len(ids), f, dtype=np.int64))
+        state.append(x)
+        cov.append(P)
+        updated.append(upd)
+
+    return {
+        'track_id': np.concatenate(track_id),
+        'frame': np.concatenate(frame),
+        'state': np.concatenate(state).reshape(-1, 4),
+        'cov': np.concatenate(cov).reshape(-1, 4, 4),
+        'updated': np.concatenate(updated),
+    }
+
+
+def primary_track(tracks, num_frames):
+    """ 帧数最多 (持续最久) 的那条航迹 -> [Frames, 3] 位置，没有的帧为 nan，z = 0
+
+    和 track_io.load_radar_track 读出的格式一致，可以直接替代 "最大簇" 轨迹。
+    """
+    result = np.full((num_frames, 3), np.nan)
+    if len(tracks['track_id']) == 0:
+        return result
+    ids, counts = np.unique(tracks['track_id'], return_counts=True)
+    sel = tracks['track_id'] == ids[np.argmax(counts)]
+    result[tracks['frame'][sel], :2] = tracks['state'][sel, :2]
+    result[tracks['frame'][sel], 2] = 0.0
+    return result
+
+
+def track_points_file(points_file, tracks_file, cluster_eps=0.5, cluster_min_samples=3,
+                      config=TRACKER_CONFIG):
+    """ 从 radar_point_cloud 保存的点云 (.npz) 聚类 + 跟踪，结果存到 tracks_file """
+    data = np.load(points_file)
+    points, offsets = data['points'], data['offsets']
+    num_frames = len(offsets) - 1
+
+    centroids, _, frames = grid_cluster.cluster_centroids(points, offsets, cluster_eps,
+                                                          cluster_min_samples)
+    t0 = time.time()
+    tracks = run_tracker(centroids, frames, num_frames, config)
+    elapsed = time.time() - t0
+
+    np.savez(tracks_file, **tracks)
+    num_tracks = len(np.unique(tracks['track_id']))
+    print(f"跟踪完成: {num_frames} 帧, {num_tracks} 条航迹, 耗时 {elapsed:.2f}s "
+          f"({num_frames / max(elapsed, 1e-9):.0f} 帧/秒，实时需要 {config['fps']} 帧/秒)")
+    print(f"航迹已保存到 {tracks_file}")
+    return tracks
+
+
+if __name__ == "__main__":
+    tracks = track_points_file('radar_points.npz', 'radar_tracks.npz')
+
+    plt.figure()
+    for tid in np.unique(tracks['track_id']):
+        sel = tracks['track_id'] == tid
+        plt.plot(tracks['state'][sel, 0], tracks['state'][sel, 1], '.-', label=f"Track {tid}")
+    plt.title("Radar Tracks (Top View)")
+    plt.xlabel("X (meters)")
+    plt.ylabel("Y (meters)")
+    plt.axis('equal')
+    plt.legend()
+    plt.show()
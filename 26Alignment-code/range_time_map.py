@@ -1,5 +1,10 @@
 import numpy as np
 import matplotlib.pyplot as plt
+import fft_backend
+import time
+from adc_reader import open_adc, BYTES_PER_COMPLEX_SAMPLE
+import radar_cache
+import roi
 
 # ==========================================
 # 1. 核心配置
@@ -16,75 +21,106 @@ CONFIG = {
     # 辅助参数
     'num_tx_antennas': 3,        # 实际上上面的 384 已经隐含了这个信息，但留着备用
     'fps': 16.13,                # 1000ms / 62ms
-    'range_resolution': 0.044    # 默认值，不影响能否出图
+    'range_resolution': 0.044,   # 默认值，不影响能否出图
+    'roi': roi.ROI_CONFIG,       # 只保留距离门内的单元 (默认 0.5~5 米)，见 roi.py
+    'concat_split_files': True,  # 自动拼接 _p2, _p3 ... 分段，整段采集一次处理
+    'precision': 'single',       # complex64 / float32 全程单精度，见 adc_reader.py
+
+    # 流式处理 (长录制)
+    'memory_budget_mb': 512,     # 每块 FFT 允许占用的内存，块大小据此自动计算
+    'block_frames': None,        # 手动指定每块帧数，None 表示按内存预算自动算
+    'output_npy': None,          # 例如 'range_time_map.npy'，结果另存一份到磁盘
+    'show_plot': True,           # 服务器上无界面跑时设为 False
+    'cache': radar_cache.CACHE_CONFIG, # Range-FFT 结果的磁盘缓存，见 radar_cache.py；None 关闭
 }
 
-def process_radar_data(config):
-    print(f"正在读取文件: {config['file_path']} ...")
-    
-    # 1. 读取二进制文件
-    # DCA1000 保存的是 int16 格式
-    try:
-        raw_data = np.fromfile(config['file_path'], dtype=np.int16)
-    except FileNotFoundError:
-        print("错误：找不到文件，请检查路径。")
-        return
+def estimate_block_frames(reader, memory_budget_mb):
+    """ 按内存预算估算一次能处理多少帧 (至少 1 帧) """
+    # 单帧每个复数采样点在处理中占用的字节数:
+    # int16 原始 I/Q (4) + 复数数据 + FFT 结果 + 取模 (实数，复数的一半)
+    itemsize = np.dtype(reader.complex_dtype).itemsize
+    bytes_per_frame = reader.frame_size * (BYTES_PER_COMPLEX_SAMPLE + itemsize * 2 + itemsize // 2)
+    return max(1, int(memory_budget_mb * 1024 * 1024 // bytes_per_frame))
 
-    # 2. 处理复数 (I/Q)
-    # TI DCA1000 的原始数据通常是实部虚部交替
-    # 格式转换: I, Q, I, Q ... -> I + jQ
-    # 注意：某些旧版本固件可能是 Q, I 顺序，但这不影响我们看能量峰值
-    raw_data = raw_data.astype(np.float32)
-    complex_data = raw_data[0::2] + 1j * raw_data[1::2]
-    
-    print(f"原始数据读取完毕，总样本数 (Complex): {len(complex_data)}")
+def print_progress(done, total, elapsed, eta):
+    """ 默认进度回调: 打印进度和剩余时间 """
+    print(f"Range-FFT 进度: {done}/{total} 帧 ({done / total * 100:.1f}%) | "
+          f"已用 {elapsed:.1f}s | 预计剩余 {eta:.1f}s")
 
-    # 3. 计算这一分钟总共有多少帧 (Frame)
-    # 单帧大小 = Samples * Chirps (包含Tx和Rx的总Chirps) * RX
-    # 注意：这里的 chirps_per_frame 通常指 loops * tx_antennas
-    frame_size = config['num_adc_samples'] * config['num_chirps_per_frame'] * config['num_rx_antennas']
+def range_profile_block(reader, start, stop, region):
+    """ [start, stop) 帧距离门内的 Range-FFT 幅度，对全部 Chirps 和 RX 求平均 -> [Frames, Range] """
+    # 块形状: [Frames, Loops, TX, RX, Samples]
+    # 对最后一个维度 (Samples) 做 FFT
+    # fft_backend (默认 scipy.fft 多线程) 对 complex64 输入直接按单精度计算
+    range_fft = region.range_fft(reader.frames(start, stop), axis=-1)
+
+    # 取模 -> 也就是信号强度
+    # 对 Loops/TX (即全部 Chirps) 和 RX 维度求平均 -> [Frames, Samples]
+    return np.mean(np.abs(range_fft), axis=(1, 2, 3))
+
+def compute_range_time_map(reader, config, progress_callback=print_progress):
+    """ 流式 Range-FFT: 每次处理一块帧，逐块累积出 [Frames, Range] 幅度图
+
+    峰值内存只和块大小有关 (由 memory_budget_mb 控制)，与录制时长无关。
+    帧索引标记为异常 (reader.valid_mask() 为 False) 的帧整行为 nan。
+    progress_callback(已完成帧数, 总帧数, 已用秒数, 预计剩余秒数) 每块调用一次。
+    同样的数据和参数算过一次后结果在磁盘缓存里，再次运行直接读取。
+    """
+    num_frames = reader.num_frames
     
-    num_frames = len(complex_data) // frame_size
-    print(f"检测到完整帧数: {num_frames} 帧 (约 {num_frames/config['fps']:.1f} 秒)")
+    # 通常室内实验只关心前几米，后面的都是高频噪声
+    # 只保留 ROI 距离门内的单元 (取模、求平均、缓存都只做这些单元)
+    region = roi.RegionOfInterest(config['roi'], config['num_adc_samples'], config['range_resolution'])
+
+    block_frames = config.get('block_frames') or estimate_block_frames(
+        reader, config.get('memory_budget_mb', 512))
+
+    t0 = time.time()
+    def report(done, total):
+        if progress_callback is not None:
+            elapsed = time.time() - t0
+            progress_callback(done, total, elapsed, elapsed / done * (total - done))
+
+    # 缓存键只包含影响结果的参数，块大小 / 内存预算不影响结果
+    params = {key: config[key] for key in ('num_adc_samples', 'num_chirps_per_frame',
+                                           'num_rx_antennas', 'num_tx_antennas')}
+    params.update(roi=config['roi'], range_resolution=config['range_resolution'])
+    range_time_map = radar_cache.cached_frames(
+        reader, 'range_profile', params, (len(region.ranges),), np.float32,
+        lambda s, e: range_profile_block(reader, s, e, region),
+        block_frames, config.get('cache'), report)
+
+    # 帧索引标记为不完整 / 丢包补零的帧置 nan (缓存里存的是原始结果，只在这里屏蔽)
+    valid = reader.valid_mask()
+    if not valid.all():
+        range_time_map = np.array(range_time_map)
+        range_time_map[~valid] = np.nan
+
+    # 结果本身很小 (每帧 range_bins 个 float32)；需要时另存一份 .npy
+    if config.get('output_npy'):
+        np.save(config['output_npy'], range_time_map)
+    return range_time_map
+
+def process_radar_data(config):
+    print(f"正在读取文件: {config['file_path']} ...")
     
-    if num_frames == 0:
-        print("错误：数据量不足一帧，请检查配置参数是否设置过大。")
+    # 1. 内存映射打开二进制文件
+    # DCA1000 保存的是 int16 格式，这里不会一次性读入内存
+    reader = open_adc(config['file_path'], config)
+    if reader is None:
         return
 
-    # 截取完整帧的数据
-    complex_data = complex_data[:num_frames * frame_size]
-
-    # 4. 重塑矩阵形状
-    # 目标形状: [Frames, Chirps(all), RX, Samples]
-    try:
-        data_cube = complex_data.reshape(num_frames, 
-                                         config['num_chirps_per_frame'], 
-                                         config['num_rx_antennas'], 
-                                         config['num_adc_samples'])
-    except ValueError as e:
-        print(f"Reshape 失败: {e}")
-        print("这通常是因为 CONFIG 中的参数(Samples/Chirps/RX)与实际文件不匹配。")
-        return
+    num_frames = reader.num_frames
 
-    # 5. Range-FFT 处理
+    # 2. 逐块做 Range-FFT 并非相干积累
+    # 每次只把一小块帧转成复数 (I + jQ)，峰值内存与录制时长无关
     print("正在执行 Range-FFT ...")
-    
-    # 对最后一个维度 (Samples) 做 FFT
-    range_fft = np.fft.fft(data_cube, axis=-1)
-    
-    # 这是一个1分钟的长视频，为了方便看清楚，我们只取前一半距离
-    # 因为通常室内实验只关心前几米，后面的都是高频噪声
-    range_bins_to_keep = config['num_adc_samples'] // 2
-    range_fft = range_fft[:, :, :, :range_bins_to_keep]
+    range_time_map = compute_range_time_map(reader, config)
+    if config.get('output_npy'):
+        print(f"Range-Time 幅度图已保存到 {config['output_npy']}")
 
-    # 6. 生成 Range-Time Map (非相干积累)
-    # 也就是把 chirps 和 antennas 维度的能量加起来，只保留 [Time, Range]
-    # 取模 -> 也就是信号强度
-    radar_magnitude = np.abs(range_fft)
-    
-    # 对 Chirps 和 RX 维度求平均
-    # 形状变化: [Frames, Chirps, RX, Samples] -> [Frames, Samples]
-    range_time_map = np.mean(radar_magnitude, axis=(1, 2))
+    if not config.get('show_plot', True):
+        return range_time_map
     
     # 转为对数坐标 (dB)，让微弱信号也能看清
     range_time_map_log = 20 * np.log10(range_time_map + 1e-9) # 加微小值防止log0
@@ -92,17 +128,17 @@ def process_radar_data(config):
     # 为了绘图，我们需要转置: X轴是时间，Y轴是距离
     range_time_map_log = range_time_map_log.T
 
-    # 7. 绘图
+    # 3. 绘图
     print("正在绘图...")
     plt.figure(figsize=(12, 6))
     
-    # 翻转Y轴，让0米在最下面
+    # 翻转Y轴，让近处在最下面
     # extent参数设置坐标轴刻度: [开始时间, 结束时间, 开始距离, 结束距离]
     max_time = num_frames / config['fps']
-    max_range = range_bins_to_keep * config['range_resolution']
+    ranges = roi.RegionOfInterest(config['roi'], config['num_adc_samples'], config['range_resolution']).ranges
     
     plt.imshow(range_time_map_log, aspect='auto', cmap='jet', origin='lower',
-               extent=[0, max_time, 0, max_range])
+               extent=[0, max_time, ranges[0], ranges[-1]])
     
     plt.colorbar(label='Signal Strength (dB)')
     plt.xlabel('Time (Seconds)')
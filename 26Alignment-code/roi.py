@@ -0,0 +1,100 @@
+import numpy as np
+from scipy.signal import ZoomFFT
+import fft_backend
+
+# ==========================================
+# 感兴趣区域 (ROI): 距离门 + 方位扇区
+# ==========================================
+# 室内实验只关心 0.5~5 米、雷达正前方的扇区。以前先把 256 个距离单元、
+# 64 个角度单元全部算完再扔掉大半；现在各处理步骤共用同一个 ROI:
+#   - Range-FFT 之后立刻只留距离门内的单元，后面的 Angle-FFT / Capon / CFAR /
+#     Doppler 只在这些单元上算
+#   - Angle-FFT 之后只留扇区内的角度单元
+#   - zoom=True 时改用 chirp-z (ZoomFFT)，直接在 ROI 里按 range_points /
+#     angle_points 细采样，不需要补零到很长的 FFT
+# 角度的换算和 radar_point_cloud 原来的 64 点 Angle-FFT 一致:
+#   fftshift 后第 k 个单元 -> (k - 32) / 64 * pi，也就是归一化频率 f = angle / pi
+
+ROI_CONFIG = {
+    'min_range': 0.5,        # 米，太近的是天线耦合 / 板子附近的杂波
+    'max_range': 5.0,        # 米
+    'min_azimuth': -90.0,    # 度
+    'max_azimuth': 90.0,     # 度
+    'zoom': False,           # True: chirp-z 在 ROI 内细采样
+    'range_points': 256,     # zoom 时距离门内的采样点数
+    'angle_points': 64,      # zoom 时扇区内的采样点数
+}
+
+ANGLE_FFT_SIZE = 64  # 非 zoom 时 Angle-FFT 的补零点数
+
+
+class RegionOfInterest:
+    """ 把 ROI 换算成具体的距离 / 角度采样点，并提供只算 ROI 的变换
+
+    margin = (距离方向, 角度方向) 额外多留的采样点数，给 CFAR 的保护 + 训练单元用，
+    真正的 ROI 用 contains() 过滤。
+    """
+
+    def __init__(self, config, num_adc_samples, range_resolution, margin=(0, 0)):
+        self.config = config
+        self.num_adc_samples = num_adc_samples
+        self.range_resolution = range_resolution
+        self.zoom = config.get('zoom', False)
+        margin_r, margin_a = margin
+        min_angle, max_angle = np.deg2rad(config['min_azimuth']), np.deg2rad(config['max_azimuth'])
+
+        if self.zoom:
+            # 距离: 采样间隔 = ROI 宽度 / (点数 - 1)，两侧各多留 margin 个间隔
+            step = (config['max_range'] - config['min_range']) / max(config['range_points'] - 1, 1)
+            self.ranges = config['min_range'] + step * np.arange(-margin_r, config['range_points'] + margin_r)
+            self.ranges = self.ranges[(self.ranges >= 0) &
+                                      (self.ranges < num_adc_samples * range_resolution)]
+            # 距离 r 对应归一化频率 r / range_resolution / N (单位: 周期/采样点)
+            freqs = self.ranges / range_resolution / num_adc_samples
+            self._range_zoom = ZoomFFT(num_adc_samples, [freqs[0], freqs[-1]], len(freqs),
+                                       fs=1, endpoint=True)
+
+            step = (max_angle - min_angle) / max(config['angle_points'] - 1, 1)
+            self.angles = min_angle + step * np.arange(-margin_a, config['angle_points'] + margin_a)
+            self.angles = self.angles[(self.angles >= -np.pi / 2) & (self.angles < np.pi / 2)]
+            self._angle_fn = [self.angles[0] / np.pi, self.angles[-1] / np.pi]
+            self._angle_zoom = {}  # 按通道数缓存 ZoomFFT
+        else:
+            lo = int(np.ceil(config['min_range'] / range_resolution)) - margin_r
+            hi = int(np.floor(config['max_range'] / range_resolution)) + 1 + margin_r
+            self.range_slice = slice(max(lo, 0), min(hi, num_adc_samples))
+            self.ranges = np.arange(num_adc_samples)[self.range_slice] * range_resolution
+
+            grid = (np.arange(ANGLE_FFT_SIZE) - ANGLE_FFT_SIZE // 2) / ANGLE_FFT_SIZE * np.pi
+            inside = np.nonzero((grid >= min_angle - 1e-9) & (grid <= max_angle + 1e-9))[0]
+            lo, hi = inside[0] - margin_a, inside[-1] + 1 + margin_a
+            self.angle_slice = slice(max(lo, 0), min(hi, ANGLE_FFT_SIZE))
+            self.angles = grid[self.angle_slice]
+
+    def range_fft(self, x, axis=-1):
+        """ 沿 axis (快时间采样点) 做 Range 变换，只返回距离门内的单元 """
+        if self.zoom:
+            return self._range_zoom(x, axis=axis).astype(np.result_type(x, np.complex64), copy=False)
+        index = [slice(None)] * x.ndim
+        index[axis] = self.range_slice
+        return fft_backend.fft(x, axis=axis)[tuple(index)]
+
+    def angle_fft(self, x, axis):
+        """ 沿 axis (虚拟通道) 做 Angle 变换，只返回扇区内的单元 (角度从小到大) """
+        if self.zoom:
+            n = x.shape[axis]
+            if n not in self._angle_zoom:
+                self._angle_zoom[n] = ZoomFFT(n, self._angle_fn, len(self.angles), fs=1, endpoint=True)
+            return self._angle_zoom[n](x, axis=axis).astype(np.result_type(x, np.complex64), copy=False)
+        spectrum = fft_backend.fftshift(fft_backend.fft(x, axis=axis, n=ANGLE_FFT_SIZE), axes=axis)
+        index = [slice(None)] * x.ndim
+        index[axis] = self.angle_slice
+        return spectrum[tuple(index)]
+
+    def contains(self, ranges, angles=None):
+        """ 是否在真正的 ROI 内 (不含 margin) """
+        keep = (ranges >= self.config['min_range']) & (ranges <= self.config['max_range'])
+        if angles is not None:
+            keep &= ((angles >= np.deg2rad(self.config['min_azimuth']) - 1e-9) &
+                     (angles <= np.deg2rad(self.config['max_azimuth']) + 1e-9))
+        return keep
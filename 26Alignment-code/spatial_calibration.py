@@ -1,15 +1,21 @@
 import numpy as np
 import cv2
 import os
+from concurrent.futures import ProcessPoolExecutor
+import axis_search
+import calib_refine
+import timebase
+import time_sync
+import track_io
 
 # ==========================================
 # 1. 智能标定配置
 # ==========================================
 PAIRS = [
-    ('radar_track1.txt', 'camera_track1.txt', 'calib_r1_c1.npz'),
-    ('radar_track1.txt', 'camera_track2.txt', 'calib_r1_c2.npz'), # 之前失败的那个
-    ('radar_track1.txt', 'camera_track3.txt', 'calib_r1_c3.npz'),
-    ('radar_track1.txt', 'camera_track4.txt', 'calib_r1_c4.npz'),
+    ('radar_track1.trk', 'camera_track1.trk', 'calib_r1_c1.npz'),
+    ('radar_track1.trk', 'camera_track2.trk', 'calib_r1_c2.npz'), # 之前失败的那个
+    ('radar_track1.trk', 'camera_track3.trk', 'calib_r1_c3.npz'),
+    ('radar_track1.trk', 'camera_track4.trk', 'calib_r1_c4.npz'),
 ]
 
 # 海康相机参数
@@ -28,6 +34,16 @@ dist_coeffs = np.zeros((4,1))
 
 RADAR_FPS = 16.13
 VIDEO_FPS = 30.0
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS}, 'radar': {'rate': RADAR_FPS}})
+
+# 时间偏移 (雷达时间 = 视频时间 + offset)
+# 'auto': 每一组先用 time_sync 按运动曲线互相关自动估计; 数字: 固定用这个偏移
+TIME_OFFSET = 'auto'
+SYNC_CONFIG = dict(time_sync.TIME_SYNC_CONFIG, radar_fps=RADAR_FPS, video_fps=VIDEO_FPS)
+# PnP 之后的联合精修 (refine_focal = True 时焦距也一起估)
+REFINE_CONFIG = dict(calib_refine.CALIB_REFINE_CONFIG, radar_fps=RADAR_FPS, video_fps=VIDEO_FPS)
+# 坐标轴约定搜索 (48 种带符号轴置换 x 高度假设，见 axis_search.py)
+SEARCH_CONFIG = dict(axis_search.AXIS_SEARCH_CONFIG)
 
 def try_calibrate(object_points, image_points, description):
     """ 尝试一种特定的坐标变换，返回 (成功否, 误差, rvec, tvec) """
@@ -52,93 +68,104 @@ def try_calibrate(object_points, image_points, description):
     else:
         return False, 99999, None, None
 
+def _full_solve_job(args):
+    """ 一个候选的完整求解: PnP RANSAC 给初值 -> 换到 [m*x, 0, y] 地面点模型 -> 联合精修 """
+    name, A, height, radar_xyz, uv, r_raw, c_raw, time_offset = args
+    obj_pts = ((radar_xyz + [0.0, 0.0, height]) @ A.T).astype(np.float32)
+    success, error, rvec, tvec = try_calibrate(obj_pts, uv.astype(np.float32), name)
+    if not success:
+        return None
+    R = cv2.Rodrigues(rvec)[0]
+    # 3D 点 = A[:, :2] @ [x, y] + (z + h) * A[:, 2]，地面点模型不含 z，把平均高度并进 T
+    T0 = tvec.reshape(3) + R @ A[:, 2] * (np.mean(radar_xyz[:, 2]) + height)
+    R0, mirror_x = calib_refine.to_ground_model(R, A[:, :2])
+    result = calib_refine.refine(r_raw, c_raw, R0, T0, time_offset, K, mirror_x, REFINE_CONFIG)
+    result['pnp_error'] = error
+    return result
+
 def solve_smart_pair(radar_file, cam_file, out_name):
     print(f"\n>>> 正在处理: {radar_file} <---> {cam_file}")
     
-    if not os.path.exists(radar_file) or not os.path.exists(cam_file):
+    if not track_io.track_exists(radar_file) or not track_io.track_exists(cam_file):
         print("  错误: 文件不存在，跳过。")
         return
 
     # 1. 读取原始数据
     try:
-        r_raw = np.loadtxt(radar_file)
-        c_raw = np.loadtxt(cam_file, skiprows=1)
+        r_raw = track_io.load_radar_track(radar_file)
+        c_raw = track_io.load_camera_track(cam_file)
     except:
         print("  读取错误，跳过。")
         return
 
-    # 2. 原始匹配 (只做时间对齐，不做坐标变换)
-    raw_matches = [] # 存 [rx, ry, u, v]
-    
-    for row in c_raw:
-        vid_idx = int(row[0])
-        u, v = row[1], row[2]
-        t = vid_idx / VIDEO_FPS
-        rad_idx = int(t * RADAR_FPS)
-        
-        if rad_idx < len(r_raw):
-            r_pt = r_raw[rad_idx]
-            if not np.isnan(r_pt[0]) and not np.all(r_pt==0):
-                raw_matches.append([r_pt[0], r_pt[1], u, v]) # 只取 x, y (忽略z=0)
+    # 2. 时间偏移
+    if TIME_OFFSET == 'auto':
+        sync = time_sync.estimate_offset(r_raw, c_raw, SYNC_CONFIG)
+        time_sync.print_result(sync)
+        time_offset = sync['offset'] if sync['offset'] is not None else 0.0
+    else:
+        time_offset = TIME_OFFSET
+    TIMEBASE.set_offset('radar', time_offset)
+
+    # 3. 原始匹配 (只做时间对齐，不做坐标变换)
+    # 偏移是小数帧，雷达位置按相机帧时刻在前后两帧之间线性插值 (任一侧无效则丢弃)
+    vid_idx = c_raw[:, 0].astype(int)
+    r_pt = TIMEBASE.sample('video', 'radar', vid_idx, r_raw[:, :3])
+    valid = ~np.isnan(r_pt[:, 0]) & ~np.all(r_pt[:, :2] == 0, axis=1)
+    # 存 [rx, ry, rz, u, v]
+    raw_matches = np.column_stack((r_pt[valid], c_raw[valid, 1:3]))
     
     if len(raw_matches) < 6:
         print("  匹配点过少 (<6)，跳过。")
         return
 
-    raw_matches = np.array(raw_matches)
-    rx = raw_matches[:, 0]
-    ry = raw_matches[:, 1]
-    uv = raw_matches[:, 2:]
-
-    # 3. 定义 4 种坐标变换策略
-    # 格式: 名字, lambda函数生成3D点
-    strategies = [
-        ("原始 [x, y, 0]",    lambda x, y: np.column_stack((x, y, np.zeros_like(x)))),
-        ("深度修正 [x, 0, y]", lambda x, y: np.column_stack((x, np.zeros_like(x), y))),
-        ("X反转 [ -x, 0, y]",  lambda x, y: np.column_stack((-x, np.zeros_like(x), y))),
-        ("Y反转 [x, 0, -y]",   lambda x, y: np.column_stack((x, np.zeros_like(x), -y))),
-    ]
-
-    best_error = 99999
-    best_res = None
-    best_name = ""
-
-    print(f"  匹配到 {len(raw_matches)} 个点，开始尝试 4 种坐标变换...")
+    uv = raw_matches[:, 3:]
+
+    # 4. 坐标轴约定搜索: 48 种带符号轴置换 x 高度假设，先用闭式解 + 物理检查筛一遍
+    radar_xyz = raw_matches[:, :3]
+    ranked = axis_search.rank([axis_search.screen(c, radar_xyz, uv, K, SEARCH_CONFIG)
+                               for c in axis_search.candidates(SEARCH_CONFIG)])
+    leaders = axis_search.distinct_leaders(ranked, SEARCH_CONFIG['max_full'])
+    print(f"  匹配到 {len(raw_matches)} 个点，{len(ranked)} 个候选中 {len(leaders)} 个进入完整求解...")
+
+    # 排名靠前的几个跑完整的 RANSAC + 联合精修，多个时用进程池并行
+    jobs = [(res['name'], res['A'], res['height'], radar_xyz, uv, r_raw, c_raw, time_offset) for res in leaders]
+    workers = min(SEARCH_CONFIG['workers'], len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_full_solve_job, jobs))
+    else:
+        outcomes = [_full_solve_job(job) for job in jobs]
 
-    for name, transform_func in strategies:
-        # 生成 3D 点
-        obj_pts = transform_func(rx, ry).astype(np.float32)
-        img_pts = uv.astype(np.float32)
-        
-        success, error, rvec, tvec = try_calibrate(obj_pts, img_pts, name)
-        
-        if success:
-            print(f"    - 尝试 {name}: 误差 = {error:.2f} px")
-            if error < best_error:
-                best_error = error
-                best_res = (rvec, tvec)
-                best_name = name
-        else:
-            print(f"    - 尝试 {name}: PnP 求解失败")
-
-    # 4. 保存最佳结果
-    if best_res:
-        rvec, tvec = best_res
-        R, _ = cv2.Rodrigues(rvec)
-        
+    best = None
+    best_name = ""
+    for res, refined in zip(leaders, outcomes):
+        res['refined'] = refined
+        # 按每个匹配点的平均代价比较 (各候选参与拟合的点数可能不同)
+        if refined is not None and (best is None or refined['mean_cost'] < best['mean_cost']):
+            best = refined
+            best_name = f"{res['name']} h={res['height']:+.2f}"
+    axis_search.print_table(ranked)
+
+    # 5. 保存最佳结果
+    if best:
         print("-" * 20)
         print(f"  [胜出策略] {best_name}")
-        print(f"  [最终误差] {best_error:.2f} 像素")
-        print(f"  [平移向量] {tvec.flatten()}")
+        print(f"  [最终误差] {best['rms']:.2f} 像素 (中位数 {best['median']:.2f})")
+        print(f"  [平移向量] {best['T']}")
+        print(f"  [时间偏移] {best['time_offset']:+.3f} 秒 | 镜像 {best['mirror_x']} | 焦距 {best['focal']:.1f}")
         
         # 这是一个简单的物理检查
-        if np.abs(tvec[2]) > 20: # 如果Z轴平移超过20米，通常是错的
+        if np.abs(best['T'][2]) > 20: # 如果Z轴平移超过20米，通常是错的
             print("  [警告] 平移向量 Z 值过大，可能仍有物理异常，请检查数据。")
             
-        np.savez(out_name, R=R, T=tvec, K=K, error=best_error, strategy=best_name)
+        # 和 interactive_tuner 存的格式一样，generate_with_debug 可以直接用
+        calib_refine.save_calibration(out_name, best, error=best['rms'], strategy=best_name)
         print(f"  已保存至 {out_name}")
     else:
-        print("  所有策略均失败，无法标定该组相机。")
+        print("  所有候选均失败，无法标定该组相机。")
+        if not leaders and SEARCH_CONFIG['require_upright']:
+            print("  (如果相机是倒装的，把 SEARCH_CONFIG['require_upright'] 设为 False 再试)")
 
 if __name__ == "__main__":
     print("开始智能标定...")
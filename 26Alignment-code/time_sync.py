@@ -0,0 +1,165 @@
+import numpy as np
+import timebase
+
+# ==========================================
+# 雷达 <-> 相机 时间偏移自动搜索
+# ==========================================
+# 以前 time_offset 只能在 interactive_tuner 里按 Z/C 手调，或者在脚本里写死 (TIME_OFFSET = -3)。
+# 这里按轨迹 "怎么动" 来对时间，不需要知道空间标定:
+#   - 雷达 (米) 和相机点击 (像素) 都插值到同一个细时间网格 (grid_rate，默认 100 Hz，
+#     远细于两边的帧间隔)，只在短缺口 (<= max_gap 秒) 里插值，长缺口留空 (掩码)
+#   - 平滑后求速度，得到每条轨迹的 速度分量 + 速率 曲线
+#   - 对每个候选偏移算归一化互相关 (NCC)，只统计两边都有数据的重叠部分 (带掩码的 NCC)，
+#     所有偏移用 FFT 一次算完
+#   - 速率曲线直接比; 速度分量的轴向和符号不知道 (还没标定)，取两种轴配对里 |NCC| 较大的
+#   - 最高分附近抛物线插值，得到比网格更细的偏移
+# 偏移约定和 timebase / interactive_tuner 一致: 雷达时间 = 视频时间 + offset
+
+TIME_SYNC_CONFIG = {
+    'radar_fps': 16.13,
+    'video_fps': 30.0,
+    'grid_rate': 100.0,         # 互相关的时间网格 (Hz)，偏移的搜索步长 1 / grid_rate
+    'max_offset': 10.0,         # 搜索范围 [-max_offset, max_offset] 秒
+    'max_gap': 0.5,             # 只在不超过这么长的缺口里插值 (秒)
+    'smooth': 0.5,              # 求速度前的滑动平均窗口 (秒)，压雷达噪声
+    'min_overlap': 10.0,        # 两条轨迹重叠少于这么多秒的偏移不算
+    'speed_weight': 0.5,        # 总分 = speed_weight * 速率 NCC + (1 - speed_weight) * 速度分量 NCC
+    'exclusion': 1.0,           # 次高峰要离最高峰至少这么远 (秒)，用来衡量结果是否唯一
+}
+
+
+def motion_profile(times, positions, config=TIME_SYNC_CONFIG):
+    """ 不均匀采样的轨迹 -> 网格上的运动曲线
+
+    times [N] 秒 (流内时间)，positions [N, 2] (可以有 nan)
+    返回 (profile [3, G] = 速度两个分量 + 速率, mask [G] bool)，第 k 个网格点时间为 k / grid_rate
+    """
+    dt = 1.0 / config['grid_rate']
+    valid = np.isfinite(positions).all(axis=1) & np.isfinite(times)
+    tv, pv = times[valid], positions[valid]
+    if len(tv) < 2:
+        return np.zeros((3, 0)), np.zeros(0, dtype=bool)
+    order = np.argsort(tv, kind='stable')
+    tv, pv = tv[order], pv[order]
+
+    t_grid = np.arange(int(np.ceil(tv[-1] / dt)) + 1) * dt
+    # 网格点两侧最近的样本间隔不超过 max_gap 才插值
+    right = np.clip(np.searchsorted(tv, t_grid), 1, len(tv) - 1)
+    mask = (t_grid >= tv[0]) & (t_grid <= tv[-1]) & (tv[right] - tv[right - 1] <= config['max_gap'] + 1e-9)
+    grid = np.column_stack([np.interp(t_grid, tv, pv[:, i]) for i in range(2)])
+
+    # 带掩码的滑动平均 (归一化卷积)，缺口两侧不会互相污染
+    # 窗口不能比网格长: 否则 mode='same' 返回 max(G, win) 个点，和 mask 对不上 (轨迹短于 smooth 秒时)
+    win = min(max(int(round(config['smooth'] * config['grid_rate'])), 1), len(t_grid))
+    kernel = np.ones(win)
+    weight = np.convolve(mask.astype(np.float64), kernel, mode='same')
+    grid = np.column_stack([np.convolve(grid[:, i] * mask, kernel, mode='same') for i in range(2)])
+    grid /= np.maximum(weight, 1e-12)[:, None]
+
+    velocity = np.gradient(grid, dt, axis=0)
+    # 中心差分要用到前后两个点，都在掩码内才算
+    mask = mask & np.roll(mask, 1) & np.roll(mask, -1)
+    mask[[0, -1]] = False
+    profile = np.vstack((velocity.T, np.hypot(velocity[:, 0], velocity[:, 1])))
+    profile[:, ~mask] = 0.0
+    return profile, mask
+
+
+def _spectra(profile, mask, nfft):
+    """ 带掩码 NCC 要用的三组频谱: 掩码、x * 掩码、x^2 * 掩码 """
+    m = mask.astype(np.float64)
+    x = profile * m
+    return np.fft.rfft(m, nfft), np.fft.rfft(x, nfft, axis=1), np.fft.rfft(x * profile, nfft, axis=1)
+
+
+def masked_ncc(cam, cam_mask, radar, radar_mask, max_lag, min_overlap):
+    """ 带掩码的归一化互相关，所有滞后一次用 FFT 算完
+
+    cam [C, Nc], radar [C, Nr] 多通道曲线；滞后 L 时比较 cam[t] 和 radar[t + L]，
+    只统计两边掩码都为真的样本。返回 (lags [-max_lag..max_lag], ncc [C, C, lags])，
+    ncc[i, j] 是相机第 i 通道和雷达第 j 通道；重叠样本少于 min_overlap 的滞后为 nan。
+    """
+    nfft = 1 << int(np.ceil(np.log2(cam.shape[1] + radar.shape[1])))
+    lags = np.arange(-max_lag, max_lag + 1)
+    pick = lags % nfft
+
+    def xcorr(a, b):
+        # sum_t a[t] * b[t + L]
+        return np.fft.irfft(np.conj(a) * b, nfft)[..., pick]
+
+    Mc, Xc, X2c = _spectra(cam, cam_mask, nfft)
+    Mr, Xr, X2r = _spectra(radar, radar_mask, nfft)
+    n = xcorr(Mc, Mr)
+    sc, scc = xcorr(Xc, Mr), xcorr(X2c, Mr)              # [C, lags]
+    sr, srr = xcorr(Mc, Xr), xcorr(Mc, X2r)
+    scr = xcorr(Xc[:, None, :], Xr[None, :, :])          # [C, C, lags]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_c = scc - sc ** 2 / n
+        var_r = srr - sr ** 2 / n
+        ncc = (scr - sc[:, None] * sr[None, :] / n) / np.sqrt(var_c[:, None] * var_r[None, :])
+    ncc[:, :, n < min_overlap] = np.nan
+    return lags, ncc
+
+
+def _refine_peak(scores, k):
+    """ 最高分两侧抛物线插值 -> 小数位置 (网格步长为单位) """
+    if k <= 0 or k >= len(scores) - 1 or not np.all(np.isfinite(scores[k - 1:k + 2])):
+        return 0.0
+    a, b, c = scores[k - 1:k + 2]
+    denom = a - 2 * b + c
+    return 0.0 if denom >= 0 else float(np.clip(0.5 * (a - c) / denom, -0.5, 0.5))
+
+
+def estimate_offset(radar_positions, camera_points, config=TIME_SYNC_CONFIG):
+    """ 估计 time_offset (雷达时间 = 视频时间 + offset)
+
+    radar_positions [N, >=2] 每个雷达帧一行 (nan 为无效，同 track_io.load_radar_track)，
+    camera_points [M, 3] (视频帧号, u, v) (同 track_io.load_camera_track)。
+    返回 dict: offset (秒)，score (最高 NCC)，runner_up (exclusion 之外的次高分)，
+    overlap (最佳偏移下的重叠秒数)，lags / scores (整条搜索曲线，lags 单位秒)；
+    数据不够时 offset 为 None。
+    """
+    rate = config['grid_rate']
+    clock = timebase.Timebase({'video': {'rate': config['video_fps']}, 'radar': {'rate': config['radar_fps']}})
+    radar_positions = np.asarray(radar_positions, dtype=np.float64)
+    camera_points = np.asarray(camera_points, dtype=np.float64)
+
+    # 全为 0 的占位点当无效
+    r_xy = radar_positions[:, :2].copy()
+    r_xy[np.all(r_xy == 0, axis=1)] = np.nan
+    radar, radar_mask = motion_profile(clock['radar'].times(np.arange(len(r_xy))), r_xy, config)
+    cam, cam_mask = motion_profile(clock['video'].times(camera_points[:, 0]), camera_points[:, 1:3], config)
+    result = {'offset': None, 'score': np.nan, 'runner_up': np.nan, 'overlap': 0.0,
+              'lags': np.zeros(0), 'scores': np.zeros(0)}
+    if not cam_mask.any() or not radar_mask.any():
+        return result
+
+    max_lag = int(np.ceil(config['max_offset'] * rate))
+    lags, ncc = masked_ncc(cam, cam_mask, radar, radar_mask, max_lag, config['min_overlap'] * rate)
+    # 速度分量: 轴向 / 符号未知，取 (u-x, v-y) 和 (u-y, v-x) 两种配对里 |NCC| 之和较大的
+    axes = np.fmax(np.abs(ncc[0, 0]) + np.abs(ncc[1, 1]), np.abs(ncc[0, 1]) + np.abs(ncc[1, 0])) / 2
+    w = config['speed_weight']
+    scores = w * ncc[2, 2] + (1 - w) * axes
+    if not np.any(np.isfinite(scores)):
+        return result
+
+    k = int(np.nanargmax(scores))
+    shift = _refine_peak(scores, k)
+    far = np.abs(lags - lags[k]) > config['exclusion'] * rate
+    runner_up = np.nanmax(scores[far]) if np.any(far & np.isfinite(scores)) else np.nan
+
+    # 最佳偏移下两边都有数据的时长
+    overlap = np.count_nonzero(cam_mask[max(0, -lags[k]):len(radar_mask) - lags[k]] &
+                               radar_mask[max(0, lags[k]):lags[k] + len(cam_mask)]) / rate
+    result.update(offset=(lags[k] + shift) / rate, score=float(scores[k]), runner_up=float(runner_up),
+                  overlap=overlap, lags=lags / rate, scores=scores)
+    return result
+
+
+def print_result(result):
+    if result['offset'] is None:
+        print("  [时间对齐] 有效数据太少，无法估计偏移")
+        return
+    print(f"  [时间对齐] time_offset = {result['offset']:+.3f} 秒 | NCC {result['score']:.3f} "
+          f"(次高 {result['runner_up']:.3f}) | 重叠 {result['overlap']:.1f} 秒")
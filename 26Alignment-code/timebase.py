@@ -0,0 +1,129 @@
+import numpy as np
+
+# ==========================================
+# 会话时间基准: 雷达 / 视频 / IMU 帧号 <-> 时间 的统一换算
+# ==========================================
+# 以前每个脚本都在逐帧循环里写一遍:
+#   t = frame_idx / VIDEO_FPS;  rad_idx = int((t + time_offset) * RADAR_FPS)
+# 这里每个数据流一个时钟 StreamClock，整个会话放在一个 Timebase 里，
+# 帧号 / 时间都可以整组数组一次换算。
+#
+# 时钟约定 (和 interactive_tuner 里 time_offset 的含义一致):
+#   流内时间 = 会话时间 + offset
+#   帧号     = 流内时间 * rate * (1 + drift_ppm * 1e-6)
+# 视频是参考流 (offset = 0)，雷达的 offset 就是调出来的 time_offset。
+# IMU (phyphox) 这类采样间隔不均匀的流可以直接给时间戳数组 timestamps (流内时间，秒)，
+# 帧号 <-> 时间按时间戳线性插值。
+#
+# 帧号换算模式:
+#   'floor'   - 向下取整，时间为正时和以前的 int(t * fps) 完全一致
+#   'nearest' - 四舍五入到最近一帧
+#   'interp'  - 返回 (左侧帧号 i0, 权重 w)，值 = (1 - w) * x[i0] + w * x[i0 + 1]
+
+TIMEBASE_CONFIG = {
+    'video': {'rate': 30.0},
+    'radar': {'rate': 16.13},
+}
+
+
+class StreamClock:
+    """ 一个数据流的时钟: 固定帧率 (rate, offset, drift_ppm) 或时间戳数组 """
+
+    def __init__(self, rate=None, offset=0.0, drift_ppm=0.0, timestamps=None):
+        if rate is None and timestamps is None:
+            raise ValueError("时钟需要 rate 或 timestamps")
+        self.rate = rate
+        self.offset = offset
+        self.drift_ppm = drift_ppm
+        self.timestamps = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+
+    @property
+    def effective_rate(self):
+        if self.drift_ppm:
+            return self.rate * (1 + self.drift_ppm * 1e-6)
+        return self.rate
+
+    def times(self, indices):
+        """ 帧号 (可以是小数) -> 会话时间 (秒) """
+        indices = np.asarray(indices, dtype=np.float64)
+        if self.timestamps is not None:
+            local = np.interp(indices, np.arange(len(self.timestamps)), self.timestamps,
+                              left=np.nan, right=np.nan)
+        else:
+            local = indices / self.effective_rate
+        return local - self.offset
+
+    def position(self, times):
+        """ 会话时间 -> 小数帧号 (时间戳流超出范围时为 NaN) """
+        local = np.asarray(times, dtype=np.float64) + self.offset
+        if self.timestamps is not None:
+            return np.interp(local, self.timestamps, np.arange(len(self.timestamps), dtype=np.float64),
+                             left=np.nan, right=np.nan)
+        return local * self.effective_rate
+
+    def indices(self, times, mode='floor'):
+        """ 会话时间 -> 帧号 (mode 见文件头)，NaN 对应的帧号为 -1 """
+        pos = self.position(times)
+        if mode == 'interp':
+            i0 = np.floor(pos)
+            return _to_index(i0), np.nan_to_num(pos - i0)
+        if mode == 'nearest':
+            return _to_index(np.rint(pos))
+        if mode == 'floor':
+            return _to_index(np.floor(pos))
+        raise ValueError(f"未知的换算模式: {mode}")
+
+
+def _to_index(pos):
+    index = np.where(np.isfinite(pos), pos, -1).astype(np.int64)
+    return index if index.ndim else int(index)
+
+
+class Timebase:
+    """ 一次采集会话里所有数据流的时钟，按名字 ('video', 'radar', 'imu' ...) 访问 """
+
+    def __init__(self, config=TIMEBASE_CONFIG):
+        self.clocks = {name: StreamClock(**clock) for name, clock in config.items()}
+
+    def __getitem__(self, name):
+        return self.clocks[name]
+
+    def add_stream(self, name, rate=None, offset=0.0, drift_ppm=0.0, timestamps=None):
+        self.clocks[name] = StreamClock(rate, offset, drift_ppm, timestamps)
+        return self.clocks[name]
+
+    def set_offset(self, name, offset):
+        """ 流内时间 = 会话时间 + offset (interactive_tuner 的 time_offset 直接传进来) """
+        self.clocks[name].offset = offset
+
+    def convert(self, src, dst, indices, mode='floor'):
+        """ src 流的帧号 (标量或数组) -> dst 流的帧号，一次向量化换算 """
+        return self.clocks[dst].indices(self.clocks[src].times(indices), mode)
+
+    def local_time(self, src, dst, indices):
+        """ src 流的帧号 -> 同一时刻 dst 流的流内时间 (秒) """
+        return self.clocks[src].times(indices) + self.clocks[dst].offset
+
+    def sample(self, src, dst, indices, values):
+        """ 在 src 流的各帧时刻对 dst 流的数据 values [N, ...] 线性插值
+
+        超出 values 范围的帧为 NaN；两侧有一帧是 NaN 时结果也是 NaN。
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        i0, w = self.convert(src, dst, indices, mode='interp')
+        i0, w = np.atleast_1d(i0), np.atleast_1d(w)
+        # 正好落在最后一帧上 (w = 0) 也算在范围内
+        inside = (i0 >= 0) & ((i0 < n - 1) | ((i0 == n - 1) & (w == 0)))
+        left = values[np.clip(i0, 0, n - 1)]
+        right = values[np.clip(i0 + 1, 0, n - 1)]
+        w = w.reshape(w.shape + (1,) * (values.ndim - 1))
+        result = np.where(w > 0, (1 - w) * left + w * right, left)
+        result[~inside] = np.nan
+        return result
+
+
+def in_range(indices, length):
+    """ 帧号是否落在 [0, length) 内 """
+    indices = np.asarray(indices)
+    return (indices >= 0) & (indices < length)
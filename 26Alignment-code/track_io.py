@@ -0,0 +1,233 @@
+import numpy as np
+import json
+import os
+import sys
+
+# ==========================================
+# 轨迹文件 (.trk): 可内存映射的二进制结构化数组 + 小 JSON 头
+# ==========================================
+# 以前 radar_track*.txt / camera_track*.txt 都是 np.savetxt 写、np.loadtxt 读，
+# 长轨迹每个脚本启动都要解析一遍文本，帧号 / 时间只能靠行号隐含。
+# .trk 文件布局:
+#   b'TRK1' | uint32 头长度 | JSON 头 (空格补齐到 64 字节对齐，并预留余量) | 记录 ...
+#   记录是固定长度的结构化数组，np.memmap 直接映射，不解析、不拷贝。
+# 每条记录:
+#   雷达 RADAR_TRACK_DTYPE:  frame, time, x, y, z, valid, confidence
+#   相机 CAMERA_TRACK_DTYPE: frame, time, u, v, valid, confidence
+#   time 是该数据流自己的时间 (帧号 / fps，秒)；valid = 0 的帧位置为 nan
+#   confidence 的含义写在头里的 'confidence' (如 'cluster_points' 簇点数、'position_std' 位置标准差 m)，
+#   None 表示没有
+# JSON 头还记录 kind ('radar' / 'camera')、fps、dtype 等，其余键随写入方自由添加。
+#
+# 旧的 .txt 仍然可以读 (找不到同名 .trk 时自动按文本解析)；给人看时用
+#   python track_io.py radar_track.trk      导出同名 .txt (和以前的文本格式一致)
+#   python track_io.py radar_track.txt      把旧文本轨迹转成 .trk
+
+TRACK_EXT = '.trk'
+MAGIC = b'TRK1'
+HEADER_ALIGN = 64
+HEADER_RESERVE = 256  # 头部预留字节，流式写完后回填 count 时不用挪动数据
+
+RADAR_TRACK_DTYPE = np.dtype([('frame', '<i8'), ('time', '<f8'),
+                              ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                              ('valid', 'u1'), ('confidence', '<f4')])
+CAMERA_TRACK_DTYPE = np.dtype([('frame', '<i8'), ('time', '<f8'),
+                               ('u', '<f4'), ('v', '<f4'),
+                               ('valid', 'u1'), ('confidence', '<f4')])
+TRACK_DTYPES = {'radar': RADAR_TRACK_DTYPE, 'camera': CAMERA_TRACK_DTYPE}
+
+
+def track_path(path):
+    """ radar_track.txt / radar_track -> radar_track.trk """
+    return os.path.splitext(path)[0] + TRACK_EXT
+
+
+def _encode_header(meta, dtype, reserve=0):
+    info = dict(meta, dtype=dtype.descr)
+    blob = json.dumps(info, ensure_ascii=False).encode('utf-8')
+    size = len(MAGIC) + 4 + len(blob) + reserve
+    size = -(-size // HEADER_ALIGN) * HEADER_ALIGN
+    blob = blob + b' ' * (size - len(MAGIC) - 4 - len(blob))
+    return MAGIC + np.uint32(size).tobytes() + blob
+
+
+def read_header(path):
+    """ -> (meta dict, dtype, 数据起始字节) """
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"不是 .trk 轨迹文件: {path}")
+        size = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+        meta = json.loads(f.read(size - 8).decode('utf-8'))
+    dtype = np.dtype([tuple(field) for field in meta.pop('dtype')])
+    return meta, dtype, size
+
+
+class TrackWriter:
+    """ 分块追加写入 .trk，close() 时回填记录数；先写到 .tmp，完成后改名 """
+
+    def __init__(self, path, kind='radar', **meta):
+        self.path = track_path(path)
+        self.dtype = TRACK_DTYPES[kind]
+        self.meta = dict(meta, kind=kind, count=0)
+        self._file = open(self.path + '.tmp', 'wb')
+        self._header_size = len(_encode_header(self.meta, self.dtype, HEADER_RESERVE))
+        self._file.write(_encode_header(self.meta, self.dtype, HEADER_RESERVE))
+
+    def append(self, records):
+        records = np.ascontiguousarray(records, dtype=self.dtype)
+        self._file.write(records.tobytes())
+        self.meta['count'] += len(records)
+
+    def close(self):
+        header = _encode_header(self.meta, self.dtype)
+        if len(header) > self._header_size:
+            raise ValueError("轨迹文件头超出预留空间")
+        # 按原来的头长度重新补齐，数据起点不变
+        header = MAGIC + np.uint32(self._header_size).tobytes() + \
+            header[8:].rstrip(b' ').ljust(self._header_size - 8, b' ')
+        self._file.seek(0)
+        self._file.write(header)
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.path + '.tmp')
+
+
+def write_track(path, records, kind='radar', **meta):
+    """ 一次写入整条轨迹，返回实际路径 (.trk) """
+    with TrackWriter(path, kind, **meta) as writer:
+        writer.append(records)
+    return writer.path
+
+
+def _text_path(path):
+    """ 没有 .trk 时对应的旧文本文件 (给定的路径本身，或同名 .txt)，都没有返回 None """
+    for candidate in (path, os.path.splitext(path)[0] + '.txt'):
+        if candidate != track_path(path) and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def track_exists(path):
+    """ .trk 或旧的文本轨迹存在 """
+    return os.path.exists(track_path(path)) or _text_path(path) is not None
+
+
+def read_track(path, mmap=True):
+    """ -> (records 结构化数组, meta)
+
+    默认只读 memmap；找不到 .trk 但有同名 (或给定的) 旧文本文件时按文本解析。
+    """
+    trk = track_path(path)
+    if not os.path.exists(trk):
+        text = _text_path(path)
+        if text is None:
+            raise FileNotFoundError(f"找不到轨迹文件: {trk}")
+        return read_text_track(text)
+
+    meta, dtype, offset = read_header(trk)
+    count = (os.path.getsize(trk) - offset) // dtype.itemsize  # 按文件大小算，中断写入时也能读已有部分
+    if count == 0:
+        return np.zeros(0, dtype=dtype), meta
+    if mmap:
+        return np.memmap(trk, dtype=dtype, mode='r', offset=offset, shape=(count,)), meta
+    with open(trk, 'rb') as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=count), meta
+
+
+def radar_records(positions, fps, frames=None, confidence=None):
+    """ [N, 3] 位置 (nan 为无效) -> 雷达记录；frames 默认 0..N-1 """
+    positions = np.asarray(positions, dtype=np.float64)
+    # 空轨迹 (一帧都没有) 写成 0 条记录，reshape(0, -1) 会报错
+    positions = positions.reshape(len(positions), -1) if positions.size else positions.reshape(0, 3)
+    records = np.zeros(len(positions), dtype=RADAR_TRACK_DTYPE)
+    records['frame'] = np.arange(len(positions)) if frames is None else frames
+    records['time'] = records['frame'] / fps
+    for i, name in enumerate('xyz'):
+        records[name] = positions[:, i] if i < positions.shape[1] else 0.0
+    records['valid'] = ~np.isnan(positions).any(axis=1)
+    records['confidence'] = np.nan if confidence is None else confidence
+    return records
+
+
+def camera_records(coords, fps):
+    """ [N, 3] (帧号, u, v) -> 相机记录 """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    records = np.zeros(len(coords), dtype=CAMERA_TRACK_DTYPE)
+    records['frame'] = coords[:, 0]
+    records['time'] = records['frame'] / fps
+    records['u'], records['v'] = coords[:, 1], coords[:, 2]
+    records['valid'] = ~np.isnan(coords).any(axis=1)
+    records['confidence'] = np.nan
+    return records
+
+
+def radar_positions(records):
+    """ 雷达记录 -> [N, 3] float64，无效帧为 nan (和以前 np.loadtxt(radar_track.txt) 一样) """
+    positions = np.column_stack((records['x'], records['y'], records['z'])).astype(np.float64)
+    positions[records['valid'] == 0] = np.nan
+    return positions
+
+
+def camera_points(records):
+    """ 相机记录 -> [N, 3] (帧号, u, v)，只含有效点 (和以前 np.loadtxt(camera_track.txt, skiprows=1) 一样) """
+    valid = records['valid'] != 0
+    return np.column_stack((records['frame'][valid], records['u'][valid],
+                            records['v'][valid])).astype(np.float64)
+
+
+def load_radar_track(path):
+    """ 雷达轨迹文件 -> [N, 3] 位置 (nan 为无效帧) """
+    return radar_positions(read_track(path)[0])
+
+
+def load_camera_track(path):
+    """ 相机点击轨迹文件 -> [N, 3] (帧号, u, v) """
+    return camera_points(read_track(path)[0])
+
+
+def read_text_track(path, radar_fps=16.13, video_fps=30.0):
+    """ 旧的文本轨迹: 带 '# Frame_ID' 表头的是相机轨迹，其余按每行 x y z 的雷达轨迹 """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.readline()
+    if first.startswith('#') or 'Frame' in first:
+        records = camera_records(np.loadtxt(path, skiprows=1, ndmin=2), video_fps)
+        return records, {'kind': 'camera', 'fps': video_fps, 'source': os.path.basename(path)}
+    data = np.loadtxt(path, ndmin=2)
+    return radar_records(data, radar_fps), {'kind': 'radar', 'fps': radar_fps, 'confidence': None,
+                                            'source': os.path.basename(path)}
+
+
+def export_text(path, text_path=None):
+    """ .trk -> 和以前格式一样的文本 (雷达 x y z，相机带表头的 帧号 u v) """
+    records, meta = read_track(path)
+    text_path = text_path or os.path.splitext(track_path(path))[0] + '.txt'
+    if meta['kind'] == 'camera':
+        np.savetxt(text_path, camera_points(records), fmt="%d", header="Frame_ID u_real v_real")
+    else:
+        np.savetxt(text_path, radar_positions(records), fmt='%.4f')
+    return text_path
+
+
+def convert_text(text_path):
+    """ 旧文本轨迹 -> 同名 .trk """
+    records, meta = read_text_track(text_path)
+    return write_track(text_path, records, **meta)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        if path.endswith(TRACK_EXT):
+            print(f"{path} -> {export_text(path)}")
+        else:
+            print(f"{path} -> {convert_text(path)}")
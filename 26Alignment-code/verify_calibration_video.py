@@ -1,13 +1,15 @@
 import numpy as np
 import cv2
 import os
+import timebase
+import track_io
 
 # ==========================================
 # 验证配置
 # ==========================================
 # 【修改 1】使用刚才生成的手动标定文件
 NPZ_FILE = 'calib_manual_hack.npz' 
-RADAR_FILE = 'radar_track2.txt'
+RADAR_FILE = 'radar_track2.trk'
 VIDEO_FILE = 'a3.mp4'
 
 # 【核心参数】时间偏移量 (秒)
@@ -17,6 +19,8 @@ TIME_OFFSET = -3
 # 其他参数
 RADAR_FPS = 16.13
 VIDEO_FPS = 30.0
+TIMEBASE = timebase.Timebase({'video': {'rate': VIDEO_FPS},
+                             'radar': {'rate': RADAR_FPS, 'offset': TIME_OFFSET}})
 DISPLAY_WIDTH = 1280
 
 # 【修改 2】配合手动标定的坐标变换
@@ -35,7 +39,7 @@ def transform_radar_point(r_pt):
 def verify_calibration():
     # ... (此处省略的代码与上一条回复中的 verify_calibration_with_offset.py 完全一致)
     # ... 请直接复制上一条回复中的 verify_calibration 主函数代码到这里 ...
-    if not os.path.exists(NPZ_FILE) or not os.path.exists(RADAR_FILE):
+    if not os.path.exists(NPZ_FILE) or not track_io.track_exists(RADAR_FILE):
         print("找不到必要文件")
         return
 
@@ -48,7 +52,7 @@ def verify_calibration():
     print(f"加载标定文件: {NPZ_FILE}")
 
     # 2. 读取雷达
-    radar_data = np.loadtxt(RADAR_FILE)
+    radar_data = track_io.load_radar_track(RADAR_FILE)
     
     # 3. 打开视频
     cap = cv2.VideoCapture(VIDEO_FILE)
@@ -63,9 +67,7 @@ def verify_calibration():
         ret, frame = cap.read()
         if not ret: break
         
-        t_vid = frame_idx / VIDEO_FPS
-        t_rad_target = t_vid + TIME_OFFSET
-        rad_idx = int(t_rad_target * RADAR_FPS)
+        rad_idx = TIMEBASE.convert('video', 'radar', frame_idx)
         
         points_to_draw = []
         for i in range(rad_idx - 1, rad_idx + 2):
@@ -1,12 +1,13 @@
 import cv2
 import numpy as np
 import os
+import track_io
 
 # ==========================================
 # 配置
 # ==========================================
 VIDEO_PATH = "a4.mp4" # 你的视频路径
-OUTPUT_FILE = "camera_track.txt"
+OUTPUT_FILE = "camera_track.trk"
 
 # 显示时的目标宽度 (建议 1280 或 1600，取决于你的屏幕)
 # 这只是为了让你能看全画面，不影响保存的数据精度
@@ -45,6 +46,7 @@ def extract_visual_track():
     # 获取原始视频分辨率
     orig_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     orig_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0  # release 之后就读不到了
     
     # 计算缩放比例
     scale_factor = orig_w / DISPLAY_WIDTH
@@ -90,9 +92,11 @@ def extract_visual_track():
     cv2.destroyAllWindows()
     
     if len(coords) > 0:
-        # 保存时记得带个 Header 说明，防止忘记
-        np.savetxt(OUTPUT_FILE, np.array(coords), fmt="%d", header="Frame_ID u_real v_real")
-        print(f"\n成功! 视觉轨迹已保存到 {OUTPUT_FILE}")
+        # 帧号 / 视频帧率 / 分辨率都记在轨迹文件里 (看内容用 python track_io.py camera_track.trk 导出文本)
+        output = track_io.write_track(OUTPUT_FILE, track_io.camera_records(coords, video_fps), kind='camera',
+                                      fps=video_fps, resolution=[orig_w, orig_h],
+                                      source=os.path.basename(VIDEO_PATH))
+        print(f"\n成功! 视觉轨迹已保存到 {output}")
         print(f"共采集了 {len(coords)} 个点 (坐标已还原为 {orig_w}x{orig_h} 分辨率)。")
     else:
         print("\n未采集到任何点。")